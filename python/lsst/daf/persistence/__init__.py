@@ -32,6 +32,9 @@ from .storage import *
 from .dbAuth import *
 
 from .utils import *
+from .butlerCache import *
+from .butlerStats import *
+from .butlerTrace import *
 from .genericAssembler import *
 from .registries import *
 from .fsScanner import *
@@ -39,11 +42,14 @@ from .butlerExceptions import *
 from .policy import *
 from .registries import *
 from .dataId import *
+from .dataIdTable import *
 from .butlerLocation import *
 from .readProxy import *
 from .butlerSubset import *
 from .access import *
 from .repositoryCfg import *
+from .fileIndex import *
+from .repositoryCfgCache import *
 from .posixStorage import *
 from .fmtPosixRepositoryCfg import *
 from .mapper import *
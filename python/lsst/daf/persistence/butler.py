@@ -25,16 +25,262 @@
 # -*- python -*-
 
 """This module defines the Butler class."""
+import asyncio
+import collections
+import concurrent.futures
 import copy
+import functools
 import inspect
+import threading
 
+import numpy as np
 import yaml
 
 from lsst.log import Log
-from . import ReadProxy, ButlerSubset, ButlerDataRef, \
+from . import ReadProxy, EvictableReadProxy, ButlerSubset, ButlerDataRef, \
     Storage, Policy, NoResults, Repository, DataId, RepositoryCfg, \
     RepositoryArgs, listify, setify, sequencify, doImport, ButlerComposite, genericAssembler, \
-    genericDisassembler, PosixStorage, ParentsMismatch
+    genericDisassembler, PosixStorage, ParentsMismatch, ButlerLocation, LocationCache, ObjectCache, \
+    MetadataCache, CacheStats, Mapper, ButlerStats, NullButlerStats, ButlerTracer, DataIdTable, \
+    RepositoryCfgCache
+from .butlerCache import makeDataIdKey
+from .readProxy import CompositeReadProxy, get_callback, is_loaded
+
+_missing = object()
+"""A marker for a value that is not in a cache."""
+
+
+class _GroupTimer:
+    """A context manager that enters the context managers of more than one monitor."""
+
+    __slots__ = ("timers",)
+
+    def __init__(self, timers):
+        self.timers = timers
+
+    def __enter__(self):
+        for timer in self.timers:
+            timer.__enter__()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        for timer in reversed(self.timers):
+            timer.__exit__(excType, excValue, traceback)
+        return False
+
+
+class _MonitorGroup:
+    """Passes the phases of a Butler's work to more than one monitor (e.g. a ButlerStats and a ButlerTracer).
+    """
+
+    def __init__(self, monitors):
+        self.monitors = monitors
+
+    def timer(self, phase, datasetType=None, repository=None):
+        return _GroupTimer([monitor.timer(phase, datasetType, repository) for monitor in self.monitors])
+
+    def record(self, phase, elapsed, datasetType=None, repository=None):
+        for monitor in self.monitors:
+            monitor.record(phase, elapsed, datasetType, repository)
+
+    def reset(self):
+        for monitor in self.monitors:
+            monitor.reset()
+
+
+def _monitored(phase, datasetTypeIndex=0):
+    """Decorate a Butler method so that each call to it is passed to the Butler's monitor as a phase.
+
+    A call to a coroutine method is timed from when it starts to when it returns. The spans of coroutines
+    that run concurrently on the event loop's thread overlap, so ButlerTracer records the spans of each
+    asyncio task on a track of its own.
+
+    Parameters
+    ----------
+    phase : string
+        The name of the phase, e.g. 'get'.
+    datasetTypeIndex : int, optional
+        The index of the datasetType argument in the positional arguments of the method (after self).
+    """
+    def decorate(method):
+        def getDatasetType(args, kwargs):
+            datasetType = kwargs.get('datasetType')
+            if datasetType is None and len(args) > datasetTypeIndex:
+                datasetType = args[datasetTypeIndex]
+            return datasetType
+
+        if inspect.iscoroutinefunction(method):
+            @functools.wraps(method)
+            async def wrapper(self, *args, **kwargs):
+                with self._monitor.timer(phase, getDatasetType(args, kwargs)):
+                    return await method(self, *args, **kwargs)
+        else:
+            @functools.wraps(method)
+            def wrapper(self, *args, **kwargs):
+                with self._monitor.timer(phase, getDatasetType(args, kwargs)):
+                    return method(self, *args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class _DeferredRead:
+    """The callback of a ReadProxy returned by Butler.get(immediate=False) for a dataset that is read by its
+    formatter. The read can be started early on an executor; the object is standardized when the proxy is
+    first used, in the thread that uses it.
+    """
+
+    __slots__ = ("butler", "location", "dataId", "future")
+
+    def __init__(self, butler, location, dataId):
+        self.butler = butler
+        self.location = location
+        self.dataId = dataId
+        self.future = None
+
+    def start(self, executor):
+        """Start the read on an executor, if it has not been started."""
+        if self.future is None:
+            self.future = executor.submit(self.butler._read, self.location)
+
+    def __call__(self):
+        if self.future is not None:
+            obj = self.future.result()
+            # the future is not kept, so that it does not hold the object after an EvictableReadProxy drops
+            # it; the object is read again if this is called again.
+            self.future = None
+        else:
+            obj = self.butler._read(self.location)
+        if self.location.mapper.canStandardize(self.location.datasetType):
+            obj = self.butler._standardize(self.location, obj, self.dataId)
+        return obj
+
+
+class _WriteBehindQueue:
+    """Runs the writes of Butler.put on a pool of threads, blocking new writes while the estimated size of
+    the objects waiting to be written is over a budget, or too many writes are waiting.
+
+    The errors raised by the writes are kept until they are taken by takeErrors.
+
+    Parameters
+    ----------
+    maxWorkers : int or None
+        The maximum number of writes to run at once.
+    maxBytes : int
+        The budget, in bytes, of the objects waiting to be written. A write that is larger than the budget is
+        queued when nothing else is waiting.
+    maxPending : int
+        The maximum number of writes waiting to be written (or being written). This bounds the queue when the
+        sizes of the objects are underestimated, as they are for objects that ObjectCache.estimateSize can
+        not measure.
+    """
+
+    def __init__(self, maxWorkers, maxBytes, maxPending):
+        self.maxBytes = maxBytes
+        self.maxPending = maxPending
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=maxWorkers)
+        self._condition = threading.Condition()
+        self._pendingBytes = 0
+        self._pendingCount = 0
+        # the number of waiting writes of each dataset type and of each location.
+        self._pendingDatasetTypes = collections.Counter()
+        self._pendingLocations = collections.Counter()
+        self._errors = []
+
+    def submit(self, func, nbytes, datasetType, locationKey):
+        """Queue a write, first waiting until the budget and maxPending allow it and any earlier write to the
+        same location is done.
+
+        Parameters
+        ----------
+        func : callable
+            Called with no arguments in a thread of the pool to do the write.
+        nbytes : int
+            The estimated size of the object being written.
+        datasetType : string
+            The dataset type being written.
+        locationKey : hashable
+            Identifies the location being written, so that writes to one location are done in order.
+        """
+        with self._condition:
+            while (self._pendingLocations[locationKey] or self._pendingCount >= self.maxPending or
+                   (self._pendingBytes and self._pendingBytes + nbytes > self.maxBytes)):
+                self._condition.wait()
+            self._pendingBytes += nbytes
+            self._pendingCount += 1
+            self._pendingDatasetTypes[datasetType] += 1
+            self._pendingLocations[locationKey] += 1
+        try:
+            self._executor.submit(self._run, func, nbytes, datasetType, locationKey)
+        except Exception:
+            self._done(nbytes, datasetType, locationKey)
+            raise
+
+    def _run(self, func, nbytes, datasetType, locationKey):
+        try:
+            func()
+        except Exception as e:
+            with self._condition:
+                self._errors.append(e)
+        finally:
+            self._done(nbytes, datasetType, locationKey)
+
+    def _done(self, nbytes, datasetType, locationKey):
+        with self._condition:
+            self._pendingBytes -= nbytes
+            self._pendingCount -= 1
+            self._pendingDatasetTypes[datasetType] -= 1
+            if not self._pendingDatasetTypes[datasetType]:
+                del self._pendingDatasetTypes[datasetType]
+            self._pendingLocations[locationKey] -= 1
+            if not self._pendingLocations[locationKey]:
+                del self._pendingLocations[locationKey]
+            self._condition.notify_all()
+
+    @property
+    def pendingBytes(self):
+        """The estimated size of the objects waiting to be written (int)."""
+        with self._condition:
+            return self._pendingBytes
+
+    @property
+    def pendingCount(self):
+        """The number of writes waiting to be written or being written (int)."""
+        with self._condition:
+            return self._pendingCount
+
+    def wait(self, datasetType=None):
+        """Wait until the queued writes are done.
+
+        Parameters
+        ----------
+        datasetType : string, optional
+            Wait only for the writes of this dataset type; if None, wait for all of them.
+        """
+        with self._condition:
+            if datasetType is None:
+                while self._pendingDatasetTypes:
+                    self._condition.wait()
+            else:
+                while self._pendingDatasetTypes[datasetType]:
+                    self._condition.wait()
+
+    def takeErrors(self):
+        """Get, and forget, the errors raised by the writes that are done.
+
+        Returns
+        -------
+        list of Exception
+            The errors, in the order they were raised.
+        """
+        with self._condition:
+            errors = self._errors
+            self._errors = []
+        return errors
+
+    def shutdown(self):
+        """Stop the pool after the queued writes are done, without waiting for them."""
+        self._executor.shutdown(wait=False)
+
 
 preinitedMapperWarning = ("Passing an instantiated mapper into " +
                           "Butler.__init__ will prevent Butler from passing " +
@@ -89,7 +335,8 @@ class RepoData:
         Path or URI to the location of the RepositoryCfg file.
 
     repo : lsst.daf.persistence.Repository
-        The Repository class instance.
+        The Repository class instance. If the Butler deferred it (see deferRepo), it is created, with its
+        mapper and registry, the first time this attribute is used.
 
     parentRepoDatas : list of RepoData
         The parents of this Repository, as indicated this Repository's RepositoryCfg. If this is a new
@@ -113,6 +360,14 @@ class RepoData:
         * output: the Repository was passed as a Butler output.
         * parent: the Repository was specified in the RepositoryCfg parents list of a readable repository.
 
+    negativeLookupCache : LocationCache or None
+        If not None, remembers the datasets that were looked for in this Repository and not found. See
+        Butler.enableNegativeLookupCache.
+
+    metadataCache : MetadataCache or None
+        If not None, holds the results of the getKeys and queryMetadata calls to this Repository. See
+        Butler.enableMetadataCache.
+
     _repoArgs : RepositoryArgs
         Contains the arguments that were used to specify this Repository.
     """
@@ -121,13 +376,33 @@ class RepoData:
         self.cfg = None
         self._cfgOrigin = None
         self.cfgRoot = None
-        self.repo = None
+        self._repo = None
+        self._deferRepo = False
         self.parentRepoDatas = []
         self.isV1Repository = False
         self.tags = set()
         self.role = role
         self.parentRegistry = None
+        self.negativeLookupCache = None
+        self.metadataCache = None
         self._repoArgs = args
+        # Serializes the deferred creation of the Repository by threads that use it at once.
+        self._repoLock = threading.RLock()
+
+    def __getstate__(self):
+        # The Repository (with its mapper and registry) is not pickled; it is created again when it is used.
+        state = self.__dict__.copy()
+        del state['_repoLock']
+        state['_repo'] = None
+        state['_deferRepo'] = True
+        state['parentRegistry'] = None
+        state['negativeLookupCache'] = None
+        state['metadataCache'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._repoLock = threading.RLock()
 
     @property
     def repoArgs(self):
@@ -154,12 +429,59 @@ class RepoData:
                     self.cfg,
                     self.cfgOrigin,
                     self.cfgRoot,
-                    self.repo,
+                    self._repo,
                     [id(p) for p in self.parentRepoDatas],
                     self.isV1Repository,
                     self.role,
                     self.parentRegistry)
 
+    @property
+    def repo(self):
+        if self._repo is None and self._deferRepo:
+            self.initRepo()
+        return self._repo
+
+    @repo.setter
+    def repo(self, repo):
+        self._repo = repo
+
+    def deferRepo(self):
+        """Create the Repository the first time the repo attribute is used, instead of now.
+
+        Creating a Repository creates its mapper, which may load policy files and open a registry, so Butler
+        defers this for the repositories it may never read from.
+        """
+        self._deferRepo = True
+
+    def writeCfg(self):
+        """Write the RepositoryCfg of the repository, if it is new or has been changed, without creating the
+        Repository (the Repository writes it too, if it has not been written).
+        """
+        if self.cfg.dirty and not self.isV1Repository and self.cfgOrigin != 'nested':
+            Storage.makeFromURI(self.cfg.root).putRepositoryCfg(self.cfg, self.cfgRoot)
+
+    def initRepo(self):
+        """Create the Repository, if it has not been created yet.
+
+        The Repositories of the parents that use the same mapper are created first, so that the registry of
+        the nearest one that has a registry can be passed to the mapper as its parent registry. This is safe
+        to call from more than one thread; the Repository is created once.
+        """
+        if self._repo is not None:
+            return
+        with self._repoLock:
+            if self._repo is not None:
+                return
+            for parentRepoData in self.parentRepoDatas:
+                if parentRepoData.cfg.mapper != self.cfg.mapper:
+                    continue
+                parentRepoData.initRepo()
+                parentRegistry = parentRepoData.repo.getRegistry()
+                self.parentRegistry = parentRegistry if parentRegistry else parentRepoData.parentRegistry
+                if self.parentRegistry:
+                    break
+            self._repo = Repository(self)
+
     def setCfg(self, cfg, origin, root, isV1Repository):
         """Set information about the cfg into the RepoData
 
@@ -349,16 +671,82 @@ class Butler:
 
     queryMetadata(self, datasetType, format=None, dataId={}, **rest)
 
+    queryMetadataIter(self, datasetType, format, dataId={}, **rest)
+
+    queryMetadataCount(self, datasetType, format, dataId={}, **rest)
+
+    queryMetadataTable(self, datasetType, format, dataId={}, **rest)
+
+    querySubsetMetadata(self, datasetType, format, dataId={}, **rest)
+
+    querySubsetMetadataTable(self, datasetType, format, dataId={}, **rest)
+
     datasetExists(self, datasetType, dataId={}, **rest)
 
+    datasetExistsMany(self, datasetType, dataIds, write=False)
+
+    adatasetExists(self, datasetType, dataId={}, write=False, **rest)
+
     get(self, datasetType, dataId={}, immediate=False, **rest)
 
+    getMany(self, datasetType, dataIds, maxWorkers=None, returnExceptions=False)
+
+    aget(self, datasetType, dataId=None, **rest)
+
     put(self, obj, datasetType, dataId={}, **rest)
 
-    subset(self, datasetType, level=None, dataId={}, **rest)
+    putMany(self, objs, datasetType, dataIds, doBackup=False, maxWorkers=None)
+
+    aput(self, obj, datasetType, dataId={}, doBackup=False, **rest)
+
+    subset(self, datasetType, level=None, dataId={}, stream=False, columnar=False, **rest)
 
     dataRef(self, datasetType, level=None, dataId={}, **rest)
 
+    enableLocationCache(self, maxSize=1000)
+
+    enableObjectCache(self, policy)
+
+    enableNegativeLookupCache(self, maxSize=10000)
+
+    enableMetadataCache(self, maxSize=10000)
+
+    invalidateMetadataCache(self, datasetType=None)
+
+    getCacheStats(self)
+
+    setMaxWorkers(self, maxWorkers)
+
+    enableParallelComposites(self, maxWorkers=8)
+
+    enableLazyComposites(self, enable=True)
+
+    enableParallelQueries(self, maxWorkers=8)
+
+    enablePrefetch(self, maxWorkers=4)
+
+    resolveProxies(self, proxies, maxWorkers=None)
+
+    enableEvictableProxies(self, enable=True)
+
+    enableWriteBehind(self, maxWorkers=2, maxBytes=2**30, maxPending=16)
+
+    flush(self)
+
+    enableFanOutWrites(self, enable=True, hardlink=False)
+
+    enableFastPickle(self, enable=True)
+
+    enableStats(self, enable=True)
+
+    getStats(self)
+
+    resetStats(self)
+
+    enableTracing(self, path)
+
+    getTracer(self)
+
     Initialization:
 
     The preferred method of initialization is to use the `inputs` and `outputs` __init__ parameters. These
@@ -487,14 +875,16 @@ class Butler:
     9. Find Parent Registry and Instantiate RepoData
     ------------------------------------------------
 
-    At this point there is enough information to instantiate the `Repository` instances. There is one final
-    step before instantiating the Repository, which is to try to get a parent registry that can be used by the
-    child repository. The criteria for "can be used" is spelled out in `Butler._setParentRegistry`. However,
-    to get the registry from the parent, the parent must be instantiated. The `repoDataList`, in depth-first
-    search order, is built so that the most-dependent repositories are first, and the least dependent
-    repositories are last. So the `repoDataList` is reversed and the Repositories are instantiated in that
-    order; for each RepoData a parent registry is searched for, and then the Repository is instantiated with
-    whatever registry could be found."""
+    At this point there is enough information to instantiate the `Repository` instances. `Butler.__init__`
+    only writes the `RepositoryCfg`s of new output repositories; the Repository (and its mapper and
+    registry) of each repository is instantiated the first time it is used, e.g. when a dataset is located
+    in it, by `RepoData.initRepo`, since a Butler often does not read from or write to every repository in
+    its parent graph.
+
+    Before a Repository is instantiated the Repositories of its parents that use the same mapper are
+    instantiated, in the order of its parents, until one of them has a registry (or was given a parent
+    registry); that registry is passed to the mapper of the child repository as its parent registry. The
+    Repository is then instantiated with whatever registry could be found."""
 
     GENERATION = 2
     """This is a Generation 2 Butler.
@@ -504,48 +894,87 @@ class Butler:
         self._initArgs = {'root': root, 'mapper': mapper, 'inputs': inputs, 'outputs': outputs,
                           'mapperArgs': mapperArgs}
 
-        self.log = Log.getLogger("daf.persistence.butler")
+        self._initAttributes()
 
         inputs, outputs = self._processInputArguments(
             root=root, mapper=mapper, inputs=inputs, outputs=outputs, **mapperArgs)
 
-        # convert the RepoArgs into RepoData
-        inputs = [RepoData(args, 'input') for args in inputs]
-        outputs = [RepoData(args, 'output') for args in outputs]
-        repoDataList = outputs + inputs
+        # If a RepositoryCfgCache is enabled by the environment, the repository graph resolved by an earlier
+        # Butler with the same inputs and outputs is used if none of the cfgs it was made from have changed.
+        cfgCache = RepositoryCfgCache.fromEnvironment()
+        cacheKey = cfgCache.makeKey(inputs, outputs) if cfgCache is not None else None
+        repoDataList = cfgCache.get(cacheKey) if cacheKey is not None else None
+        if repoDataList is not None:
+            self._repos = RepoDataContainer(repoDataList)
+        else:
+            # the stats of the cfg files that are read, by _getRepositoryCfg.
+            self._cfgStats = {} if cacheKey is not None else None
+
+            # convert the RepoArgs into RepoData
+            inputs = [RepoData(args, 'input') for args in inputs]
+            outputs = [RepoData(args, 'output') for args in outputs]
+            repoDataList = outputs + inputs
 
-        self._getCfgs(repoDataList)
+            self._getCfgs(repoDataList)
 
-        self._addParents(repoDataList)
+            self._addParents(repoDataList)
 
-        self._setAndVerifyParentsLists(repoDataList)
+            self._setAndVerifyParentsLists(repoDataList)
 
-        self._setDefaultMapper(repoDataList)
+            self._setDefaultMapper(repoDataList)
 
-        self._connectParentRepoDatas(repoDataList)
+            self._connectParentRepoDatas(repoDataList)
 
-        self._repos = RepoDataContainer(repoDataList)
+            self._repos = RepoDataContainer(repoDataList)
 
-        self._setRepoDataTags()
+            self._setRepoDataTags()
 
+            if self._cfgStats is not None:
+                cfgCache.put(cacheKey, self._cfgStats, repoDataList)
+                self._cfgStats = None
+
+        # The RepositoryCfgs of new output repositories are written now. Creating the repositories (and their
+        # mappers and registries, and those of the parents they get a registry from) is deferred until they
+        # are used, because a Butler often does not read from or write to every repository in its graph.
         for repoData in repoDataList:
-            self._initRepo(repoData)
+            if repoData.role == 'output':
+                repoData.writeCfg()
+            repoData.deferRepo()
 
-    def _initRepo(self, repoData):
-        if repoData.repo is not None:
-            # this repository may have already been initialized by its children, in which case there is
-            # nothing more to do.
-            return
-        for parentRepoData in repoData.parentRepoDatas:
-            if parentRepoData.cfg.mapper != repoData.cfg.mapper:
-                continue
-            if parentRepoData.repo is None:
-                self._initRepo(parentRepoData)
-            parentRegistry = parentRepoData.repo.getRegistry()
-            repoData.parentRegistry = parentRegistry if parentRegistry else parentRepoData.parentRegistry
-            if repoData.parentRegistry:
-                break
-        repoData.repo = Repository(repoData)
+    def _initAttributes(self):
+        """Initialize the attributes that do not depend on the repositories."""
+        self.log = Log.getLogger("daf.persistence.butler")
+
+        self._locationCache = None
+        self._objectCache = None
+        self._maxWorkers = None
+        self._executor = None
+        self._fastPickle = False
+        self._compositeMaxWorkers = None
+        self._compositeExecutor = None
+        self._lazyComposites = False
+        self._queryMaxWorkers = None
+        self._queryExecutor = None
+        self._prefetchMaxWorkers = None
+        self._prefetchExecutor = None
+        self._evictableProxies = False
+        self._writeBehind = None
+        self._fanOutWrites = False
+        self._fanOutHardlink = False
+        self._butlerStats = None
+        self._tracer = None
+        # The monitor that the phases of the work are passed to: a NullButlerStats if neither stats nor
+        # tracing is enabled.
+        self._monitor = NullButlerStats()
+        # Memoized results of _resolveDatasetTypeAlias and _splitComponents.
+        self._resolvedDatasetTypes = {}
+        self._splitDatasetTypes = {}
+        # The stats of the repositoryCfg.yaml files read while the repository graph is resolved, if it is to
+        # be put in the RepositoryCfgCache; None if it is not (or can not be) cached.
+        self._cfgStats = None
+        # The arguments of the enable and set methods that have been called, by method name, so that they can
+        # be called again when a fast-pickled Butler is unpickled.
+        self._features = collections.OrderedDict()
 
     def _processInputArguments(self, root=None, mapper=None, inputs=None, outputs=None, **mapperArgs):
         """Process, verify, and standardize the input arguments.
@@ -708,12 +1137,22 @@ class Butler:
         if not isinstance(repositoryArgs, RepositoryArgs):
             repositoryArgs = RepositoryArgs(cfgRoot=repositoryArgs, mode='r')
 
+        if self._cfgStats is not None:
+            if Storage.isPosix(repositoryArgs.cfgRoot):
+                # the file is stat'ed before it is read, so that a change made while it is read invalidates
+                # the cached graph.
+                path, statKey = RepositoryCfgCache.stat(repositoryArgs.cfgRoot)
+                self._cfgStats[path] = statKey
+            else:
+                self._cfgStats = None
         cfg = self.storage.getRepositoryCfg(repositoryArgs.cfgRoot)
         isOldButlerRepository = False
         if cfg is None:
             cfg = Butler._getOldButlerRepositoryCfg(repositoryArgs)
             if cfg is not None:
                 isOldButlerRepository = True
+                # the cfgs of Butler v1 repositories depend on more than their (missing) cfg files.
+                self._cfgStats = None
         return cfg, isOldButlerRepository
 
     def _getCfgs(self, repoDataList):
@@ -1127,148 +1566,1102 @@ class Butler:
                 raise RuntimeError("Alias: %s overlaps with existing alias: %s" % (alias, key))
 
         self.datasetTypeAliasDict[alias] = datasetType
+        self._resolvedDatasetTypes.clear()
 
-    def getKeys(self, datasetType=None, level=None, tag=None):
-        """Get the valid data id keys at or above the given level of hierarchy for the dataset type or the
-        entire collection if None. The dict values are the basic Python types corresponding to the keys (int,
-        float, string).
+    def enableLocationCache(self, maxSize=1000):
+        """Cache the locations found by get, datasetExists and getUri, so that repeated requests for the same
+        dataset do not search the repositories again.
+
+        Only plain locations are cached; composite datasets and dataset types that have a bypass function are
+        always searched for. The read locations of a datasetType are dropped from the cache when an object of
+        that datasetType is put by this Butler.
+
+        .. warning:: Datasets written or removed by other processes after their location has been cached
+        will not be noticed by this Butler.
 
         Parameters
         ----------
-        datasetType - string
-            The type of dataset to get keys for, entire collection if None.
-        level - string
-            The hierarchy level to descend to. None if it should not be restricted. Use an empty string if the
-            mapper should lookup the default level.
-        tags - any, or list of any
-            Any object that can be tested to be the same as the tag in a dataId passed into butler input
-            functions. Applies only to input repositories: If tag is specified by the dataId then the repo
-            will only be read from used if the tag in the dataId matches a tag used for that repository.
+        maxSize : int, optional
+            The maximum number of locations to cache. If 0 or None the cache is disabled.
+        """
+        self._locationCache = LocationCache(maxSize) if maxSize else None
+        self._features['enableLocationCache'] = (maxSize,)
+
+    def enableObjectCache(self, policy):
+        """Keep the objects read by get in memory, so that repeated requests for the same dataset (e.g. the
+        calibration products used for every CCD) do not read it again.
+
+        The objects are cached as read from storage (separately for each set of read options, such as a
+        bounding box), before the mapper standardizes them. Objects in the cache are not copied: every caller
+        that gets one gets the same object, which must be treated as read-only, since a change to it is seen
+        by every later get (unless the mapper's standardization copies it). Only dataset types whose objects
+        are not modified by their users should be cached, and only the dataset types that are listed are. The
+        objects of a dataset type are dropped from the cache when an object of that dataset type is put by
+        this Butler. The memory use of the objects is estimated with the size estimators registered with
+        `ObjectCache.registerSizeEstimator`, from the pixel arrays of afw images and the records of afw
+        catalogs, or from their 'nbytes' attribute; objects whose size can not be estimated are not cached,
+        and a warning is logged for the first such object of each dataset type.
 
-        Returns
-        -------
-        Returns a dict. The dict keys are the valid data id keys at or above the given level of hierarchy for
-        the dataset type or the entire collection if None. The dict values are the basic Python types
-        corresponding to the keys (int, float, string).
+        Parameters
+        ----------
+        policy : Policy, dict, string or None
+            The configuration of the cache (or the path to a policy file that holds it), with the keys:
+            - maxBytes (int): the maximum estimated number of bytes of objects to hold (default 1 GiB).
+            - eviction (string): 'LRU' (the default) or 'LFU'.
+            - datasetTypes (list of string): the dataset types to cache. If not given, none are cached.
+            If None, the cache is disabled.
         """
-        datasetType = self._resolveDatasetTypeAlias(datasetType)
+        if policy is None:
+            self._objectCache = None
+            self._features.pop('enableObjectCache', None)
+            return
+        policy = Policy(policy)
+        datasetTypes = policy.get('datasetTypes', None)
+        if datasetTypes is not None:
+            datasetTypes = [self._resolveDatasetTypeAlias(datasetType) for datasetType in
+                            sequencify(datasetTypes)]
+        self._objectCache = ObjectCache(maxBytes=policy.get('maxBytes', 2**30),
+                                        eviction=policy.get('eviction', 'LRU'),
+                                        datasetTypes=datasetTypes)
+        self._features['enableObjectCache'] = ({'maxBytes': self._objectCache.maxBytes,
+                                                'eviction': self._objectCache.eviction,
+                                                'datasetTypes': datasetTypes},)
+
+    def enableNegativeLookupCache(self, maxSize=10000):
+        """Remember, for each input repository, the datasets that were looked for in it and not found, so that
+        later searches skip the repositories that are known not to hold a dataset.
+
+        This helps most with deep chains of input repositories, where every search maps and checks each of
+        the child repositories before reaching the one that holds the dataset. Each repository has its own
+        cache; a put by this Butler drops the entries of the written dataset type in the output repositories
+        only. Component (dotted) dataset types are not cached.
+
+        .. warning:: Datasets written to an input repository by another process after they have been looked
+        for will not be found by this Butler.
 
-        keys = None
-        tag = setify(tag)
+        Parameters
+        ----------
+        maxSize : int, optional
+            The maximum number of entries to keep for each repository. If 0 or None the cache is disabled.
+        """
         for repoData in self._repos.inputs():
-            if not tag or len(tag.intersection(repoData.tags)) > 0:
-                keys = repoData.repo.getKeys(datasetType, level)
-                # An empty dict is a valid "found" condition for keys. The only value for keys that should
-                # cause the search to continue is None
-                if keys is not None:
-                    break
-        return keys
+            repoData.negativeLookupCache = LocationCache(maxSize) if maxSize else None
+        self._features['enableNegativeLookupCache'] = (maxSize,)
 
-    def queryMetadata(self, datasetType, format, dataId={}, **rest):
-        """Returns the valid values for one or more keys when given a partial
-        input collection data id.
+    def enableMetadataCache(self, maxSize=10000):
+        """Remember, for each input repository, the results of the getKeys and queryMetadata calls made to
+        it, so that getKeys, queryMetadata and subset do not ask its mapper (and registry) again.
+
+        Each repository has its own cache. A put by this Butler drops the entries of the written dataset type
+        (and those of queries of the entire collection) in the output repositories only; the input
+        repositories are taken to be unchanging and their entries are kept until invalidateMetadataCache is
+        called. Queries with a dataId that holds unhashable values are not cached.
+
+        .. warning:: Datasets added to a repository by another process after it has been queried will not be
+        found by getKeys, queryMetadata and subset until invalidateMetadataCache is called.
 
         Parameters
         ----------
-        datasetType - string
-            The type of dataset to inquire about.
-        format - str, tuple
-            Key or tuple of keys to be returned.
-        dataId - DataId, dict
-            The partial data id.
-        **rest -
-            Keyword arguments for the partial data id.
+        maxSize : int, optional
+            The maximum number of results to keep for each repository. If 0 or None the cache is disabled.
+        """
+        for repoData in self._repos.inputs():
+            repoData.metadataCache = MetadataCache(maxSize) if maxSize else None
+        self._features['enableMetadataCache'] = (maxSize,)
+
+    def invalidateMetadataCache(self, datasetType=None):
+        """Drop the cached getKeys and queryMetadata results of all the repositories, for example after
+        another process has added datasets to them.
+
+        Parameters
+        ----------
+        datasetType : string, optional
+            Only drop the results for this dataset type (and its components) and those of queries of the
+            entire collection. If None, drop all the results.
+        """
+        if datasetType is not None:
+            datasetType = self._resolveDatasetTypeAlias(datasetType)
+        for repoData in self._repos.inputs():
+            if repoData.metadataCache is None:
+                continue
+            if datasetType is None:
+                repoData.metadataCache.clear()
+            else:
+                repoData.metadataCache.invalidate(datasetType)
+
+    def getCacheStats(self):
+        """Get the usage counters of the caches enabled in this Butler.
 
         Returns
         -------
-        A list of valid values or tuples of valid values as specified by the
-        format.
+        dict of string to CacheStats
+            The counters of each enabled cache, keyed by cache name ('location', 'object', 'negativeLookup',
+            'metadata'). The counters of the negative lookup and metadata caches are summed over the
+            repositories.
         """
+        stats = {}
+        if self._locationCache is not None:
+            stats['location'] = self._locationCache.stats()
+        if self._objectCache is not None:
+            stats['object'] = self._objectCache.stats()
+        negativeStats = [repoData.negativeLookupCache.stats() for repoData in self._repos.inputs()
+                         if repoData.negativeLookupCache is not None]
+        if negativeStats:
+            stats['negativeLookup'] = CacheStats(*[sum(field) for field in zip(*negativeStats)])
+        metadataStats = [repoData.metadataCache.stats() for repoData in self._repos.inputs()
+                         if repoData.metadataCache is not None]
+        if metadataStats:
+            stats['metadata'] = CacheStats(*[sum(field) for field in zip(*metadataStats)])
+        return stats
+
+    def setMaxWorkers(self, maxWorkers):
+        """Set the number of threads in the executor that runs the blocking reads and writes of aget, aput and
+        adatasetExists.
+
+        The executor is created when it is first needed; if it already exists it is shut down (after the work
+        it has been given is done) and a new one will be created with the new number of threads.
 
-        datasetType = self._resolveDatasetTypeAlias(datasetType)
-        dataId = DataId(dataId)
-        dataId.update(**rest)
-        format = sequencify(format)
+        Parameters
+        ----------
+        maxWorkers : int or None
+            The maximum number of threads. If None, the default of `concurrent.futures.ThreadPoolExecutor`
+            is used.
+        """
+        self._maxWorkers = maxWorkers
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self._features['setMaxWorkers'] = (maxWorkers,)
 
-        tuples = None
-        for repoData in self._repos.inputs():
-            if not dataId.tag or len(dataId.tag.intersection(repoData.tags)) > 0:
-                tuples = repoData.repo.queryMetadata(datasetType, format, dataId)
-                if tuples:
-                    break
+    def enableParallelComposites(self, maxWorkers=8):
+        """Read the components of composite datasets concurrently.
 
-        if not tuples:
-            return []
+        By default get reads the components of a composite (and each dataset of a subset component) one
+        after another. With this enabled they are located in the calling thread, their reads are run on a
+        pool of threads, and the assembler is called when they have all been read. Components that are
+        composites themselves, and components with bypass functions, are still read in the calling thread.
 
-        if len(format) == 1:
-            ret = []
-            for x in tuples:
-                try:
-                    ret.append(x[0])
-                except TypeError:
-                    ret.append(x)
-            return ret
+        Parameters
+        ----------
+        maxWorkers : int or None, optional
+            The number of threads that read components. If 0 or None, components are read one after
+            another.
+        """
+        if self._compositeExecutor is not None:
+            self._compositeExecutor.shutdown(wait=False)
+            self._compositeExecutor = None
+        self._compositeMaxWorkers = maxWorkers if maxWorkers else None
+        self._features['enableParallelComposites'] = (maxWorkers,)
+
+    def enableLazyComposites(self, enable=True):
+        """Read each component of a composite dataset only when it is used, instead of when the composite is
+        gotten.
+
+        With this enabled get (and aget) return a CompositeReadProxy for a composite dataset. The components
+        are located when the composite is gotten. Calling the getter of a component on the proxy (the getter
+        named in the composite's policy, or else get_<name> or get<Name>, as for the generic disassembler)
+        reads that component only, and returns it as it was read (and standardized, if the mapper
+        standardizes its dataset type), without assembling the composite. Any other use of the proxy reads
+        the components that have not been read yet and gives them all to the composite's assembler; the
+        assembler always gets the objects of its components, never proxies, since setters that are
+        implemented in C++ do not accept proxies. Once the composite has been assembled, its getters are
+        called on the assembled object.
+
+        When the composite is assembled its components are read with the executor enabled by
+        enableParallelComposites, if there is one. With enableEvictableProxies the components and the
+        assembled composite are held by EvictableReadProxys.
 
-        return tuples
+        Parameters
+        ----------
+        enable : bool, optional
+            True to return proxies for composites, False to read them when they are gotten.
+        """
+        self._lazyComposites = enable
+        self._features['enableLazyComposites'] = (enable,)
 
-    def datasetExists(self, datasetType, dataId={}, write=False, **rest):
-        """Determines if a dataset file exists.
+    def enableParallelQueries(self, maxWorkers=8):
+        """List the dataIds of subsets from all the input repositories, querying them concurrently.
+
+        By default a subset lists its dataIds with queryMetadata, which asks the input repositories one after
+        another and uses the answer of the first one that has any, so dataIds that are only in later
+        repositories are not listed. With this enabled the subsets that are not streamed ask all the input
+        repositories at once, on a pool of threads, and merge their answers in the order of the
+        repositories, dropping the dataIds that an earlier repository already listed (see
+        queryMetadataTable, querySubsetMetadata and querySubsetMetadataTable).
 
         Parameters
         ----------
-        datasetType - string
-            The type of dataset to inquire about.
-        dataId - DataId, dict
-            The data id of the dataset.
-        write - bool
-            If True, look only in locations where the dataset could be written,
-            and return True only if it is present in all of them.
-        **rest keyword arguments for the data id.
-
-        Returns
-        -------
-        exists - bool
-            True if the dataset exists or is non-file-based.
+        maxWorkers : int or None, optional
+            The number of threads that query repositories. If 0 or None, subsets use queryMetadata.
         """
-        datasetType = self._resolveDatasetTypeAlias(datasetType)
-        dataId = DataId(dataId)
-        dataId.update(**rest)
-        locations = self._locate(datasetType, dataId, write=write)
-        if not write:  # when write=False, locations is not a sequence
-            if locations is None:
-                return False
-            locations = [locations]
+        if self._queryExecutor is not None:
+            self._queryExecutor.shutdown(wait=False)
+            self._queryExecutor = None
+        self._queryMaxWorkers = maxWorkers if maxWorkers else None
+        self._features['enableParallelQueries'] = (maxWorkers,)
 
-        if not locations:  # empty list
-            return False
+    def enablePrefetch(self, maxWorkers=4):
+        """Start reading a dataset as soon as get(immediate=False) returns a proxy for it.
 
-        for location in locations:
-            # If the location is a ButlerComposite (as opposed to a ButlerLocation),
-            # verify the component objects exist.
-            if isinstance(location, ButlerComposite):
-                for name, componentInfo in location.componentInfo.items():
-                    if componentInfo.subset:
-                        subset = self.subset(datasetType=componentInfo.datasetType, dataId=location.dataId)
-                        exists = all([obj.datasetExists() for obj in subset])
-                    else:
-                        exists = self.datasetExists(componentInfo.datasetType, location.dataId)
-                    if exists is False:
-                        return False
-            else:
-                if not location.repository.exists(location):
-                    return False
-        return True
+        By default the proxy returned by get(immediate=False) reads its dataset when it is first used, so the
+        caller waits for the whole read then. With prefetching the read is started on a pool of threads when
+        the proxy is made, and the first use of the proxy waits only for what is left of it. The object is
+        standardized by the mapper when the proxy is first used, in the thread that uses it.
 
-    def _locate(self, datasetType, dataId, write):
-        """Get one or more ButlerLocations and/or ButlercComposites.
+        Datasets that are composites or that have bypass functions are not prefetched.
 
         Parameters
         ----------
-        datasetType : string
-            The datasetType that is being searched for. The datasetType may be followed by a dot and
-            a component name (component names are specified in the policy). IE datasetType.componentName
+        maxWorkers : int or None, optional
+            The number of threads that prefetch datasets. If 0 or None, datasets are not prefetched.
+        """
+        if self._prefetchExecutor is not None:
+            self._prefetchExecutor.shutdown(wait=False)
+            self._prefetchExecutor = None
+        self._prefetchMaxWorkers = maxWorkers if maxWorkers else None
+        self._features['enablePrefetch'] = (maxWorkers,)
 
-        dataId : dict or DataId class instance
+    def _getPrefetchExecutor(self):
+        """Get the executor that prefetches datasets, creating it if needed.
+
+        Returns
+        -------
+        concurrent.futures.ThreadPoolExecutor
+            The executor.
+        """
+        if self._prefetchExecutor is None:
+            self._prefetchExecutor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self._prefetchMaxWorkers)
+        return self._prefetchExecutor
+
+    def enableEvictableProxies(self, enable=True):
+        """Make get(immediate=False) return EvictableReadProxys, whose objects are dropped when the
+        process-wide ProxyMemoryBudget is exceeded and read again when they are next used.
+
+        The budget is the one returned by ProxyMemoryBudget.getDefault(); use ProxyMemoryBudget.setDefault
+        to set its size. Use the budget's pin and unpin methods (or its pinned context manager) to keep the
+        objects that are being used or changed.
+
+        Parameters
+        ----------
+        enable : bool, optional
+            True to return EvictableReadProxys, False to return ReadProxys, which keep their objects.
+        """
+        self._evictableProxies = enable
+        self._features['enableEvictableProxies'] = (enable,)
+
+    def enableWriteBehind(self, maxWorkers=2, maxBytes=2**30, maxPending=16):
+        """Make put return as soon as the dataset is located, writing it on a pool of threads.
+
+        The dataset is located (and backed up, and a composite is disassembled) in the calling thread; then
+        the object is serialized and written by its formatter in the pool, so that the caller can go on with
+        its work while the file is written. The object must not be changed after it is put until it has
+        been written (see flush).
+
+        When the estimated size of the objects waiting to be written is over maxBytes, or maxPending writes
+        are waiting, put blocks until enough of them are written. The size of an object is estimated with
+        ObjectCache.estimateSize, which measures afw images and catalogs, numpy arrays and objects of types
+        that have a registered size estimator; others are counted as their sys.getsizeof, so for them only
+        maxPending bounds the memory held by the queue. Writes to the same location are done in the order
+        they were put, and get, datasetExists and queries of a dataset type wait for its queued writes first.
+        putMany and aput are not queued.
+
+        An error raised by a queued write is raised by the next call to flush, which is called when the
+        Butler is used as a context manager and its block exits.
+
+        Parameters
+        ----------
+        maxWorkers : int or None, optional
+            The number of threads that write datasets. If 0 or None, put writes in the calling thread.
+        maxBytes : int, optional
+            The budget, in bytes, of the objects waiting to be written.
+        maxPending : int, optional
+            The maximum number of writes waiting to be written (including those being written).
+
+        Raises
+        ------
+        Exception
+            An error raised by a write queued before this call (see flush).
+        """
+        if self._writeBehind is not None:
+            queue = self._writeBehind
+            self._writeBehind = None
+            queue.shutdown()
+            self._raiseWriteErrors(queue)
+        if maxWorkers:
+            self._writeBehind = _WriteBehindQueue(maxWorkers, maxBytes, maxPending)
+        self._features['enableWriteBehind'] = (maxWorkers, maxBytes, maxPending)
+
+    def flush(self):
+        """Wait for the writes queued by put (see enableWriteBehind) to be done.
+
+        Raises
+        ------
+        Exception
+            The first error raised by a write queued since the last flush; the others are logged.
+        """
+        if self._writeBehind is not None:
+            self._raiseWriteErrors(self._writeBehind)
+
+    def _raiseWriteErrors(self, queue):
+        queue.wait()
+        errors = queue.takeErrors()
+        for error in errors[1:]:
+            self.log.warn("Queued write failed: %s", error)
+        if errors:
+            raise errors[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if excType is None:
+            self.flush()
+        else:
+            # do not hide the error that is leaving the block.
+            try:
+                self.flush()
+            except Exception as e:
+                self.log.warn("Queued write failed: %s", e)
+        return False
+
+    def enableFanOutWrites(self, enable=True, hardlink=False):
+        """Serialize a dataset that is put to more than one output repository only once.
+
+        By default put runs the write formatter (e.g. FITS encoding and compression) once for each output
+        repository. With this enabled the object is written to the first output, and the others are written
+        by cloning that file (see PosixStorage.copyWrite): with a reflink if the filesystem supports it, else
+        (if hardlink is True) a hard link, else a copy by the kernel. Each copy is made in a temporary file
+        that is renamed into place. Outputs whose storage can not clone the file, or that write the dataset
+        with different options, are written with the formatter.
+
+        Parameters
+        ----------
+        enable : bool, optional
+            True to serialize datasets once, False to run the formatter for each output.
+        hardlink : bool, optional
+            True to allow the outputs to share one file through hard links. The files are then shared by the
+            repositories, so this should only be used when they are not changed in place.
+        """
+        self._fanOutWrites = enable
+        self._fanOutHardlink = hardlink
+        self._features['enableFanOutWrites'] = (enable, hardlink)
+
+    def _waitForWrites(self, datasetType):
+        """Wait for the queued writes of a dataset type (see enableWriteBehind) to be done.
+
+        Parameters
+        ----------
+        datasetType : string
+            The (de-aliased) datasetType, which may name a component.
+        """
+        if self._writeBehind is not None:
+            self._writeBehind.wait(self._splitComponents(datasetType)[0])
+
+    def resolveProxies(self, proxies, maxWorkers=None):
+        """Get the objects of a group of proxies returned by get(immediate=False), reading them
+        concurrently.
+
+        The reads of the proxies that have not been started (or prefetched) are all started first, on the
+        prefetch executor if prefetching is enabled or else on a pool of threads that is used for this call
+        only; then the objects are standardized, in order, in the calling thread. Proxies of composites and of
+        datasets that have bypass functions are resolved in the calling thread, and items that are not
+        proxies are returned as they are.
+
+        Parameters
+        ----------
+        proxies : iterable of ReadProxy
+            The proxies.
+        maxWorkers : int or None, optional
+            The number of threads used to read the datasets if prefetching is not enabled. If None, the
+            default of `concurrent.futures.ThreadPoolExecutor` is used.
+
+        Returns
+        -------
+        list
+            The objects, in the order of the proxies.
+        """
+        proxies = list(proxies)
+        pending = []
+        for proxy in proxies:
+            if not isinstance(proxy, ReadProxy):
+                continue
+            callback = get_callback(proxy)
+            if not isinstance(callback, _DeferredRead) or callback.future is not None:
+                continue
+            if not is_loaded(proxy):
+                pending.append(callback)
+        executor = None
+        if pending:
+            if self._prefetchMaxWorkers:
+                executor = self._getPrefetchExecutor()
+            else:
+                executor = concurrent.futures.ThreadPoolExecutor(max_workers=maxWorkers)
+            for callback in pending:
+                callback.start(executor)
+        try:
+            return [proxy.__subject__ if isinstance(proxy, ReadProxy) else proxy for proxy in proxies]
+        finally:
+            if executor is not None and executor is not self._prefetchExecutor:
+                executor.shutdown(wait=True)
+
+    def enableFastPickle(self, enable=True):
+        """Pickle this Butler with its resolved repository graph, so that unpickling it does not build the
+        Butler again.
+
+        By default a pickled Butler holds only the arguments it was created with, and unpickling it reads the
+        RepositoryCfgs, resolves the parents and creates the output mappers again. With fast pickling the
+        pickle holds the RepositoryCfgs and the parent graph that were already resolved; in the unpickled
+        Butler the Repositories (and their mappers, registries and open files) are created when they are
+        first used. This is meant for sending a Butler to the workers of a process pool.
+
+        The caches and settings enabled with the enable and set methods of this Butler are enabled in the
+        unpickled Butler too (empty), as are its dataset type aliases.
+
+        .. warning:: The unpickled Butler trusts the RepositoryCfgs in the pickle; the repositories should not
+        be changed by other processes while the pickle is in use.
+
+        Parameters
+        ----------
+        enable : bool, optional
+            True to pickle this Butler with its repository graph, False to pickle only its arguments.
+        """
+        self._fastPickle = enable
+        self._features['enableFastPickle'] = (enable,)
+
+    def enableStats(self, enable=True):
+        """Count and time the phases of this Butler's work (resolving aliases, locating, mapping, checking
+        existence, bypass functions, reading, writing and standardizing), by dataset type and repository.
+
+        When the stats are not enabled (the default) nothing is counted or timed.
+
+        Parameters
+        ----------
+        enable : bool, optional
+            True to start collecting stats (from zero), False to stop.
+        """
+        self._butlerStats = ButlerStats() if enable else None
+        self._features['enableStats'] = (enable,)
+        self._updateMonitor()
+
+    def getStats(self):
+        """Get the stats collected since they were enabled or last reset.
+
+        Returns
+        -------
+        ButlerStats or None
+            The stats, or None if they are not enabled.
+        """
+        return self._butlerStats
+
+    def resetStats(self):
+        """Clear the stats, e.g. at the start of a task."""
+        if self._butlerStats is not None:
+            self._butlerStats.reset()
+
+    def enableTracing(self, path, flushSize=10000):
+        """Record a span for each Butler call and each step within it (resolving aliases, locating, mapping
+        and checking existence in each repository, bypass functions, reading, writing, reading the
+        components of composites and standardizing), and write them to a Chrome trace-event JSON file.
+
+        The file can be opened in chrome://tracing or https://ui.perfetto.dev, which show the spans of each
+        thread nested on their own track, so that serialized and overlapping I/O can be seen. The spans are
+        appended to the file when flushSize of them are waiting, when tracing is disabled, when
+        getTracer().flush() is called and when the process (or multiprocessing pool worker) exits.
+
+        Parameters
+        ----------
+        path : string or None
+            The path of the trace file. It is formatted with the process id as `pid`, e.g.
+            'butler-{pid}.json', so that each process (e.g. the workers that a fast-pickled Butler is sent
+            to) writes its own file. If None, tracing is disabled (and the spans recorded so far are written).
+        flushSize : int, optional
+            The number of spans to keep in memory before they are written to the file.
+        """
+        if self._tracer is not None:
+            self._tracer.close()
+        self._tracer = ButlerTracer(path, flushSize) if path else None
+        self._features['enableTracing'] = (path, flushSize)
+        self._updateMonitor()
+
+    def getTracer(self):
+        """Get the tracer that records the spans of this Butler's work.
+
+        Returns
+        -------
+        ButlerTracer or None
+            The tracer, or None if tracing is not enabled.
+        """
+        return self._tracer
+
+    def _updateMonitor(self):
+        monitors = [monitor for monitor in (self._butlerStats, self._tracer) if monitor is not None]
+        if not monitors:
+            self._monitor = NullButlerStats()
+        elif len(monitors) == 1:
+            self._monitor = monitors[0]
+        else:
+            self._monitor = _MonitorGroup(monitors)
+
+    def _getExecutor(self):
+        """Get the executor managed by this Butler, creating it if needed.
+
+        Returns
+        -------
+        concurrent.futures.ThreadPoolExecutor
+            The executor.
+        """
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self._maxWorkers)
+        return self._executor
+
+    @_monitored('getKeys')
+    def getKeys(self, datasetType=None, level=None, tag=None):
+        """Get the valid data id keys at or above the given level of hierarchy for the dataset type or the
+        entire collection if None. The dict values are the basic Python types corresponding to the keys (int,
+        float, string).
+
+        Parameters
+        ----------
+        datasetType - string
+            The type of dataset to get keys for, entire collection if None.
+        level - string
+            The hierarchy level to descend to. None if it should not be restricted. Use an empty string if the
+            mapper should lookup the default level.
+        tags - any, or list of any
+            Any object that can be tested to be the same as the tag in a dataId passed into butler input
+            functions. Applies only to input repositories: If tag is specified by the dataId then the repo
+            will only be read from used if the tag in the dataId matches a tag used for that repository.
+
+        Returns
+        -------
+        Returns a dict. The dict keys are the valid data id keys at or above the given level of hierarchy for
+        the dataset type or the entire collection if None. The dict values are the basic Python types
+        corresponding to the keys (int, float, string).
+        """
+        datasetType = self._resolveDatasetTypeAlias(datasetType)
+
+        keys = None
+        tag = setify(tag)
+        for repoData in self._repos.inputs():
+            if not tag or len(tag.intersection(repoData.tags)) > 0:
+                keys = self._queryRepo(repoData, 'getKeys', datasetType, level)
+                # An empty dict is a valid "found" condition for keys. The only value for keys that should
+                # cause the search to continue is None
+                if keys is not None:
+                    break
+        return keys
+
+    @_monitored('queryMetadata')
+    def queryMetadata(self, datasetType, format, dataId={}, **rest):
+        """Returns the valid values for one or more keys when given a partial
+        input collection data id.
+
+        Parameters
+        ----------
+        datasetType - string
+            The type of dataset to inquire about.
+        format - str, tuple
+            Key or tuple of keys to be returned.
+        dataId - DataId, dict
+            The partial data id.
+        **rest -
+            Keyword arguments for the partial data id.
+
+        Returns
+        -------
+        A list of valid values or tuples of valid values as specified by the
+        format.
+        """
+
+        datasetType = self._resolveDatasetTypeAlias(datasetType)
+        dataId = DataId(dataId)
+        dataId.update(**rest)
+        format = sequencify(format)
+
+        tuples = None
+        for repoData in self._repos.inputs():
+            if not dataId.tag or len(dataId.tag.intersection(repoData.tags)) > 0:
+                tuples = self._queryRepo(repoData, 'queryMetadata', datasetType, format, dataId)
+                if tuples:
+                    break
+
+        if not tuples:
+            return []
+
+        if len(format) == 1:
+            ret = []
+            for x in tuples:
+                try:
+                    ret.append(x[0])
+                except TypeError:
+                    ret.append(x)
+            return ret
+
+        return tuples
+
+    def queryMetadataIter(self, datasetType, format, dataId={}, **rest):
+        """Returns an iterator over the valid values for one or more keys when given a partial input
+        collection data id.
+
+        Unlike queryMetadata, the values are not gathered into a list by the butler. If the mapper supports
+        it (see Mapper.getRegistryLookup) they are fetched from its registry as they are iterated over;
+        otherwise the mapper's queryMetadata list is iterated over. Like queryMetadata, the values come from
+        the first input repository that has any. The metadata cache is not used.
+
+        Parameters
+        ----------
+        datasetType - string
+            The type of dataset to inquire about.
+        format - str, tuple
+            Key or tuple of keys to be returned.
+        dataId - DataId, dict
+            The partial data id.
+        **rest -
+            Keyword arguments for the partial data id.
+
+        Returns
+        -------
+        A generator of valid values or tuples of valid values as specified by the format.
+        """
+        datasetType = self._resolveDatasetTypeAlias(datasetType)
+        dataId = DataId(dataId)
+        dataId.update(**rest)
+        format = sequencify(format)
+
+        for repoData in self._repos.inputs():
+            if dataId.tag and len(dataId.tag.intersection(repoData.tags)) == 0:
+                continue
+            tuples = repoData.repo.queryMetadataIter(datasetType, format, dataId)
+            if tuples is None:
+                continue
+            found = False
+            for x in tuples:
+                found = True
+                if len(format) == 1:
+                    try:
+                        x = x[0]
+                    except TypeError:
+                        pass
+                yield x
+            if found:
+                return
+
+    def queryMetadataTable(self, datasetType, format, dataId={}, **rest):
+        """Returns the valid values for one or more keys when given a partial input collection data id, from
+        all the input repositories.
+
+        Unlike queryMetadata, which uses the first input repository that has any values, this asks every
+        input repository (concurrently, if enableParallelQueries has been called) and merges their values in
+        the order of the repositories; a value that an earlier repository also has is dropped.
+
+        Parameters
+        ----------
+        datasetType - string
+            The type of dataset to inquire about.
+        format - str, tuple
+            Key or tuple of keys to be returned.
+        dataId - DataId, dict
+            The partial data id.
+        **rest -
+            Keyword arguments for the partial data id.
+
+        Returns
+        -------
+        DataIdTable
+            The distinct values, with the keys of the format.
+        """
+        datasetType = self._resolveDatasetTypeAlias(datasetType)
+        dataId = DataId(dataId)
+        dataId.update(**rest)
+        format = sequencify(format)
+
+        repoDatas = [repoData for repoData in self._repos.inputs()
+                     if not dataId.tag or len(dataId.tag.intersection(repoData.tags)) > 0]
+        if self._queryMaxWorkers and len(repoDatas) > 1:
+            # Create the Repositories (and their mappers) in this thread; only the queries run on the pool.
+            for repoData in repoDatas:
+                repoData.repo
+            executor = self._getQueryExecutor()
+            futures = [executor.submit(self._queryRepo, repoData, 'queryMetadata', datasetType, format,
+                                       dataId) for repoData in repoDatas]
+            results = [future.result() for future in futures]
+        else:
+            results = [self._queryRepo(repoData, 'queryMetadata', datasetType, format, dataId)
+                       for repoData in repoDatas]
+
+        def iterValues():
+            for tuples in results:
+                for x in tuples or ():
+                    if len(format) == 1:
+                        try:
+                            x = x[0]
+                        except TypeError:
+                            pass
+                    yield x
+        return DataIdTable.fromTuples(format, iterValues()).unique()
+
+    def _getQueryExecutor(self):
+        """Get the executor that queries repositories, creating it if needed.
+
+        Returns
+        -------
+        concurrent.futures.ThreadPoolExecutor
+            The executor.
+        """
+        if self._queryExecutor is None:
+            self._queryExecutor = concurrent.futures.ThreadPoolExecutor(max_workers=self._queryMaxWorkers)
+        return self._queryExecutor
+
+    def querySubsetMetadata(self, datasetType, format, dataId={}, **rest):
+        """Returns the valid values for one or more keys when given a partial input collection data id, as
+        they are listed by the subsets of this Butler.
+
+        This is queryMetadata by default, and queryMetadataTable (which asks all the input repositories)
+        if enableParallelQueries has been called.
+
+        Parameters
+        ----------
+        datasetType - string
+            The type of dataset to inquire about.
+        format - str, tuple
+            Key or tuple of keys to be returned.
+        dataId - DataId, dict
+            The partial data id.
+        **rest -
+            Keyword arguments for the partial data id.
+
+        Returns
+        -------
+        A list of valid values or tuples of valid values as specified by the format.
+        """
+        if not self._queryMaxWorkers:
+            return self.queryMetadata(datasetType, format, dataId, **rest)
+        format = sequencify(format)
+        table = self.queryMetadataTable(datasetType, format, dataId, **rest)
+        if len(format) == 1:
+            return [row[format[0]] for row in table]
+        return [tuple(row[key] for key in format) for row in table]
+
+    def querySubsetMetadataTable(self, datasetType, format, dataId={}, **rest):
+        """Returns the valid values for one or more keys when given a partial input collection data id, as
+        they are listed by the subsets of this Butler, in a DataIdTable.
+
+        This is the columnar form of querySubsetMetadata: with parallel queries enabled the table of
+        queryMetadataTable is returned as it is, without making a Python tuple for each of its rows.
+
+        Parameters
+        ----------
+        datasetType - string
+            The type of dataset to inquire about.
+        format - str, tuple
+            Key or tuple of keys to be returned.
+        dataId - DataId, dict
+            The partial data id.
+        **rest -
+            Keyword arguments for the partial data id.
+
+        Returns
+        -------
+        DataIdTable
+            The valid values, with a column for each key in format.
+        """
+        format = sequencify(format)
+        if self._queryMaxWorkers:
+            return self.queryMetadataTable(datasetType, format, dataId, **rest)
+        return DataIdTable.fromTuples(format, self.queryMetadata(datasetType, format, dataId, **rest))
+
+    def queryMetadataCount(self, datasetType, format, dataId={}, **rest):
+        """Returns the number of values that queryMetadata would return for the same arguments.
+
+        The registry of the mapper counts the values without returning them, if the mapper supports it (see
+        Mapper.getRegistryLookup). Otherwise the values can only be counted by fetching them, and None is
+        returned.
+
+        Parameters
+        ----------
+        datasetType - string
+            The type of dataset to inquire about.
+        format - str, tuple
+            Key or tuple of keys to be counted.
+        dataId - DataId, dict
+            The partial data id.
+        **rest -
+            Keyword arguments for the partial data id.
+
+        Returns
+        -------
+        int or None
+            The number of values, or None if the mapper of an input repository that was asked can not count
+            them without fetching them.
+        """
+        datasetType = self._resolveDatasetTypeAlias(datasetType)
+        dataId = DataId(dataId)
+        dataId.update(**rest)
+        format = sequencify(format)
+
+        for repoData in self._repos.inputs():
+            if not dataId.tag or len(dataId.tag.intersection(repoData.tags)) > 0:
+                count = repoData.repo.queryMetadataCount(datasetType, format, dataId)
+                if count is None:
+                    return None
+                if count:
+                    return count
+        return 0
+
+    def _queryRepo(self, repoData, query, datasetType, *args):
+        """Call getKeys or queryMetadata on the Repository of a RepoData, using its metadata cache if it has
+        one.
+
+        Parameters
+        ----------
+        repoData : RepoData
+            The repository to query.
+        query : string
+            'getKeys' or 'queryMetadata'.
+        datasetType : string
+            The (de-aliased) datasetType to query.
+        *args
+            The other arguments of the query.
+
+        Returns
+        -------
+        object
+            The result of the query; a cached result is returned as a copy.
+        """
+        self._waitForWrites(datasetType)
+        cache = repoData.metadataCache
+        key = None
+        if cache is not None:
+            keyArgs = []
+            for arg in args:
+                if isinstance(arg, dict):
+                    arg = makeDataIdKey(arg)
+                    if arg is None:
+                        # the dataId holds unhashable values (such as ranges); the query is not cached.
+                        keyArgs = None
+                        break
+                elif isinstance(arg, list):
+                    arg = tuple(arg)
+                keyArgs.append(arg)
+            if keyArgs is not None:
+                key = cache.makeKey(datasetType, query, *keyArgs)
+        if key is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                return copy.copy(cached[0])
+        result = getattr(repoData.repo, query)(datasetType, *args)
+        if key is not None:
+            cache.put(key, (copy.copy(result),))
+        return result
+
+    @_monitored('datasetExists')
+    def datasetExists(self, datasetType, dataId={}, write=False, **rest):
+        """Determines if a dataset file exists.
+
+        Parameters
+        ----------
+        datasetType - string
+            The type of dataset to inquire about.
+        dataId - DataId, dict
+            The data id of the dataset.
+        write - bool
+            If True, look only in locations where the dataset could be written,
+            and return True only if it is present in all of them.
+        **rest keyword arguments for the data id.
+
+        Returns
+        -------
+        exists - bool
+            True if the dataset exists or is non-file-based.
+        """
+        datasetType = self._resolveDatasetTypeAlias(datasetType)
+        dataId = DataId(dataId)
+        dataId.update(**rest)
+        self._waitForWrites(datasetType)
+        locations = self._locate(datasetType, dataId, write=write)
+        if not write:  # when write=False, locations is not a sequence
+            if locations is None:
+                return False
+            locations = [locations]
+
+        if not locations:  # empty list
+            return False
+
+        for location in locations:
+            # If the location is a ButlerComposite (as opposed to a ButlerLocation),
+            # verify the component objects exist.
+            if isinstance(location, ButlerComposite):
+                for name, componentInfo in location.componentInfo.items():
+                    if componentInfo.subset:
+                        subset = self.subset(datasetType=componentInfo.datasetType, dataId=location.dataId)
+                        exists = all([obj.datasetExists() for obj in subset])
+                    else:
+                        exists = self.datasetExists(componentInfo.datasetType, location.dataId)
+                    if exists is False:
+                        return False
+            else:
+                if not self._exists(location):
+                    return False
+        return True
+
+    def _exists(self, location):
+        """Check if the dataset at a plain location exists in storage.
+
+        Parameters
+        ----------
+        location : ButlerLocation
+            The location.
+
+        Returns
+        -------
+        bool
+            True if the dataset exists.
+        """
+        with self._monitor.timer('exists', location.datasetType, location.repository.root):
+            return location.repository.exists(location)
+
+    @_monitored('datasetExistsMany')
+    def datasetExistsMany(self, datasetType, dataIds, write=False):
+        """Determine which of many datasets of one dataset type exist.
+
+        This gives the same answers as calling datasetExists for each data id, but the locations for all the
+        data ids are found in each input repository first and their existence is then checked as a batch,
+        which lets a storage answer many checks with few requests (e.g. PosixStorage lists each directory
+        once). Composite datasets, dotted (component) dataset types, dataset types with a bypass function and
+        write=True are checked one at a time with datasetExists.
+
+        Parameters
+        ----------
+        datasetType : string
+            The type of dataset to inquire about.
+        dataIds : iterable of dict or DataId
+            The data ids of the datasets.
+        write : bool, optional
+            If True, look only in locations where the datasets could be written, and return True only for the
+            datasets that are present in all of them.
+
+        Returns
+        -------
+        numpy.ndarray of bool
+            True for each dataset that exists, in the order of dataIds.
+        """
+        datasetType = self._resolveDatasetTypeAlias(datasetType)
+        dataIds = [DataId(dataId) for dataId in dataIds]
+        self._waitForWrites(datasetType)
+        exists = np.zeros(len(dataIds), dtype=bool)
+        if write or '.' in datasetType:
+            for i, dataId in enumerate(dataIds):
+                exists[i] = self.datasetExists(datasetType, dataId, write=write)
+            return exists
+
+        pending = list(range(len(dataIds)))
+        for repoData in self._repos.inputs():
+            if not pending:
+                break
+            stillPending = []
+            indices = []
+            locations = []
+            for i in pending:
+                dataId = dataIds[i]
+                if dataId.tag and len(dataId.tag.intersection(repoData.tags)) == 0:
+                    stillPending.append(i)
+                    continue
+                try:
+                    location = repoData.repo.map(datasetType, dataId, write=False)
+                except NoResults:
+                    location = None
+                if location is None:
+                    stillPending.append(i)
+                    continue
+                location.datasetType = datasetType
+                if (isinstance(location, ButlerComposite) or
+                        self._getBypassMethod(location.mapper, location.datasetType) is not None):
+                    exists[i] = self.datasetExists(datasetType, dataId)
+                    continue
+                indices.append(i)
+                locations.append(location)
+            for i, found in zip(indices, repoData.repo.existsMany(locations)):
+                if found:
+                    exists[i] = True
+                else:
+                    stillPending.append(i)
+            pending = sorted(stillPending)
+        return exists
+
+    @_monitored('adatasetExists')
+    async def adatasetExists(self, datasetType, dataId={}, write=False, **rest):
+        """Determine if a dataset file exists, without blocking the event loop on storage access.
+
+        This is the coroutine version of datasetExists. The datasets are mapped in the event loop's thread
+        (mappers and registries are not thread-safe) and the storage is checked in the executor managed by
+        this Butler (see setMaxWorkers). Composite datasets and dataset types with a bypass function are
+        checked with datasetExists.
+
+        Parameters
+        ----------
+        datasetType - string
+            The type of dataset to inquire about.
+        dataId - DataId, dict
+            The data id of the dataset.
+        write - bool
+            If True, look only in locations where the dataset could be written,
+            and return True only if it is present in all of them.
+        **rest keyword arguments for the data id.
+
+        Returns
+        -------
+        exists - bool
+            True if the dataset exists or is non-file-based.
+        """
+        datasetType = self._resolveDatasetTypeAlias(datasetType)
+        dataId = DataId(dataId)
+        dataId.update(**rest)
+        if write or '.' in datasetType:
+            if write:
+                locations = self._locate(datasetType, dataId, write=True)
+            else:
+                locations = await self._alocate(datasetType, dataId)
+            if not write:
+                if locations is None:
+                    return False
+                locations = [locations]
+            if not locations:
+                return False
+            if any(isinstance(location, ButlerComposite) for location in locations):
+                return self.datasetExists(datasetType, dataId, write=write)
+            for location in locations:
+                if not await location.repository.aexists(location, self._getExecutor()):
+                    return False
+            return True
+
+        for repoData in self._repos.inputs():
+            if dataId.tag and len(dataId.tag.intersection(repoData.tags)) == 0:
+                continue
+            try:
+                location = repoData.repo.map(datasetType, dataId, write=False)
+            except NoResults:
+                continue
+            if location is None:
+                continue
+            location.datasetType = datasetType
+            if (isinstance(location, ButlerComposite) or
+                    self._getBypassMethod(location.mapper, location.datasetType) is not None):
+                return self.datasetExists(datasetType, dataId)
+            if await repoData.repo.aexists(location, self._getExecutor()):
+                return True
+        return False
+
+    def _locate(self, datasetType, dataId, write):
+        """Get one or more ButlerLocations and/or ButlercComposites.
+
+        Parameters
+        ----------
+        datasetType : string
+            The datasetType that is being searched for. The datasetType may be followed by a dot and
+            a component name (component names are specified in the policy). IE datasetType.componentName
+
+        dataId : dict or DataId class instance
             The dataId
 
         write : bool
@@ -1280,20 +2673,58 @@ class Butler:
         If write is False, will return either a single object or None. If write is True, will return a list
         (which may be empty)
         """
+        if not write:
+            self._waitForWrites(datasetType)
+        with self._monitor.timer('locate', datasetType):
+            if self._locationCache is None:
+                return self._search(datasetType, dataId, write)
+            key = self._locationCache.makeKey(datasetType, dataId, write)
+            if key is None:
+                return self._search(datasetType, dataId, write)
+            location = self._locationCache.get(key)
+            if location is not None:
+                return list(location) if write else location
+            location = self._search(datasetType, dataId, write)
+            if write:
+                if location and all(isinstance(loc, ButlerLocation) for loc in location):
+                    self._locationCache.put(key, list(location))
+            elif (isinstance(location, ButlerLocation) and
+                    self._getBypassMethod(location.mapper, location.datasetType) is None):
+                # a location with a bypass function is not cached even when the bypass failed (and the
+                # location has no bypass result), so that later gets try the bypass function again.
+                self._locationCache.put(key, location)
+            return location
+
+    def _search(self, datasetType, dataId, write):
+        """Search the repositories for one or more ButlerLocations and/or ButlerComposites.
+
+        This performs the search for `_locate`, without consulting the location cache. The parameters and
+        return value are the same as for `_locate`.
+        """
         repos = self._repos.outputs() if write else self._repos.inputs()
         locations = []
+        # the negative lookup caches are only used for plain (not dotted) dataset types when reading.
+        useNegativeCache = not write and '.' not in datasetType
         for repoData in repos:
             # enforce dataId & repository tags when reading:
             if not write and dataId.tag and len(dataId.tag.intersection(repoData.tags)) == 0:
                 continue
-            components = datasetType.split('.')
-            datasetType = components[0]
-            components = components[1:]
+            negativeCache = repoData.negativeLookupCache if useNegativeCache else None
+            negativeKey = None
+            if negativeCache is not None:
+                negativeKey = negativeCache.makeKey(datasetType, dataId, False)
+                if negativeKey is not None and negativeCache.get(negativeKey):
+                    continue
+            datasetType, components = self._splitComponents(datasetType)
+            components = list(components)
             try:
-                location = repoData.repo.map(datasetType, dataId, write=write)
+                with self._monitor.timer('map', datasetType, repoData.cfg.root):
+                    location = repoData.repo.map(datasetType, dataId, write=write)
             except NoResults:
-                continue
+                location = None
             if location is None:
+                if negativeKey is not None:
+                    negativeCache.put(negativeKey, True)
                 continue
             location.datasetType = datasetType  # todo is there a better way than monkey patching here?
             if len(components) > 0:
@@ -1316,10 +2747,11 @@ class Butler:
                     # in the bypass attribute of the location. The bypass function may fail for any reason,
                     # the most common case being that a file does not exist. If it raises an exception
                     # indicating such, we ignore the bypass function and proceed as though it does not exist.
-                    if hasattr(location.mapper, "bypass_" + location.datasetType):
+                    if self._getBypassMethod(location.mapper, location.datasetType) is not None:
                         bypass = self._getBypassFunc(location, dataId)
                         try:
-                            bypass = bypass()
+                            with self._monitor.timer('bypass', datasetType, repoData.cfg.root):
+                                bypass = bypass()
                             location.bypass = bypass
                         except (NoResults, IOError):
                             self.log.debug("Continuing dataset search while evaluating "
@@ -1329,8 +2761,10 @@ class Butler:
                     # repositories (the registry may have had enough data for a lookup even thought the object
                     # exists in a different repository.)
                     if (isinstance(location, ButlerComposite) or hasattr(location, 'bypass') or
-                            location.repository.exists(location)):
+                            self._exists(location)):
                         return location
+                    if negativeKey is not None:
+                        negativeCache.put(negativeKey, True)
                 else:
                     try:
                         locations.extend(location)
@@ -1340,15 +2774,121 @@ class Butler:
             return None
         return locations
 
+    async def _alocate(self, datasetType, dataId):
+        """Get the ButlerLocation or ButlerComposite to read a dataset from, without blocking the event loop
+        on storage access.
+
+        This is the coroutine version of `_locate` for reads. The location cache is consulted and the
+        repositories are mapped in the event loop's thread, as adatasetExists does; waiting for queued
+        writes, bypass functions and the checks that datasets exist are run in the executor managed by this
+        Butler (see setMaxWorkers).
+
+        Parameters
+        ----------
+        datasetType : string
+            The datasetType that is being searched for, which may name a component.
+        dataId : DataId
+            The dataId.
+
+        Returns
+        -------
+        ButlerLocation, ButlerComposite or None
+            The location, or None if the dataset was not found.
+        """
+        if self._writeBehind is not None:
+            await asyncio.get_running_loop().run_in_executor(self._getExecutor(), self._waitForWrites,
+                                                             datasetType)
+        key = None
+        if self._locationCache is not None:
+            key = self._locationCache.makeKey(datasetType, dataId, False)
+            if key is not None:
+                location = self._locationCache.get(key)
+                if location is not None:
+                    return location
+        location = await self._asearch(datasetType, dataId)
+        if (key is not None and isinstance(location, ButlerLocation) and
+                self._getBypassMethod(location.mapper, location.datasetType) is None):
+            self._locationCache.put(key, location)
+        return location
+
+    async def _asearch(self, datasetType, dataId):
+        """Search the input repositories for a ButlerLocation or ButlerComposite to read a dataset from,
+        without blocking the event loop on storage access.
+
+        This performs the search for `_alocate`, as `_search` does for `_locate`. The parameters and return
+        value are the same as for `_alocate`.
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._getExecutor()
+        useNegativeCache = '.' not in datasetType
+        baseType, components = self._splitComponents(datasetType)
+        for repoData in self._repos.inputs():
+            if dataId.tag and len(dataId.tag.intersection(repoData.tags)) == 0:
+                continue
+            negativeCache = repoData.negativeLookupCache if useNegativeCache else None
+            negativeKey = None
+            if negativeCache is not None:
+                negativeKey = negativeCache.makeKey(datasetType, dataId, False)
+                if negativeKey is not None and negativeCache.get(negativeKey):
+                    continue
+            try:
+                with self._monitor.timer('map', baseType, repoData.cfg.root):
+                    location = repoData.repo.map(baseType, dataId, write=False)
+            except NoResults:
+                location = None
+            if location is None:
+                if negativeKey is not None:
+                    negativeCache.put(negativeKey, True)
+                continue
+            location.datasetType = baseType
+            if len(components) > 0:
+                if not isinstance(location, ButlerComposite):
+                    raise RuntimeError("The location for a dotted datasetType must be a composite.")
+                componentType = '.'.join((location.componentInfo[components[0]].datasetType,) +
+                                         components[1:])
+                location = await self._alocate(componentType, dataId)
+                # if a component location is not found, we can not continue with this repo, move to next repo.
+                if location is None:
+                    break
+            # See _search for why a bypass function is run instead of checking that the location exists.
+            if self._getBypassMethod(location.mapper, location.datasetType) is not None:
+                bypass = self._getBypassFunc(location, dataId)
+                try:
+                    location.bypass = await loop.run_in_executor(
+                        executor, self._runBypass, bypass, location.datasetType, repoData.cfg.root)
+                except (NoResults, IOError):
+                    self.log.debug("Continuing dataset search while evaluating "
+                                   "bypass function for Dataset type:{} Data ID:{} at "
+                                   "location {}".format(datasetType, dataId, location))
+            if (isinstance(location, ButlerComposite) or hasattr(location, 'bypass') or
+                    await location.repository.aexists(location, executor)):
+                return location
+            if negativeKey is not None:
+                negativeCache.put(negativeKey, True)
+        return None
+
+    def _runBypass(self, bypass, datasetType, root):
+        """Run a bypass function made by _getBypassFunc (in an executor thread), timing it."""
+        with self._monitor.timer('bypass', datasetType, root):
+            return bypass()
+
+    @staticmethod
+    def _getBypassMethod(mapper, datasetType):
+        """Get the bypass method of a mapper for a datasetType, or None if it does not have one."""
+        if isinstance(mapper, Mapper):
+            return mapper._getMethod('bypass_', datasetType)
+        return getattr(mapper, 'bypass_' + datasetType, None)
+
     @staticmethod
     def _getBypassFunc(location, dataId):
         pythonType = location.getPythonType()
         if pythonType is not None:
             if isinstance(pythonType, str):
                 pythonType = doImport(pythonType)
-        bypassFunc = getattr(location.mapper, "bypass_" + location.datasetType)
+        bypassFunc = Butler._getBypassMethod(location.mapper, location.datasetType)
         return lambda: bypassFunc(location.datasetType, pythonType, location, dataId)
 
+    @_monitored('get')
     def get(self, datasetType, dataId=None, immediate=True, **rest):
         """Retrieves a dataset given an input collection data id.
 
@@ -1376,6 +2916,34 @@ class Butler:
             raise NoResults("No locations for get:", datasetType, dataId)
         self.log.debug("Get type=%s keys=%s from %s", datasetType, dataId, str(location))
 
+        isComposite = isinstance(location, ButlerComposite)
+        if isComposite and self._lazyComposites:
+            return self._makeCompositeProxy(location, dataId)
+        if immediate:
+            return self._makeReadCallback(location, dataId)()
+        proxyClass = EvictableReadProxy if self._evictableProxies else ReadProxy
+        if hasattr(location, 'bypass') or isComposite:
+            return proxyClass(self._makeReadCallback(location, dataId))
+        deferred = _DeferredRead(self, location, dataId)
+        if self._prefetchMaxWorkers:
+            deferred.start(self._getPrefetchExecutor())
+        return proxyClass(deferred)
+
+    def _makeReadCallback(self, location, dataId):
+        """Make a function that reads (and standardizes) the object at a location.
+
+        Parameters
+        ----------
+        location : ButlerLocation or ButlerComposite
+            The location of the dataset, as returned by _locate.
+        dataId : DataId
+            The data id the dataset was located with.
+
+        Returns
+        -------
+        callable
+            A function of no arguments that returns the object.
+        """
         if hasattr(location, 'bypass'):
             # this type loader block should get moved into a helper someplace, and duplications removed.
             def callback():
@@ -1387,11 +2955,327 @@ class Butler:
             innerCallback = callback
 
             def callback():
-                return location.mapper.standardize(location.datasetType, innerCallback(), dataId)
-        if immediate:
-            return callback()
-        return ReadProxy(callback)
+                return self._standardize(location, innerCallback(), dataId)
+        return callback
+
+    def _makeCompositeProxy(self, location, dataId):
+        """Make a proxy of a composite dataset whose components are each read only when they are used (see
+        enableLazyComposites).
+
+        Parameters
+        ----------
+        location : ButlerComposite
+            The location of the composite dataset, as returned by _locate.
+        dataId : DataId
+            The data id the dataset was located with.
+
+        Returns
+        -------
+        CompositeReadProxy
+            The proxy.
+        """
+        proxyClass = EvictableReadProxy if self._evictableProxies else ReadProxy
+        components = collections.OrderedDict()
+        getters = {}
+        for name, componentInfo in location.componentInfo.items():
+            proxy = proxyClass(self._makeComponentCallback(location, componentInfo))
+            components[name] = proxy
+            if componentInfo.getter is not None:
+                getters[componentInfo.getter] = proxy
+            else:
+                getters['get_' + name] = proxy
+                getters['get' + name.capitalize()] = proxy
+
+        def assemble():
+            with self._monitor.timer('readComponents', location.datasetType,
+                                     getattr(location.repository, 'root', None)):
+                if self._compositeMaxWorkers:
+                    executor = self._getCompositeExecutor()
+                    for proxy in components.values():
+                        callback = get_callback(proxy)
+                        if isinstance(callback, _DeferredRead) and not is_loaded(proxy):
+                            callback.start(executor)
+                for name, componentInfo in location.componentInfo.items():
+                    componentInfo.obj = components[name].__subject__
+            assembler = location.assembler or genericAssembler
+            obj = assembler(dataId=location.dataId, componentInfo=location.componentInfo, cls=location.python)
+            return self._standardize(location, obj, dataId)
+
+        return CompositeReadProxy(proxyClass(assemble), getters)
+
+    def _makeComponentCallback(self, location, componentInfo):
+        """Locate a component of a composite dataset, and make a function that reads it.
+
+        Parameters
+        ----------
+        location : ButlerComposite
+            The location of the composite dataset.
+        componentInfo : ButlerComposite.ComponentInfo
+            The component.
+
+        Returns
+        -------
+        callable
+            A function of no arguments that returns the object of the component (a list of objects for a
+            subset component). A plain component is read by a _DeferredRead, which can be started on an
+            executor. If the component can not be located the function raises NoResults.
+        """
+        datasetType = self._resolveDatasetTypeAlias(componentInfo.datasetType)
+        dataId = DataId(location.dataId)
+        if componentInfo.subset:
+            def callback():
+                requests = [(datasetType, DataId(dataRef.dataId)) for dataRef in
+                            self.subset(datasetType=datasetType, dataId=dataId)]
+                if not self._compositeMaxWorkers:
+                    return [self.get(*request, immediate=True) for request in requests]
+                results, errors = self._getAll(requests, self._getCompositeExecutor())
+                for error in errors:
+                    if error is not None:
+                        raise error
+                return results
+            return callback
+        componentLocation = self._locate(datasetType, dataId, write=False)
+        if componentLocation is None:
+            def callback():
+                raise NoResults("No locations for get:", datasetType, dataId)
+            return callback
+        if isinstance(componentLocation, ButlerLocation) and not hasattr(componentLocation, 'bypass'):
+            return _DeferredRead(self, componentLocation, dataId)
+        return self._makeReadCallback(componentLocation, dataId)
+
+    @_monitored('getMany')
+    def getMany(self, datasetType, dataIds, maxWorkers=None, returnExceptions=False):
+        """Retrieve the datasets of one dataset type for many data ids, reading them concurrently.
+
+        The locations of all the datasets are found first, in the calling thread. The reads of plain
+        (non-composite, non-bypass) datasets are then run on a pool of threads so that their I/O overlaps;
+        composite and bypass datasets and the mapper's standardization are handled in the calling thread.
+
+        Parameters
+        ----------
+        datasetType : string
+            The type of dataset to retrieve.
+        dataIds : iterable of dict or DataId
+            The data ids of the datasets to retrieve.
+        maxWorkers : int, optional
+            The maximum number of reads to run at once. If None, the default of
+            `concurrent.futures.ThreadPoolExecutor` is used.
+        returnExceptions : bool, optional
+            If False, the first error (in the order of dataIds) is raised after all the reads have finished.
+            If True, the exception raised for a data id is returned in its place in the results.
+
+        Returns
+        -------
+        list
+            The retrieved objects (or exceptions, if returnExceptions is True), in the order of dataIds.
+        """
+        datasetType = self._resolveDatasetTypeAlias(datasetType)
+        requests = [(datasetType, DataId(dataId)) for dataId in dataIds]
+        self.log.debug("GetMany type=%s count=%s", datasetType, len(requests))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=maxWorkers) as executor:
+            results, errors = self._getAll(requests, executor)
+
+        for i, error in enumerate(errors):
+            if error is not None:
+                if not returnExceptions:
+                    raise error
+                results[i] = error
+        return results
+
+    def _getAll(self, requests, executor):
+        """Retrieve many datasets, running the reads of plain datasets on an executor.
+
+        The datasets are located, and the objects standardized, in the calling thread. Composite and bypass
+        datasets are retrieved in the calling thread too.
+
+        Parameters
+        ----------
+        requests : list of (string, DataId)
+            The de-aliased datasetType and the data id of each dataset.
+        executor : concurrent.futures.Executor
+            The executor to run the reads on.
+
+        Returns
+        -------
+        (list, list)
+            The retrieved objects and the exceptions raised for each request (None where the dataset was
+            retrieved), in the order of requests.
+        """
+        results = [None] * len(requests)
+        errors = [None] * len(requests)
+        locations = [None] * len(requests)
+        for i, (datasetType, dataId) in enumerate(requests):
+            try:
+                locations[i] = self._locate(datasetType, dataId, write=False)
+                if locations[i] is None:
+                    raise NoResults("No locations for get:", datasetType, dataId)
+            except Exception as e:
+                errors[i] = e
+
+        def isPlain(location):
+            return isinstance(location, ButlerLocation) and not hasattr(location, 'bypass')
+
+        futures = {i: executor.submit(self._read, location) for i, location in enumerate(locations)
+                   if errors[i] is None and isPlain(location)}
+        for i, location in enumerate(locations):
+            if errors[i] is not None or i in futures:
+                continue
+            try:
+                obj = location.bypass if hasattr(location, 'bypass') else self._read(location)
+                results[i] = self._standardize(location, obj, requests[i][1])
+            except Exception as e:
+                errors[i] = e
+        for i, future in futures.items():
+            try:
+                results[i] = self._standardize(locations[i], future.result(), requests[i][1])
+            except Exception as e:
+                errors[i] = e
+        return results, errors
+
+    def _iterGet(self, datasetType, dataIds, prefetch, maxBytes):
+        """Retrieve the datasets of one dataset type for a sequence of data ids, reading ahead of the caller.
+
+        While the caller works on one object the next prefetch datasets are read on a pool of threads. The
+        datasets are located, and the objects standardized, in the calling thread.
+
+        Parameters
+        ----------
+        datasetType : string
+            The type of dataset to retrieve.
+        dataIds : iterable of dict or DataId
+            The data ids of the datasets to retrieve.
+        prefetch : int
+            The number of datasets to read ahead of the one being returned.
+        maxBytes : int or None
+            If not None, no more datasets are read ahead once the sum of the sizes in storage of the datasets
+            that have been read ahead but not yet returned would exceed maxBytes. At least one dataset is
+            always read, regardless of its size.
+
+        Yields
+        ------
+        object
+            The retrieved objects, in the order of dataIds.
+        """
+        datasetType = self._resolveDatasetTypeAlias(datasetType)
+        dataIds = iter(dataIds)
+        pending = collections.deque()
+        pendingBytes = 0
+        nextItem = None
+        prefetch = max(prefetch, 0)
+
+        def isPlain(location):
+            return isinstance(location, ButlerLocation) and not hasattr(location, 'bypass')
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(prefetch, 1)) as executor:
+            try:
+                while True:
+                    while len(pending) <= prefetch:
+                        if nextItem is None:
+                            try:
+                                dataId = DataId(next(dataIds))
+                            except StopIteration:
+                                break
+                            try:
+                                location = self._locate(datasetType, dataId, write=False)
+                                if location is None:
+                                    raise NoResults("No locations for get:", datasetType, dataId)
+                            except Exception as e:
+                                location = e
+                            size = 0
+                            if maxBytes is not None and isPlain(location):
+                                size = location.repository.getSize(location) or 0
+                            nextItem = (dataId, location, size)
+                        dataId, location, size = nextItem
+                        if pending and maxBytes is not None and pendingBytes + size > maxBytes:
+                            break
+                        future = executor.submit(self._read, location) if isPlain(location) else None
+                        pending.append((dataId, location, future, size))
+                        pendingBytes += size
+                        nextItem = None
+                    if not pending:
+                        return
+                    dataId, location, future, size = pending.popleft()
+                    pendingBytes -= size
+                    if isinstance(location, Exception):
+                        raise location
+                    if future is not None:
+                        obj = future.result()
+                    elif hasattr(location, 'bypass'):
+                        obj = location.bypass
+                    else:
+                        obj = self._read(location)
+                    yield self._standardize(location, obj, dataId)
+            finally:
+                for dataId, location, future, size in pending:
+                    if future is not None:
+                        future.cancel()
+
+    @_monitored('aget')
+    async def aget(self, datasetType, dataId=None, **rest):
+        """Retrieve a dataset given an input collection data id, without blocking the event loop on storage
+        access.
+
+        This is the coroutine version of get. The dataset is mapped and standardized in the event loop's
+        thread (mappers and registries are not thread-safe); the checks that it exists in each input
+        repository and its bypass function, if it has one, are run in the executor managed by this Butler
+        (see setMaxWorkers). It is read by the async read formatter of its storage if there is one, otherwise
+        by the blocking formatter in that executor. The components of a composite dataset are retrieved
+        concurrently.
+
+        Parameters
+        ----------
+        datasetType - string
+            The type of dataset to retrieve.
+        dataId - dict
+            The data id.
+        **rest
+            keyword arguments for the data id.
+
+        Returns
+        -------
+            An object retrieved from the dataset.
+        """
+        datasetType = self._resolveDatasetTypeAlias(datasetType)
+        dataId = DataId(dataId)
+        dataId.update(**rest)
+
+        location = await self._alocate(datasetType, dataId)
+        if location is None:
+            raise NoResults("No locations for get:", datasetType, dataId)
+        self.log.debug("Get type=%s keys=%s from %s", datasetType, dataId, str(location))
+
+        if isinstance(location, ButlerComposite) and self._lazyComposites:
+            return self._makeCompositeProxy(location, dataId)
+        if hasattr(location, 'bypass'):
+            obj = location.bypass
+        else:
+            obj = await self._aread(location)
+        return self._standardize(location, obj, dataId)
+
+    def _standardize(self, location, obj, dataId):
+        """Apply the mapper's standardization to an object that was read from a location, if the mapper
+        standardizes the location's dataset type.
+
+        Parameters
+        ----------
+        location : ButlerLocation or ButlerComposite
+            The location the object was read from.
+        obj : object
+            The object that was read.
+        dataId : DataId
+            The data id that was used to find the location.
+
+        Returns
+        -------
+        object
+            The standardized object.
+        """
+        if location.mapper.canStandardize(location.datasetType):
+            with self._monitor.timer('standardize', location.datasetType):
+                return location.mapper.standardize(location.datasetType, obj, dataId)
+        return obj
 
+    @_monitored('put', datasetTypeIndex=1)
     def put(self, obj, datasetType, dataId={}, doBackup=False, **rest):
         """Persists a dataset given an output collection data id.
 
@@ -1417,6 +3301,7 @@ class Butler:
         locations = self._locate(datasetType, dataId, write=True)
         if not locations:
             raise NoResults("No locations for put:", datasetType, dataId)
+        plainLocations = []
         for location in locations:
             if isinstance(location, ButlerComposite):
                 disassembler = location.disassembler if location.disassembler else genericDisassembler
@@ -1425,11 +3310,225 @@ class Butler:
                     if not info.inputOnly:
                         self.put(info.obj, info.datasetType, location.dataId, doBackup=doBackup)
             else:
+                plainLocations.append(location)
+        if plainLocations:
+            if self._writeBehind is not None:
+                self._queueWrite(plainLocations, obj, datasetType, dataId, doBackup)
+            else:
+                if doBackup:
+                    for location in plainLocations:
+                        location.getRepository().backup(location.datasetType, dataId)
+                self._writeAll(plainLocations, obj)
+        self._invalidateCaches(datasetType)
+
+    def _queueWrite(self, locations, obj, datasetType, dataId, doBackup):
+        """Queue the write of an object to plain locations on the write-behind pool.
+
+        Parameters
+        ----------
+        locations : list of ButlerLocation
+            The locations.
+        obj : object
+            The object to write.
+        datasetType : string
+            The (de-aliased) datasetType that was put.
+        dataId : DataId
+            The data id that was put.
+        doBackup : bool
+            If True, rename the existing datasets (after their queued writes are done) before queueing.
+        """
+        if doBackup:
+            self._writeBehind.wait(datasetType)
+            for location in locations:
+                location.getRepository().backup(location.datasetType, dataId)
+        locationKey = tuple((id(location.getRepository()), tuple(location.getLocations()))
+                            for location in locations)
+        self._writeBehind.submit(functools.partial(self._writeAll, locations, obj),
+                                 ObjectCache.estimateSize(obj), datasetType, locationKey)
+
+    def _writeAll(self, locations, obj):
+        """Write an object to plain locations; if fan-out writes are enabled (see enableFanOutWrites) it is
+        serialized once, to the first location, and copied to the others.
+
+        Parameters
+        ----------
+        locations : list of ButlerLocation
+            The locations.
+        obj : object
+            The object to write.
+        """
+        if not self._fanOutWrites:
+            for location in locations:
+                self._write(location, obj)
+            return
+        first = locations[0]
+        self._write(first, obj)
+        for location in locations[1:]:
+            repository = location.getRepository()
+            with self._monitor.timer('copyWrite', location.datasetType, repository.root):
+                copied = repository.copyWrite(location, first, self._fanOutHardlink)
+            if not copied:
+                self._write(location, obj)
+
+    def _write(self, location, obj):
+        """Write an object to a plain location.
+
+        Parameters
+        ----------
+        location : ButlerLocation
+            The location.
+        obj : object
+            The object to write.
+        """
+        repository = location.getRepository()
+        with self._monitor.timer('write', location.datasetType, repository.root):
+            repository.write(location, obj)
+
+    @_monitored('putMany', datasetTypeIndex=1)
+    def putMany(self, objs, datasetType, dataIds, doBackup=False, maxWorkers=None):
+        """Persist many datasets of one dataset type, writing them concurrently.
+
+        The write locations of all the datasets are found first, in the calling thread, so that an invalid
+        data id is reported before anything is written. The storages then prepare for the batch of writes
+        (e.g. the directories that will hold the files are created once each) and the write formatters of
+        plain (non-composite) datasets are run on a pool of threads. Each file is still written to a temporary
+        and renamed into place by its formatter. Composite datasets and backups are handled in the calling
+        thread.
+
+        Parameters
+        ----------
+        objs : sequence
+            The objects to persist.
+        datasetType : string
+            The type of dataset to persist.
+        dataIds : sequence of dict or DataId
+            The data ids of the objects, in the same order as objs.
+        doBackup : bool, optional
+            If True, rename existing instead of overwriting.
+            WARNING: Setting doBackup=True is not safe for parallel processing, as it may be subject to race
+            conditions.
+        maxWorkers : int, optional
+            The maximum number of writes to run at once. If None, the default of
+            `concurrent.futures.ThreadPoolExecutor` is used.
+
+        Raises
+        ------
+        RuntimeError
+            If objs and dataIds do not have the same length.
+        NoResults
+            If there is no write location for one of the data ids; nothing is written in that case.
+        """
+        objs = list(objs)
+        dataIds = [DataId(dataId) for dataId in dataIds]
+        if len(objs) != len(dataIds):
+            raise RuntimeError("putMany got %d objects but %d dataIds" % (len(objs), len(dataIds)))
+        datasetType = self._resolveDatasetTypeAlias(datasetType)
+
+        allLocations = []
+        for dataId in dataIds:
+            locations = self._locate(datasetType, dataId, write=True)
+            if not locations:
+                raise NoResults("No locations for put:", datasetType, dataId)
+            allLocations.append(locations)
+        self.log.debug("PutMany type=%s count=%s", datasetType, len(dataIds))
+        # the datasets are written after any that put has queued.
+        self._waitForWrites(datasetType)
+
+        writes = []
+        for obj, dataId, locations in zip(objs, dataIds, allLocations):
+            if any(isinstance(location, ButlerComposite) for location in locations):
+                self.put(obj, datasetType, dataId, doBackup=doBackup)
+                continue
+            for location in locations:
                 if doBackup:
                     location.getRepository().backup(location.datasetType, dataId)
-                location.getRepository().write(location, obj)
+                writes.append((location, obj))
+
+        repositories = {}
+        for location, obj in writes:
+            repository = location.getRepository()
+            repositories.setdefault(id(repository), (repository, []))[1].append(location)
+        for repository, locations in repositories.values():
+            repository.prepareWrite(locations)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=maxWorkers) as executor:
+            futures = [executor.submit(self._write, location, obj) for location, obj in writes]
+        self._invalidateCaches(datasetType)
+        for future in futures:
+            future.result()
+
+    @_monitored('aput', datasetTypeIndex=1)
+    async def aput(self, obj, datasetType, dataId={}, doBackup=False, **rest):
+        """Persist a dataset given an output collection data id, without blocking the event loop on storage
+        access.
+
+        This is the coroutine version of put. The dataset is mapped in the event loop's thread; the wait for
+        the writes of the dataset type queued by put (see enableWriteBehind) and the backups are run in the
+        executor managed by this Butler (see setMaxWorkers). It is written by the async write formatter of its
+        storage if there is one, otherwise by the blocking formatter in that executor.
+
+        Parameters
+        ----------
+        obj -
+            The object to persist.
+        datasetType - string
+            The type of dataset to persist.
+        dataId - dict
+            The data id.
+        doBackup - bool
+            If True, rename existing instead of overwriting.
+            WARNING: Setting doBackup=True is not safe for parallel processing, as it may be subject to race
+            conditions.
+        **rest
+            Keyword arguments for the data id.
+        """
+        datasetType = self._resolveDatasetTypeAlias(datasetType)
+        dataId = DataId(dataId)
+        dataId.update(**rest)
+
+        loop = asyncio.get_running_loop()
+        if self._writeBehind is not None:
+            await loop.run_in_executor(self._getExecutor(), self._waitForWrites, datasetType)
+        locations = self._locate(datasetType, dataId, write=True)
+        if not locations:
+            raise NoResults("No locations for put:", datasetType, dataId)
+        for location in locations:
+            if isinstance(location, ButlerComposite):
+                disassembler = location.disassembler if location.disassembler else genericDisassembler
+                disassembler(obj=obj, dataId=location.dataId, componentInfo=location.componentInfo)
+                for name, info in location.componentInfo.items():
+                    if not info.inputOnly:
+                        await self.aput(info.obj, info.datasetType, location.dataId, doBackup=doBackup)
+            else:
+                repository = location.getRepository()
+                if doBackup:
+                    await loop.run_in_executor(self._getExecutor(), repository.backup, location.datasetType,
+                                               dataId)
+                with self._monitor.timer('write', location.datasetType, repository.root):
+                    await repository.awrite(location, obj, self._getExecutor())
+        self._invalidateCaches(datasetType)
+
+    def _invalidateCaches(self, datasetType):
+        """Drop the cached locations and objects of a dataset type after it has been written, and the entries
+        of the dataset type in the negative lookup and metadata caches of the output repositories.
 
-    def subset(self, datasetType, level=None, dataId={}, **rest):
+        Parameters
+        ----------
+        datasetType : string
+            The (de-aliased) datasetType that was written.
+        """
+        if self._locationCache is not None:
+            self._locationCache.invalidate(datasetType)
+        if self._objectCache is not None:
+            self._objectCache.invalidate(datasetType)
+        for repoData in self._repos.outputs():
+            if repoData.negativeLookupCache is not None:
+                repoData.negativeLookupCache.invalidate(datasetType)
+            if repoData.metadataCache is not None:
+                repoData.metadataCache.invalidate(datasetType)
+
+    @_monitored('subset')
+    def subset(self, datasetType, level=None, dataId={}, stream=False, columnar=False, **rest):
         """Return complete dataIds for a dataset type that match a partial (or empty) dataId.
 
         Given a partial (or empty) dataId specified in dataId and **rest, find all datasets that match the
@@ -1446,6 +3545,16 @@ class Butler:
             default level.
         dataId - dict
             The data id.
+        stream - bool
+            If True, the dataIds are not all gathered when the subset is created; they are fetched from the
+            mapper (see queryMetadataIter) each time the subset is iterated over, and its length is counted
+            with queryMetadataCount. This keeps the memory used by large subsets small, but only for mappers
+            that override Mapper.getRegistryLookup; for other mappers, taking the length of the subset
+            fetches its dataIds once and keeps them.
+        columnar - bool
+            If True, the subset holds its dataIds in a DataIdTable (a NumPy structured array) instead of a
+            list of dicts, which uses much less memory and makes its select, sort, groupBy and set methods
+            work on all the dataIds at once. May not be used with stream.
         **rest
             Keyword arguments for the data id.
 
@@ -1472,7 +3581,7 @@ class Butler:
 
         dataId = DataId(dataId)
         dataId.update(**rest)
-        return ButlerSubset(self, datasetType, level, dataId)
+        return ButlerSubset(self, datasetType, level, dataId, stream=stream, columnar=columnar)
 
     def dataRef(self, datasetType, level=None, dataId={}, **rest):
         """Returns a single ButlerDataRef.
@@ -1535,6 +3644,7 @@ class Butler:
         datasetType = self._resolveDatasetTypeAlias(datasetType)
         dataId = DataId(dataId)
         dataId.update(**rest)
+        self._waitForWrites(datasetType)
         locations = self._locate(datasetType, dataId, write=write)
         if locations is None:
             raise NoResults("No locations for getUri: ", datasetType, dataId)
@@ -1571,25 +3681,167 @@ class Butler:
         self.log.debug("Starting read from %s", location)
 
         if isinstance(location, ButlerComposite):
+            with self._monitor.timer('readComponents', location.datasetType,
+                                     getattr(location.repository, 'root', None)):
+                if self._compositeMaxWorkers:
+                    self._readComponents(location)
+                else:
+                    for name, componentInfo in location.componentInfo.items():
+                        if componentInfo.subset:
+                            subset = self.subset(datasetType=componentInfo.datasetType,
+                                                 dataId=location.dataId)
+                            componentInfo.obj = [obj.get() for obj in subset]
+                        else:
+                            obj = self.get(componentInfo.datasetType, location.dataId, immediate=True)
+                            componentInfo.obj = obj
+            assembler = location.assembler or genericAssembler
+            results = assembler(dataId=location.dataId, componentInfo=location.componentInfo,
+                                cls=location.python)
+            return results
+        else:
+            cacheKey = None
+            if self._objectCache is not None and self._objectCache.caches(location.datasetType):
+                cacheKey = self._makeObjectCacheKey(location)
+                results = self._objectCache.get(cacheKey, _missing)
+                if results is not _missing:
+                    self.log.debug("Ending read from object cache %s", location)
+                    return results
+            with self._monitor.timer('read', location.datasetType, location.repository.root):
+                results = location.repository.read(location)
+            if len(results) == 1:
+                results = results[0]
+            if cacheKey is not None:
+                self._objectCache.put(cacheKey, results)
+        self.log.debug("Ending read from %s", location)
+        return results
+
+    @staticmethod
+    def _makeObjectCacheKey(location):
+        """Make the key of the object read from a location in the object cache.
+
+        The key includes the additional data of the location, which holds the read options (such as the
+        bounding box of a _sub dataset type), so that reads of the same file with different options are cached
+        separately.
+
+        Parameters
+        ----------
+        location : ButlerLocation
+            The location.
+
+        Returns
+        -------
+        tuple
+            The key.
+        """
+        return (location.datasetType, tuple(location.getLocationsWithRoot()),
+                location.getAdditionalData().toString())
+
+    def _readComponents(self, location):
+        """Get the components of a composite dataset concurrently, and set them in its componentInfo.
+
+        The components (including each dataset of a subset component) are located in the calling thread and
+        their reads are run on the executor enabled by enableParallelComposites; the first error, in the
+        order of the components, is raised after all the reads have finished.
+
+        Parameters
+        ----------
+        location : ButlerComposite
+            The location of the composite dataset.
+        """
+        requests = []
+        slots = []
+        for name, componentInfo in location.componentInfo.items():
+            datasetType = self._resolveDatasetTypeAlias(componentInfo.datasetType)
+            if componentInfo.subset:
+                subset = self.subset(datasetType=datasetType, dataId=location.dataId)
+                componentInfo.obj = [None] * len(subset)
+                for i, dataRef in enumerate(subset):
+                    requests.append((datasetType, DataId(dataRef.dataId)))
+                    slots.append((componentInfo, i))
+            else:
+                requests.append((datasetType, DataId(location.dataId)))
+                slots.append((componentInfo, None))
+        results, errors = self._getAll(requests, self._getCompositeExecutor())
+        for error in errors:
+            if error is not None:
+                raise error
+        for (componentInfo, i), obj in zip(slots, results):
+            if i is None:
+                componentInfo.obj = obj
+            else:
+                componentInfo.obj[i] = obj
+
+    def _getCompositeExecutor(self):
+        """Get the executor that reads the components of composites, creating it if needed.
+
+        Returns
+        -------
+        concurrent.futures.ThreadPoolExecutor
+            The executor.
+        """
+        if self._compositeExecutor is None:
+            self._compositeExecutor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self._compositeMaxWorkers)
+        return self._compositeExecutor
+
+    async def _aread(self, location):
+        """Unpersist an object using data inside a ButlerLocation or ButlerComposite object, without blocking
+        the event loop on storage access.
+
+        Parameters
+        ----------
+        location : ButlerLocation or ButlerComposite
+            A ButlerLocation or ButlerComposite instance populated with data needed to read the object.
+
+        Returns
+        -------
+        object
+            An instance of the object specified by the location.
+        """
+        self.log.debug("Starting async read from %s", location)
+
+        if isinstance(location, ButlerComposite):
+            names = []
+            components = []
             for name, componentInfo in location.componentInfo.items():
                 if componentInfo.subset:
                     subset = self.subset(datasetType=componentInfo.datasetType, dataId=location.dataId)
-                    componentInfo.obj = [obj.get() for obj in subset]
+                    component = asyncio.gather(*[self.aget(componentInfo.datasetType, dataRef.dataId)
+                                                 for dataRef in subset])
                 else:
-                    obj = self.get(componentInfo.datasetType, location.dataId, immediate=True)
-                    componentInfo.obj = obj
-                assembler = location.assembler or genericAssembler
+                    component = self.aget(componentInfo.datasetType, location.dataId)
+                names.append(name)
+                components.append(component)
+            with self._monitor.timer('readComponents', location.datasetType,
+                                     getattr(location.repository, 'root', None)):
+                objs = await asyncio.gather(*components)
+            for name, obj in zip(names, objs):
+                location.componentInfo[name].obj = list(obj) if location.componentInfo[name].subset else obj
+            assembler = location.assembler or genericAssembler
             results = assembler(dataId=location.dataId, componentInfo=location.componentInfo,
                                 cls=location.python)
             return results
         else:
-            results = location.repository.read(location)
+            cacheKey = None
+            if self._objectCache is not None and self._objectCache.caches(location.datasetType):
+                cacheKey = self._makeObjectCacheKey(location)
+                results = self._objectCache.get(cacheKey, _missing)
+                if results is not _missing:
+                    self.log.debug("Ending async read from object cache %s", location)
+                    return results
+            with self._monitor.timer('read', location.datasetType, location.repository.root):
+                results = await location.repository.aread(location, self._getExecutor())
             if len(results) == 1:
                 results = results[0]
-        self.log.debug("Ending read from %s", location)
+            if cacheKey is not None:
+                self._objectCache.put(cacheKey, results)
+        self.log.debug("Ending async read from %s", location)
         return results
 
     def __reduce__(self):
+        if self._fastPickle:
+            return (_unreduceFast, (self._initArgs, self.datasetTypeAliasDict, self._repos.all(),
+                                    self._features))
         ret = (_unreduce, (self._initArgs, self.datasetTypeAliasDict))
         return ret
 
@@ -1606,17 +3858,44 @@ class Butler:
         datasetType - string
             The de-aliased string
         """
-        for key in self.datasetTypeAliasDict:
-            # if all aliases have been replaced, bail out
-            if datasetType.find('@') == -1:
-                break
-            datasetType = datasetType.replace(key, self.datasetTypeAliasDict[key])
+        with self._monitor.timer('resolveAlias', datasetType):
+            try:
+                return self._resolvedDatasetTypes[datasetType]
+            except KeyError:
+                pass
+            resolved = datasetType
+            for key in self.datasetTypeAliasDict:
+                # if all aliases have been replaced, bail out
+                if resolved.find('@') == -1:
+                    break
+                resolved = resolved.replace(key, self.datasetTypeAliasDict[key])
+
+            # If an alias specifier can not be resolved then throw.
+            if resolved.find('@') != -1:
+                raise RuntimeError("Unresolvable alias specifier in datasetType: %s" % (resolved))
+
+            self._resolvedDatasetTypes[datasetType] = resolved
+            return resolved
 
-        # If an alias specifier can not be resolved then throw.
-        if datasetType.find('@') != -1:
-            raise RuntimeError("Unresolvable alias specifier in datasetType: %s" % (datasetType))
+    def _splitComponents(self, datasetType):
+        """Split a dotted datasetType into the datasetType of the composite and the names of the components.
+
+        Parameters
+        ----------
+        datasetType - string
+            A de-aliased datasetType, e.g. 'calexp.wcs'.
 
-        return datasetType
+        Returns
+        -------
+        (string, tuple of string)
+            The datasetType before the first dot, and the component names after it (empty if there are none).
+        """
+        try:
+            return self._splitDatasetTypes[datasetType]
+        except KeyError:
+            components = datasetType.split('.')
+            split = self._splitDatasetTypes[datasetType] = (components[0], tuple(components[1:]))
+            return split
 
 
 def _unreduce(initArgs, datasetTypeAliasDict):
@@ -1624,4 +3903,18 @@ def _unreduce(initArgs, datasetTypeAliasDict):
     initArgs.update(mapperArgs)
     butler = Butler(**initArgs)
     butler.datasetTypeAliasDict = datasetTypeAliasDict
+    butler._resolvedDatasetTypes.clear()
+    return butler
+
+
+def _unreduceFast(initArgs, datasetTypeAliasDict, repoDataList, features):
+    """Make a Butler from a fast pickle (see Butler.enableFastPickle) without reading the repositories."""
+    butler = Butler.__new__(Butler)
+    butler._initArgs = initArgs
+    butler._initAttributes()
+    butler.datasetTypeAliasDict = datasetTypeAliasDict
+    butler.storage = Storage()
+    butler._repos = RepoDataContainer(repoDataList)
+    for name, args in features.items():
+        getattr(butler, name)(*args)
     return butler
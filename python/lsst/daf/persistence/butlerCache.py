@@ -0,0 +1,512 @@
+#
+# LSST Data Management System
+# Copyright 2018 AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+
+"""This module defines the caches used by Butler to avoid repeating expensive lookups."""
+
+import collections
+import sys
+import threading
+
+from lsst.log import Log
+
+__all__ = ["CacheStats", "LocationCache", "MetadataCache", "ObjectCache"]
+
+
+class CacheStats(collections.namedtuple("CacheStats", ["hits", "misses", "size", "maxSize"])):
+    """Counters describing the use of a Butler cache.
+
+    Attributes
+    ----------
+    hits : int
+        The number of lookups that were answered by the cache.
+    misses : int
+        The number of lookups that were not answered by the cache.
+    size : int
+        The number of entries currently held in the cache (for a cache that is bounded by memory use, such as
+        ObjectCache, the estimated number of bytes held).
+    maxSize : int
+        The maximum number of entries (or bytes) the cache will hold.
+    """
+
+    __slots__ = ()
+
+    @property
+    def hitRate(self):
+        """The fraction of lookups that were answered by the cache, or 0. if there were no lookups."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.
+
+
+def makeDataIdKey(dataId):
+    """Get a hashable, order-independent representation of a dataId.
+
+    Parameters
+    ----------
+    dataId : dict or DataId
+        The dataId.
+
+    Returns
+    -------
+    tuple or None
+        The sorted (key, value) pairs of the dataId, or None if any value is not hashable (for example a range
+        expressed as a list); such dataIds can not be used as a cache key.
+    """
+    items = tuple(sorted(dataId.items()))
+    try:
+        hash(items)
+    except TypeError:
+        return None
+    return items
+
+
+class LocationCache:
+    """A bounded, least-recently-used cache of the results of `Butler._locate`.
+
+    Entries are keyed on the datasetType, the dataId, the dataId's tags and whether the location was found for
+    reading or for writing. The cache is safe to use from more than one thread.
+
+    Parameters
+    ----------
+    maxSize : int
+        The maximum number of locations to hold. When it is exceeded the least recently used entry is
+        dropped.
+    """
+
+    def __init__(self, maxSize):
+        self.maxSize = maxSize
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "LocationCache(maxSize=%s, size=%s, hits=%s, misses=%s)" % (
+            self.maxSize, len(self), self.hits, self.misses)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def makeKey(datasetType, dataId, write):
+        """Make the cache key for a location search.
+
+        Parameters
+        ----------
+        datasetType : string
+            The (de-aliased) datasetType that is being searched for.
+        dataId : DataId
+            The dataId that is being searched for.
+        write : bool
+            True if the search is for write locations.
+
+        Returns
+        -------
+        tuple or None
+            The key, or None if the search can not be cached.
+        """
+        dataIdKey = makeDataIdKey(dataId)
+        if dataIdKey is None:
+            return None
+        return (datasetType, dataIdKey, frozenset(getattr(dataId, 'tag', ())), write)
+
+    def get(self, key):
+        """Get a cached location.
+
+        Parameters
+        ----------
+        key : tuple
+            A key made by `makeKey`.
+
+        Returns
+        -------
+        ButlerLocation, list of ButlerLocation, or None
+            The cached value, or None if the key is not in the cache.
+        """
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Add a location to the cache, dropping the least recently used entries if the cache is full.
+
+        Parameters
+        ----------
+        key : tuple
+            A key made by `makeKey`.
+        value : ButlerLocation or list of ButlerLocation
+            The result of the location search.
+        """
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxSize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, datasetType):
+        """Drop the read locations of a datasetType (and of its components).
+
+        This is called after an object of the datasetType has been written, because the new object may mask
+        the location that was found before.
+
+        Parameters
+        ----------
+        datasetType : string
+            The (de-aliased) datasetType that was written.
+        """
+        prefix = datasetType + '.'
+        with self._lock:
+            stale = [key for key in self._entries
+                     if not key[3] and (key[0] == datasetType or key[0].startswith(prefix))]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self):
+        """Remove all the entries from the cache. The hit and miss counters are not reset."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Get the usage counters of the cache.
+
+        Returns
+        -------
+        CacheStats
+            The hit, miss and size counters.
+        """
+        return CacheStats(self.hits, self.misses, len(self), self.maxSize)
+
+
+class MetadataCache(LocationCache):
+    """A bounded, least-recently-used cache of the results of a Repository's getKeys and queryMetadata.
+
+    Entries are keyed on the datasetType, the name of the query and its arguments. The cache is safe to use
+    from more than one thread.
+
+    Parameters
+    ----------
+    maxSize : int
+        The maximum number of results to hold. When it is exceeded the least recently used entry is dropped.
+    """
+
+    def __repr__(self):
+        return "MetadataCache(maxSize=%s, size=%s, hits=%s, misses=%s)" % (
+            self.maxSize, len(self), self.hits, self.misses)
+
+    @staticmethod
+    def makeKey(datasetType, query, *args):
+        """Make the cache key for a query.
+
+        Parameters
+        ----------
+        datasetType : string or None
+            The (de-aliased) datasetType that is being queried, or None for the entire collection.
+        query : string
+            The name of the query ('getKeys' or 'queryMetadata').
+        *args
+            The arguments of the query; a dataId should be passed as the result of makeDataIdKey.
+
+        Returns
+        -------
+        tuple or None
+            The key, or None if the query can not be cached.
+        """
+        key = (datasetType, query) + args
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def invalidate(self, datasetType):
+        """Drop the results of the queries of a datasetType (and of its components), and of the queries of
+        the entire collection.
+
+        Parameters
+        ----------
+        datasetType : string
+            The (de-aliased) datasetType that was written.
+        """
+        prefix = datasetType + '.'
+        with self._lock:
+            stale = [key for key in self._entries
+                     if key[0] is None or key[0] == datasetType or key[0].startswith(prefix)]
+            for key in stale:
+                del self._entries[key]
+
+
+_sizedTypes = (str, bytes, bytearray, int, float, complex, bool, type(None))
+"""The types whose memory use is measured by sys.getsizeof."""
+
+
+def _estimateAfwSize(obj):
+    """Estimate the number of bytes used by the pixels of an afw Exposure, MaskedImage, Image or Mask, or by
+    the records of an afw Catalog.
+
+    The afw types are recognized by their methods rather than imported, because afw depends on this package.
+
+    Parameters
+    ----------
+    obj : object
+        The object.
+
+    Returns
+    -------
+    int or None
+        The estimated size in bytes, or None if obj is not recognized.
+    """
+    try:
+        if hasattr(obj, 'getMaskedImage'):
+            return _estimateAfwSize(obj.getMaskedImage())
+        if hasattr(obj, 'getVariance') and hasattr(obj, 'getMask') and hasattr(obj, 'getImage'):
+            sizes = [_estimateAfwSize(plane) for plane in (obj.getImage(), obj.getMask(), obj.getVariance())]
+            return None if None in sizes else sum(sizes)
+        if hasattr(obj, 'getArray'):
+            nbytes = getattr(obj.getArray(), 'nbytes', None)
+            return nbytes if isinstance(nbytes, int) else None
+        if hasattr(obj, 'getSchema') and hasattr(obj, '__len__'):
+            return obj.getSchema().getRecordSize() * len(obj)
+    except Exception:
+        pass
+    return None
+
+
+class ObjectCache:
+    """A cache of the objects read by Butler, bounded by the estimated number of bytes they use.
+
+    The objects in the cache are not copied; they are shared by everyone that gets them and must be treated
+    as read-only, so only dataset types whose objects are not modified after they are read should be cached; nothing is cached unless its dataset type is listed.
+    Only objects whose size can be estimated (see estimateSize) are cached, so that maxBytes bounds the memory
+    that is used; a warning is logged the first time an object of a dataset type is not cached for this
+    reason.
+
+    Parameters
+    ----------
+    maxBytes : int
+        The maximum number of bytes of objects to hold. When it is exceeded, objects are dropped according to
+        the eviction policy. An object that is larger than maxBytes is not cached.
+    eviction : string, optional
+        'LRU' to drop the least recently used objects first, or 'LFU' to drop the least frequently used
+        objects first (the least recently used of those, if there is a tie).
+    datasetTypes : iterable of string, optional
+        The dataset types to cache. If None, nothing is cached.
+
+    Raises
+    ------
+    RuntimeError
+        If eviction is not 'LRU' or 'LFU'.
+    """
+
+    _sizeEstimators = {}
+
+    def __init__(self, maxBytes, eviction='LRU', datasetTypes=None):
+        eviction = eviction.upper()
+        if eviction not in ('LRU', 'LFU'):
+            raise RuntimeError("Unknown ObjectCache eviction policy: %s" % eviction)
+        self.maxBytes = maxBytes
+        self.eviction = eviction
+        self.datasetTypes = frozenset(datasetTypes or ())
+        self.hits = 0
+        self.misses = 0
+        self.nBytes = 0
+        # key -> [obj, size, useCount], in order of last use.
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        # the dataset types whose objects were not cached because their size could not be estimated.
+        self._unsized = set()
+        self.log = Log.getLogger("daf.persistence.butler")
+
+    def __repr__(self):
+        return "ObjectCache(maxBytes=%s, eviction=%s, nBytes=%s, hits=%s, misses=%s)" % (
+            self.maxBytes, self.eviction, self.nBytes, self.hits, self.misses)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @classmethod
+    def registerSizeEstimator(cls, pythonType, estimator):
+        """Register a function that estimates the memory used by objects of a type.
+
+        Parameters
+        ----------
+        pythonType : class object
+            The type of the objects; the estimator is also used for subclasses that do not have their own.
+        estimator : callable
+            Called with an object, returns the estimated number of bytes it uses.
+        """
+        cls._sizeEstimators[pythonType] = estimator
+
+    @classmethod
+    def estimateSize(cls, obj, strict=False):
+        """Estimate the number of bytes an object uses.
+
+        A registered size estimator for the object's type (or one of its base classes) is used if there is
+        one; otherwise the size of the pixel arrays of an afw Exposure, MaskedImage, Image or Mask, the size
+        of the records of an afw Catalog, the 'nbytes' attribute of the object (as for numpy arrays) or else
+        sys.getsizeof. sys.getsizeof does not count the memory an object refers to (e.g. the pixels of a
+        pybind11-wrapped image), so it is only a good estimate for strings, bytes and numbers.
+
+        Parameters
+        ----------
+        obj : object
+            The object.
+        strict : bool, optional
+            If True, return None instead of the sys.getsizeof of an object that is not a string, bytes or a
+            number.
+
+        Returns
+        -------
+        int or None
+            The estimated size in bytes, or None if strict is True and the size can not be estimated.
+        """
+        for pythonType in type(obj).__mro__:
+            estimator = cls._sizeEstimators.get(pythonType)
+            if estimator is not None:
+                return estimator(obj)
+        nbytes = _estimateAfwSize(obj)
+        if nbytes is not None:
+            return nbytes
+        nbytes = getattr(obj, 'nbytes', None)
+        if isinstance(nbytes, int):
+            return nbytes
+        if strict and not isinstance(obj, _sizedTypes):
+            return None
+        return sys.getsizeof(obj)
+
+    def caches(self, datasetType):
+        """Check if objects of a dataset type are cached.
+
+        Parameters
+        ----------
+        datasetType : string
+            The dataset type.
+
+        Returns
+        -------
+        bool
+            True if objects of the dataset type are cached.
+        """
+        return datasetType in self.datasetTypes
+
+    def get(self, key, default=None):
+        """Get a cached object.
+
+        Parameters
+        ----------
+        key : tuple
+            The key of the object; the first item must be its dataset type.
+        default : object, optional
+            The value to return if the key is not in the cache.
+
+        Returns
+        -------
+        object
+            The cached object, or default.
+        """
+        with self._lock:
+            try:
+                entry = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            entry[2] += 1
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, obj, size=None):
+        """Add an object to the cache, dropping other objects if the cache would use more than maxBytes.
+
+        Parameters
+        ----------
+        key : tuple
+            The key of the object; the first item must be its dataset type.
+        obj : object
+            The object.
+        size : int, optional
+            The number of bytes the object uses. If None it is estimated with estimateSize; the object is not
+            cached if its size can not be estimated.
+        """
+        if size is None:
+            size = self.estimateSize(obj, strict=True)
+        if size is None:
+            with self._lock:
+                warn = key[0] not in self._unsized
+                self._unsized.add(key[0])
+            if warn:
+                self.log.warn("Not caching objects of dataset type %s: can not estimate the size of %s; "
+                              "register a size estimator with ObjectCache.registerSizeEstimator",
+                              key[0], type(obj).__name__)
+            return
+        if size > self.maxBytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.nBytes -= old[1]
+            while self._entries and self.nBytes + size > self.maxBytes:
+                self._evict()
+            self._entries[key] = [obj, size, 1]
+            self.nBytes += size
+
+    def _evict(self):
+        """Drop one object according to the eviction policy. The caller must hold the lock."""
+        if self.eviction == 'LFU':
+            victim = min(self._entries, key=lambda k: self._entries[k][2])
+        else:
+            victim = next(iter(self._entries))
+        self.nBytes -= self._entries.pop(victim)[1]
+
+    def invalidate(self, datasetType):
+        """Drop the objects of a datasetType (and of its components).
+
+        Parameters
+        ----------
+        datasetType : string
+            The (de-aliased) datasetType that was written.
+        """
+        prefix = datasetType + '.'
+        with self._lock:
+            stale = [key for key in self._entries if key[0] == datasetType or key[0].startswith(prefix)]
+            for key in stale:
+                self.nBytes -= self._entries.pop(key)[1]
+
+    def clear(self):
+        """Remove all the objects from the cache. The hit and miss counters are not reset."""
+        with self._lock:
+            self._entries.clear()
+            self.nBytes = 0
+
+    def stats(self):
+        """Get the usage counters of the cache.
+
+        Returns
+        -------
+        CacheStats
+            The hit and miss counters; size and maxSize are in bytes.
+        """
+        return CacheStats(self.hits, self.misses, self.nBytes, self.maxBytes)
@@ -51,10 +51,10 @@ def searchDataRefs(butler, datasetType, level="", dataId=None):
     if dataId is None:
         dataId = {}
 
-    refList = butler.subset(datasetType=datasetType, level=level, dataId=dataId)
+    refList = list(butler.subset(datasetType=datasetType, level=level, dataId=dataId))
     # exclude nonexistent data
     # this is a recursive test, e.g. for the sake of "raw" data
-    return [dr for dr in refList if dataExists(dr)]
+    return [dr for dr, exists in zip(refList, _dataExistsMany(refList)) if exists]
 
 
 def dataExists(dataRef):
@@ -72,9 +72,39 @@ def dataExists(dataRef):
     """
     subDRList = dataRef.subItems()
     if subDRList:
-        for subDR in subDRList:
-            if dataExists(subDR):
-                return True
-        return False
+        return any(_dataExistsMany(list(subDRList)))
     else:
         return dataRef.datasetExists()
+
+
+def _dataExistsMany(dataRefs):
+    """Determine, for each of many data references, if data exists at its level or any deeper level.
+
+    The data references that are at the lowest level are checked together with
+    `lsst.daf.persistence.Butler.datasetExistsMany`, one call for each butler and dataset type.
+
+    Parameters
+    ----------
+    dataRefs : `list` of `lsst.daf.persistence.ButlerDataRef`
+        Data references to test for existence.
+
+    Returns
+    -------
+    exists : `list` of `bool`
+        `True` for each data reference for which data exists, `False` otherwise.
+    """
+    exists = [False] * len(dataRefs)
+    leaves = {}
+    for i, dataRef in enumerate(dataRefs):
+        subDRList = dataRef.subItems()
+        if subDRList:
+            exists[i] = any(_dataExistsMany(list(subDRList)))
+        else:
+            butler = dataRef.getButler()
+            key = (id(butler), dataRef.butlerSubset.datasetType)
+            leaves.setdefault(key, (butler, dataRef.butlerSubset.datasetType, []))[2].append(i)
+    for butler, datasetType, indices in leaves.values():
+        found = butler.datasetExistsMany(datasetType, [dataRefs[i].dataId for i in indices])
+        for i, refExists in zip(indices, found):
+            exists[i] = bool(refExists)
+    return exists
@@ -0,0 +1,282 @@
+#
+# LSST Data Management System
+# Copyright 2018 AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+
+"""This module defines the counters and timers used to measure where Butler spends its time."""
+
+import collections
+import threading
+import time
+
+__all__ = ["PhaseStats", "ButlerStats", "NullButlerStats"]
+
+
+class PhaseStats(collections.namedtuple("PhaseStats", ["count", "totalTime", "maxTime"])):
+    """The number of calls to, and the time spent in, a phase of the Butler's work.
+
+    Attributes
+    ----------
+    count : int
+        The number of times the phase was run.
+    totalTime : float
+        The total wall-clock time spent in the phase, in seconds.
+    maxTime : float
+        The longest time spent in one run of the phase, in seconds.
+    """
+
+    __slots__ = ()
+
+    @property
+    def meanTime(self):
+        """The mean time spent in one run of the phase, or 0. if it was not run."""
+        return self.totalTime / self.count if self.count else 0.
+
+
+class _Timer:
+    """A context manager that records the time spent in its block in a ButlerStats."""
+
+    __slots__ = ("stats", "key", "start")
+
+    def __init__(self, stats, key):
+        self.stats = stats
+        self.key = key
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.stats._record(self.key, time.perf_counter() - self.start)
+        return False
+
+
+class ButlerStats:
+    """The counters and timers of the phases of a Butler's work, broken down by dataset type and repository.
+
+    The phases are:
+    - the Butler calls: get, getMany, aget, put, putMany, aput, datasetExists, datasetExistsMany,
+      adatasetExists, subset, getKeys and queryMetadata (each includes the phases below that it uses). The
+      coroutines aget, aput and adatasetExists are timed from when they start to when they return, which
+      includes the time the event loop spends running other coroutines while they wait.
+    - resolveAlias: replacing the aliases in a dataset type.
+    - locate: finding the location(s) of a dataset (this includes the map, exists and bypass phases). It is
+      not recorded by the coroutines, which record their map and bypass phases directly.
+    - map: a mapper mapping a data id to a location (including any registry lookup).
+    - exists: checking that a dataset exists in storage.
+    - bypass: running a mapper's bypass function.
+    - read: reading a dataset from storage (with its formatter).
+    - readComponents: getting the components of a composite dataset.
+    - write: writing a dataset to storage (with its formatter).
+    - copyWrite: writing a dataset to another output repository by copying the file written by write.
+    - standardize: a mapper standardizing an object that was read.
+
+    Because some phases include others, the times of different phases should not be added together.
+
+    The stats are safe to update from more than one thread.
+    """
+
+    phases = ("get", "getMany", "aget", "put", "putMany", "aput", "datasetExists", "datasetExistsMany",
+              "adatasetExists", "subset", "getKeys", "queryMetadata", "resolveAlias", "locate", "map",
+              "exists", "bypass", "read", "readComponents", "write", "copyWrite",
+              "standardize")
+
+    def __init__(self):
+        # (phase, datasetType, repository) -> [count, totalTime, maxTime]
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "ButlerStats(%s)" % ", ".join("%s=%s" % (phase, stats.count)
+                                             for phase, stats in self.byPhase().items())
+
+    def __str__(self):
+        groups = self._group(lambda key: key[:2])
+        lines = ["%-12s %-30s %8s %12s %12s" % ("phase", "datasetType", "count", "total (s)", "max (s)")]
+        for phase, datasetType in sorted(groups, key=lambda key: (self._phaseOrder(key[0]), str(key[1]))):
+            stats = groups[(phase, datasetType)]
+            lines.append("%-12s %-30s %8d %12.6f %12.6f" %
+                         (phase, datasetType, stats.count, stats.totalTime, stats.maxTime))
+        return "\n".join(lines)
+
+    def _phaseOrder(self, phase):
+        return self.phases.index(phase) if phase in self.phases else len(self.phases)
+
+    def timer(self, phase, datasetType=None, repository=None):
+        """Get a context manager that records the time spent in its block.
+
+        Parameters
+        ----------
+        phase : string
+            The phase; one of `phases`.
+        datasetType : string, optional
+            The dataset type the work is for.
+        repository : string, optional
+            The root of the repository the work is for.
+
+        Returns
+        -------
+        context manager
+            Records one run of the phase, and the time spent in it, when its block exits.
+        """
+        return _Timer(self, (phase, datasetType, repository))
+
+    def record(self, phase, elapsed, datasetType=None, repository=None):
+        """Record one run of a phase.
+
+        Parameters
+        ----------
+        phase : string
+            The phase; one of `phases`.
+        elapsed : float
+            The time spent in the phase, in seconds.
+        datasetType : string, optional
+            The dataset type the work was for.
+        repository : string, optional
+            The root of the repository the work was for.
+        """
+        self._record((phase, datasetType, repository), elapsed)
+
+    def _record(self, key, elapsed):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._entries[key] = [1, elapsed, elapsed]
+            else:
+                entry[0] += 1
+                entry[1] += elapsed
+                if elapsed > entry[2]:
+                    entry[2] = elapsed
+
+    def get(self, phase=None, datasetType=None, repository=None):
+        """Get the stats of the runs that match a phase, dataset type and repository.
+
+        Parameters
+        ----------
+        phase : string, optional
+            The phase to match; if None, all phases are matched.
+        datasetType : string, optional
+            The dataset type to match; if None, all dataset types are matched.
+        repository : string, optional
+            The repository root to match; if None, all repositories are matched.
+
+        Returns
+        -------
+        PhaseStats
+            The stats summed over the matching runs.
+        """
+        count = 0
+        totalTime = 0.
+        maxTime = 0.
+        with self._lock:
+            for (entryPhase, entryDatasetType, entryRepository), entry in self._entries.items():
+                if ((phase is None or phase == entryPhase) and
+                        (datasetType is None or datasetType == entryDatasetType) and
+                        (repository is None or repository == entryRepository)):
+                    count += entry[0]
+                    totalTime += entry[1]
+                    maxTime = max(maxTime, entry[2])
+        return PhaseStats(count, totalTime, maxTime)
+
+    def _group(self, keyFunc, phase=None):
+        groups = {}
+        with self._lock:
+            for key, entry in self._entries.items():
+                if phase is not None and key[0] != phase:
+                    continue
+                group = groups.setdefault(keyFunc(key), [0, 0., 0.])
+                group[0] += entry[0]
+                group[1] += entry[1]
+                group[2] = max(group[2], entry[2])
+        return {key: PhaseStats(*group) for key, group in groups.items()}
+
+    def byPhase(self):
+        """Get the stats of each phase that has been run.
+
+        Returns
+        -------
+        dict of string to PhaseStats
+            The stats of each phase, in the order of `phases`.
+        """
+        groups = self._group(lambda key: key[0])
+        return collections.OrderedDict((phase, groups[phase])
+                                       for phase in sorted(groups, key=self._phaseOrder))
+
+    def byDatasetType(self, phase=None):
+        """Get the stats of each dataset type.
+
+        Parameters
+        ----------
+        phase : string, optional
+            Only count the runs of this phase; if None, count all phases.
+
+        Returns
+        -------
+        dict of string to PhaseStats
+            The stats of each dataset type (None for work that is not for one dataset type).
+        """
+        return self._group(lambda key: key[1], phase)
+
+    def byRepository(self, phase=None):
+        """Get the stats of each repository.
+
+        Parameters
+        ----------
+        phase : string, optional
+            Only count the runs of this phase; if None, count all phases.
+
+        Returns
+        -------
+        dict of string to PhaseStats
+            The stats of each repository root (None for work that is not for one repository).
+        """
+        return self._group(lambda key: key[2], phase)
+
+    def reset(self):
+        """Clear all the counters and timers."""
+        with self._lock:
+            self._entries.clear()
+
+
+class _NullTimer:
+    """A context manager that does nothing."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        return False
+
+
+class NullButlerStats:
+    """A stand-in for ButlerStats that records nothing; Butler uses it when its stats are not enabled."""
+
+    _timer = _NullTimer()
+
+    def timer(self, phase, datasetType=None, repository=None):
+        return self._timer
+
+    def record(self, phase, elapsed, datasetType=None, repository=None):
+        pass
+
+    def reset(self):
+        pass
@@ -27,7 +27,10 @@
 """This module defines the ButlerSubset class and the ButlerDataRefs contained
 within it as well as an iterator over the subset."""
 
-from . import DataId
+import copy
+import itertools
+
+from . import DataId, DataIdTable
 
 
 class ButlerSubset:
@@ -49,19 +52,37 @@ class ButlerSubset:
 
     Public methods:
 
-    __init__(self, butler, datasetType, level, dataId)
+    __init__(self, butler, datasetType, level, dataId, stream=False, columnar=False)
 
     __len__(self)
 
     __iter__(self)
 
+    __getitem__(self, index)
+
+    select(self, **criteria)
+
+    sort(self, *keys)
+
+    groupBy(self, *keys)
+
+    union(self, other)
+
+    intersection(self, other)
+
+    difference(self, other)
+
+    getAll(self, datasetType=None, maxWorkers=None, returnExceptions=False)
+
+    iterGet(self, datasetType=None, prefetch=2, maxBytes=None)
+
     """
 
     GENERATION = 2
     """This is a Generation 2 ButlerSubset.
     """
 
-    def __init__(self, butler, datasetType, level, dataId):
+    def __init__(self, butler, datasetType, level, dataId, stream=False, columnar=False):
         """
         Create a ButlerSubset by querying a butler for data ids matching a
         given partial data id for a given dataset type at a given hierarchy
@@ -72,12 +93,27 @@ class ButlerSubset:
         @param level (str)        the hierarchy level to descend to. if empty string will look up the default
                                   level.
         @param dataId (dict)      the (partial or complete) data id.
+        @param stream (bool)      if True, do not query for the data ids now;
+                                  query for them each time the subset is
+                                  iterated over, yielding each one as it
+                                  arrives, and count them when the length of
+                                  the subset is needed (if the mapper can not
+                                  count them without fetching them, they are
+                                  fetched once then and kept).
+        @param columnar (bool)    if True, hold the data ids in a DataIdTable
+                                  (one array per key) instead of a list of
+                                  dicts.
         """
+        if stream and columnar:
+            raise RuntimeError("A ButlerSubset can not be both streamed and columnar.")
         self.butler = butler
         self.datasetType = datasetType
         self.dataId = DataId(dataId)
         self.cache = []
         self.level = level
+        # The keys to query for when streaming; None if the data ids are in self.cache.
+        self._fmt = None
+        self._length = None
 
         keys = self.butler.getKeys(datasetType, level, tag=dataId.tag)
         if keys is None:
@@ -92,17 +128,45 @@ class ButlerSubset:
                 break
         if completeId:
             self.cache.append(dataId)
+            if columnar:
+                self.cache = DataIdTable.fromDicts(self.cache)
+            return
+
+        if stream:
+            self._fmt = fmt
             return
 
-        idTuples = butler.queryMetadata(self.datasetType, fmt, self.dataId)
+        # the butler lists the data ids of the first input repository that has any, or (with parallel
+        # queries) of all the input repositories.
+        if columnar:
+            table = butler.querySubsetMetadataTable(self.datasetType, fmt, self.dataId)
+            self.cache = table.withConstants(self.dataId)
+            return
+        idTuples = butler.querySubsetMetadata(self.datasetType, fmt, self.dataId)
         for idTuple in idTuples:
-            tempId = dict(self.dataId)
-            if len(fmt) == 1:
-                tempId[fmt[0]] = idTuple
-            else:
-                for i in range(len(fmt)):
-                    tempId[fmt[i]] = idTuple[i]
-            self.cache.append(tempId)
+            self.cache.append(self._makeDataId(fmt, idTuple))
+
+    def _makeDataId(self, fmt, idTuple):
+        tempId = dict(self.dataId)
+        if len(fmt) == 1:
+            tempId[fmt[0]] = idTuple
+        else:
+            for i in range(len(fmt)):
+                tempId[fmt[i]] = idTuple[i]
+        return tempId
+
+    def _iterDataIds(self):
+        """
+        Iterate over the data ids of the ButlerSubset, querying for them if
+        the subset is streamed.
+
+        @returns iterator of dict.
+        """
+        if self._fmt is None:
+            return iter(self.cache)
+        fmt = self._fmt
+        return (self._makeDataId(fmt, idTuple) for idTuple in
+                self.butler.queryMetadataIter(self.datasetType, fmt, self.dataId))
 
     def __repr__(self):
         return "ButlerSubset(butler=%s, datasetType=%s, dataId=%s, cache=%s, level=%s)" % (
@@ -115,7 +179,17 @@ class ButlerSubset:
         @returns (int)
         """
 
-        return len(self.cache)
+        if self._fmt is None:
+            return len(self.cache)
+        if self._length is None:
+            self._length = self.butler.queryMetadataCount(self.datasetType, self._fmt, self.dataId)
+        if self._length is None:
+            # the mapper can not count the data ids without fetching them; keep them instead of fetching them
+            # again each time the subset is iterated over.
+            self.cache = list(self._iterDataIds())
+            self._fmt = None
+            return len(self.cache)
+        return self._length
 
     def __iter__(self):
         """
@@ -126,6 +200,147 @@ class ButlerSubset:
 
         return ButlerSubsetIterator(self)
 
+    def __getitem__(self, index):
+        """
+        Get a ButlerDataRef of the ButlerSubset by its index. Its data id is
+        made when it is asked for.
+
+        @param index (int)  index of the ButlerDataRef.
+        @returns (ButlerDataRef)
+        """
+        if self._fmt is not None:
+            raise RuntimeError("A streamed ButlerSubset can not be indexed.")
+        return ButlerDataRef(self, self.cache[index])
+
+    def _table(self):
+        """
+        Get the data ids of the ButlerSubset as a DataIdTable.
+
+        @returns (DataIdTable)
+        """
+        if isinstance(self.cache, DataIdTable):
+            return self.cache
+        keys = list(self.dataId.keys()) if len(self) == 0 else None
+        return DataIdTable.fromDicts(self._iterDataIds(), keys)
+
+    def _withTable(self, table):
+        """
+        Make a ButlerSubset like this one that holds the data ids of a
+        DataIdTable.
+
+        @param table (DataIdTable)  the data ids.
+        @returns (ButlerSubset)
+        """
+        subset = copy.copy(self)
+        subset.cache = table
+        subset._fmt = None
+        subset._length = None
+        return subset
+
+    def select(self, **criteria):
+        """
+        Select the data ids that match criteria.
+
+        @param **criteria  for each key, the value to match, or a list,
+                           tuple or set of the values to match.
+        @returns (ButlerSubset) columnar subset of the matching data ids.
+        """
+        return self._withTable(self._table().select(**criteria))
+
+    def sort(self, *keys):
+        """
+        Sort the data ids by the values of keys.
+
+        @param *keys  keys to sort by, most significant first; all the keys
+                      if there are none.
+        @returns (ButlerSubset) columnar subset of the sorted data ids.
+        """
+        return self._withTable(self._table().sort(*keys))
+
+    def groupBy(self, *keys):
+        """
+        Group the data ids by the values of keys.
+
+        @param *keys  keys to group by.
+        @returns (OrderedDict) columnar subset of each group, keyed by the
+                               value (or tuple of values) of the keys.
+        """
+        groups = self._table().groupBy(*keys)
+        for values, table in groups.items():
+            groups[values] = self._withTable(table)
+        return groups
+
+    def union(self, other):
+        """
+        Get the data ids that are in this ButlerSubset or another one.
+
+        @param other (ButlerSubset)  subset with the same data id keys.
+        @returns (ButlerSubset) columnar subset of the sorted, distinct data
+                                ids.
+        """
+        return self._withTable(self._table().union(other._table()))
+
+    def intersection(self, other):
+        """
+        Get the data ids that are in both this ButlerSubset and another one.
+
+        @param other (ButlerSubset)  subset with the same data id keys.
+        @returns (ButlerSubset) columnar subset of the sorted, distinct data
+                                ids.
+        """
+        return self._withTable(self._table().intersection(other._table()))
+
+    def difference(self, other):
+        """
+        Get the data ids that are in this ButlerSubset and not in another one.
+
+        @param other (ButlerSubset)  subset with the same data id keys.
+        @returns (ButlerSubset) columnar subset of the sorted, distinct data
+                                ids.
+        """
+        return self._withTable(self._table().difference(other._table()))
+
+    def getAll(self, datasetType=None, maxWorkers=None, returnExceptions=False):
+        """
+        Retrieve the datasets of the given type (or the type used when
+        creating the ButlerSubset, if None) for every ButlerDataRef in the
+        ButlerSubset, reading them concurrently with Butler.getMany().
+
+        @param datasetType (str)        dataset type to retrieve.
+        @param maxWorkers (int)         maximum number of concurrent reads.
+        @param returnExceptions (bool)  if True, return the exception raised
+                                        for a dataset in its place instead of
+                                        raising it.
+        @returns (list) objects in the order of the ButlerDataRefs.
+        """
+        if datasetType is None:
+            datasetType = self.datasetType
+        return self.butler.getMany(datasetType, list(self._iterDataIds()), maxWorkers=maxWorkers,
+                                   returnExceptions=returnExceptions)
+
+    def iterGet(self, datasetType=None, prefetch=2, maxBytes=None):
+        """
+        Iterate over the ButlerDataRefs in the ButlerSubset together with
+        their datasets of the given type (or the type used when creating the
+        ButlerSubset, if None), reading the next datasets in the background
+        while the caller works on the current one.
+
+        @param datasetType (str)  dataset type to retrieve.
+        @param prefetch (int)     number of datasets to read ahead.
+        @param maxBytes (int)     if not None, stop reading ahead while the
+                                  datasets that have been read ahead but not
+                                  yet returned take up more than this many
+                                  bytes in storage. At least one dataset is
+                                  always read.
+        @returns generator of (ButlerDataRef, object) pairs.
+        """
+        if datasetType is None:
+            datasetType = self.datasetType
+        dataIds, readIds = itertools.tee(self._iterDataIds())
+        objs = self.butler._iterGet(datasetType, readIds, prefetch, maxBytes)
+        for dataId, obj in zip(dataIds, objs):
+            yield ButlerDataRef(self, dataId), obj
+
 
 class ButlerSubsetIterator:
     """
@@ -134,7 +349,7 @@ class ButlerSubsetIterator:
 
     def __init__(self, butlerSubset):
         self.butlerSubset = butlerSubset
-        self.iter = iter(butlerSubset.cache)
+        self.iter = butlerSubset._iterDataIds()
 
     def __iter__(self):
         return self
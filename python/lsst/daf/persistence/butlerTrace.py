@@ -0,0 +1,276 @@
+#
+# LSST Data Management System
+# Copyright 2018 AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+
+"""This module defines ButlerTracer, which records the spans of a Butler's work as Chrome trace events."""
+
+import asyncio
+import itertools
+import json
+import multiprocessing.util
+import os
+import threading
+import time
+
+__all__ = ["ButlerTracer"]
+
+
+class _Span:
+    """A context manager that records the time spent in its block as a trace event."""
+
+    __slots__ = ("tracer", "name", "args", "start", "track")
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.track = self.tracer._getTrack()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        end = time.perf_counter()
+        if excType is not None:
+            self.args['error'] = excType.__name__
+        self.tracer._addSpan(self.name, self.start, end, self.args, self.track)
+        return False
+
+
+class ButlerTracer:
+    """Records a span for each phase of a Butler's work (the same phases that are counted by ButlerStats,
+    plus the Butler calls that contain them) and writes them to a file in the Chrome trace-event format.
+
+    The file can be opened in chrome://tracing or https://ui.perfetto.dev, where the spans of each thread
+    are shown on their own track, nested by time. The spans of the coroutines that run concurrently on one
+    thread (e.g. Butler.aget) overlap without being nested, so the spans recorded by an asyncio task are
+    shown on an 'asyncio tasks' track that no other running task uses. Each process writes its own file;
+    the timestamps of all the processes on a host are on the same clock, so their files can be viewed
+    together.
+
+    The events are kept in memory until flush appends them to the file, which is a complete JSON document
+    after each flush. flush is called when flushSize events are waiting, when the tracer is closed (or its
+    with block exits), and when the process exits, including the worker processes of a multiprocessing pool
+    (which do not run atexit handlers). A process that is forked by multiprocessing starts its own file, with
+    its own process id. A worker that is killed (e.g. by Pool.terminate) loses the events it has not flushed.
+
+    Parameters
+    ----------
+    path : string
+        The path of the trace file. It is formatted with the process id as `pid` (e.g. 'trace-{pid}.json'),
+        so that each process of a pool can write its own file.
+    flushSize : int, optional
+        The number of events to keep in memory before they are written to the file.
+    """
+
+    _header = '{"displayTimeUnit": "ms", "traceEvents": [\n'
+    _footer = '\n]}\n'
+
+    def __init__(self, path, flushSize=10000):
+        self.pathTemplate = path
+        self.flushSize = flushSize
+        self._closed = False
+        self._start()
+        multiprocessing.util.register_after_fork(self, ButlerTracer._start)
+
+    def _start(self):
+        """Start recording to the file of this process (called again in a process forked by
+        multiprocessing)."""
+        self.pid = os.getpid()
+        self.path = self.pathTemplate.format(pid=self.pid)
+        # The offset from time.perf_counter to the epoch, so that the spans of different processes line up.
+        self._epoch = time.time() - time.perf_counter()
+        self._events = []
+        # The names of the tracks, by id: the threads, and the asyncio tasks that have recorded spans.
+        self._threadNames = {}
+        self._writtenThreads = set()
+        # The tracks of the running asyncio tasks that have recorded spans, by task; the track of a task is
+        # reused by a later task when it is done.
+        self._taskTracks = {}
+        self._freeTaskTracks = []
+        self._taskTrackIds = itertools.count(1)
+        # The offset in the file of its footer, or None if the file has not been started.
+        self._fileEnd = None
+        self._lock = threading.Lock()
+        # Held while the file is written, so that flushes from different threads do not interleave.
+        self._fileLock = threading.Lock()
+        self._finalizer = multiprocessing.util.Finalize(self, self.flush, exitpriority=10)
+
+    def __repr__(self):
+        return "ButlerTracer(path=%r, events=%d)" % (self.path, len(self._events))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+        return False
+
+    def timer(self, phase, datasetType=None, repository=None):
+        """Get a context manager that records its block as a span.
+
+        Parameters
+        ----------
+        phase : string
+            The name of the span.
+        datasetType : string, optional
+            The dataset type the work is for; recorded in the span's args.
+        repository : string, optional
+            The root of the repository the work is for; recorded in the span's args.
+
+        Returns
+        -------
+        context manager
+            Records the span when its block exits.
+        """
+        args = {}
+        if datasetType is not None:
+            args['datasetType'] = datasetType
+        if repository is not None:
+            args['repository'] = repository
+        return _Span(self, phase, args)
+
+    def record(self, phase, elapsed, datasetType=None, repository=None):
+        """Record a span that ended now.
+
+        Parameters
+        ----------
+        phase : string
+            The name of the span.
+        elapsed : float
+            The duration of the span, in seconds.
+        datasetType : string, optional
+            The dataset type the work was for.
+        repository : string, optional
+            The root of the repository the work was for.
+        """
+        end = time.perf_counter()
+        span = self.timer(phase, datasetType, repository)
+        self._addSpan(span.name, end - elapsed, end, span.args, self._getTrack())
+
+    def _getTrack(self):
+        """Get the id of the track that a span that starts now is recorded on: the track of the current
+        thread, or, in an asyncio task, the track of the task, which is taken from the tracks that no running
+        task uses the first time the task starts a span and is kept until the task is done."""
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            # there is no event loop running in this thread.
+            task = None
+        with self._lock:
+            if task is None:
+                thread = threading.current_thread()
+                self._threadNames.setdefault(thread.ident, thread.name)
+                return thread.ident
+            tid = self._taskTracks.get(task)
+            if tid is None:
+                tid = self._freeTaskTracks.pop() if self._freeTaskTracks else next(self._taskTrackIds)
+                self._taskTracks[task] = tid
+                self._threadNames.setdefault(tid, "asyncio tasks %d" % tid)
+                task.add_done_callback(self._releaseTaskTrack)
+            return tid
+
+    def _addSpan(self, name, start, end, args, track):
+        event = {'name': name, 'cat': 'butler', 'ph': 'X', 'pid': self.pid, 'tid': track,
+                 'ts': (self._epoch + start) * 1e6, 'dur': (end - start) * 1e6}
+        if args:
+            event['args'] = args
+        with self._lock:
+            if self._closed:
+                return
+            self._events.append(event)
+            full = len(self._events) >= self.flushSize
+        if full:
+            self.flush()
+
+    def _releaseTaskTrack(self, task):
+        """Let a later task record its spans on the track of a task that is done."""
+        with self._lock:
+            tid = self._taskTracks.pop(task, None)
+            if tid is not None:
+                self._freeTaskTracks.append(tid)
+
+    def reset(self):
+        """Drop the spans that have been recorded and not yet written."""
+        with self._lock:
+            del self._events[:]
+
+    def getEvents(self):
+        """Get the trace events recorded and not yet written, including the thread name metadata events.
+
+        Returns
+        -------
+        list of dict
+            The trace events.
+        """
+        with self._lock:
+            events = [{'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': tid, 'args': {'name': name}}
+                      for tid, name in self._threadNames.items()]
+            events.extend(self._events)
+        return events
+
+    def _takeEvents(self):
+        """Take the events that have not been written, with the metadata events of threads that have not
+        been named in the file."""
+        with self._lock:
+            events = [{'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': tid, 'args': {'name': name}}
+                      for tid, name in self._threadNames.items() if tid not in self._writtenThreads]
+            self._writtenThreads.update(self._threadNames)
+            events.extend(self._events)
+            self._events = []
+        return events
+
+    def flush(self):
+        """Append the spans recorded since the last flush to the trace file.
+
+        The file is started by the first flush that has spans to write; the footer of the JSON document is
+        rewritten after the new events each time, so the file is valid JSON between flushes.
+        """
+        with self._fileLock:
+            if self.pid != os.getpid():
+                # a copy of the tracer in a process that was not forked by multiprocessing.
+                return
+            events = self._takeEvents()
+            if not any(event['ph'] == 'X' for event in events):
+                with self._lock:
+                    self._writtenThreads.difference_update(event['tid'] for event in events)
+                return
+            if self._fileEnd is None:
+                f = open(self.path, 'w')
+                f.write(self._header)
+                separator = ''
+            else:
+                f = open(self.path, 'r+')
+                f.seek(self._fileEnd)
+                separator = ',\n'
+            with f:
+                f.write(separator + ',\n'.join(json.dumps(event) for event in events))
+                self._fileEnd = f.tell()
+                f.write(self._footer)
+                f.truncate()
+
+    def close(self):
+        """Write the trace file and stop recording spans."""
+        with self._lock:
+            self._closed = True
+        self.flush()
+        self._finalizer.cancel()
@@ -0,0 +1,516 @@
+#
+# LSST Data Management System
+# Copyright 2018 AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+
+"""This module defines DataIdTable, a compact columnar container of dataIds."""
+
+import collections
+
+import numpy as np
+
+__all__ = ["DataIdTable"]
+
+
+def _columnDtype(values):
+    """Get the numpy dtype that holds a column of dataId values.
+
+    Parameters
+    ----------
+    values : list
+        The values of one key of the dataIds.
+
+    Returns
+    -------
+    numpy.dtype
+        bool, int64, float64 or unicode if all the values are of that kind, or object otherwise.
+    """
+    if all(isinstance(value, (bool, np.bool_)) for value in values):
+        return np.dtype(bool)
+    if not any(isinstance(value, (bool, np.bool_)) for value in values):
+        if all(isinstance(value, (int, np.integer)) for value in values):
+            return np.dtype(np.int64)
+        if all(isinstance(value, (int, float, np.integer, np.floating)) for value in values):
+            return np.dtype(np.float64)
+    if all(isinstance(value, str) for value in values):
+        return np.dtype('U%d' % max([1] + [len(value) for value in values]))
+    return np.dtype(object)
+
+
+def _fillColumn(array, key, values):
+    """Set the values of a field of a structured array."""
+    if array.dtype[key] == np.dtype(object):
+        # assign element by element so that sequence values are not broadcast.
+        column = array[key]
+        for i, value in enumerate(values):
+            column[i] = value
+    else:
+        array[key] = values
+
+
+def _toPython(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _isNan(value):
+    return isinstance(value, (float, np.floating)) and value != value
+
+
+def _objectSortKey(value):
+    """Get a key that sorts a value of an object column: None and NaN after all the other values."""
+    if value is None:
+        return (2, 0)
+    if _isNan(value):
+        return (1, 0)
+    return (0, value)
+
+
+class DataIdTable:
+    """A container of dataIds that all have the same keys, held as a NumPy structured array with one field
+    per key.
+
+    A dataId held in a DataIdTable takes a few bytes per key, instead of the hundreds of bytes of a dict.
+    The dataIds are turned into dicts (of Python values) only when they are indexed or iterated over.
+    Selecting, sorting, grouping and set operations are done on the whole array at once.
+
+    Parameters
+    ----------
+    array : numpy.ndarray
+        A structured array with one field per dataId key.
+    """
+
+    def __init__(self, array):
+        self._array = array
+
+    @classmethod
+    def fromDicts(cls, dataIds, keys=None):
+        """Make a DataIdTable from dataIds.
+
+        Parameters
+        ----------
+        dataIds : iterable of dict
+            The dataIds. It is iterated over once, so it may be a generator.
+        keys : sequence of string, optional
+            The keys of the dataIds. If None, the keys of the first dataId are used.
+
+        Returns
+        -------
+        DataIdTable
+            The table.
+
+        Raises
+        ------
+        RuntimeError
+            If a dataId does not have one of the keys.
+        """
+        columns = None
+        for dataId in dataIds:
+            if columns is None:
+                if keys is None:
+                    keys = list(dataId.keys())
+                columns = collections.OrderedDict((key, []) for key in keys)
+            for key, column in columns.items():
+                try:
+                    column.append(dataId[key])
+                except KeyError:
+                    raise RuntimeError("DataId %s does not have key %s" % (dataId, key))
+        if columns is None:
+            columns = collections.OrderedDict((key, []) for key in (keys or ()))
+        return cls._fromColumns(columns)
+
+    @classmethod
+    def fromTuples(cls, keys, idTuples, constants=None):
+        """Make a DataIdTable from the tuples of values returned by Butler.queryMetadata.
+
+        Parameters
+        ----------
+        keys : sequence of string
+            The keys of the values in each tuple.
+        idTuples : iterable
+            The tuples of values (or, if there is only one key, the values). It is iterated over once, so it
+            may be a generator.
+        constants : dict, optional
+            Other keys and values that all the dataIds have (such as the partial dataId that was queried).
+
+        Returns
+        -------
+        DataIdTable
+            The table.
+        """
+        keys = list(keys)
+        columns = collections.OrderedDict((key, []) for key in keys)
+        nRows = 0
+        for idTuple in idTuples:
+            if len(keys) == 1:
+                columns[keys[0]].append(idTuple)
+            else:
+                for key, value in zip(keys, idTuple):
+                    columns[key].append(value)
+            nRows += 1
+        for key, value in (constants or {}).items():
+            if key not in columns:
+                columns[key] = [value] * nRows
+        return cls._fromColumns(columns)
+
+    @classmethod
+    def _fromColumns(cls, columns):
+        dtype = np.dtype([(key, _columnDtype(values)) for key, values in columns.items()])
+        nRows = len(next(iter(columns.values()))) if columns else 0
+        array = np.empty(nRows, dtype=dtype)
+        for key, values in columns.items():
+            _fillColumn(array, key, values)
+        return cls(array)
+
+    @property
+    def keys(self):
+        """The keys of the dataIds (tuple of string)."""
+        return self._array.dtype.names or ()
+
+    @property
+    def array(self):
+        """The structured array that holds the dataIds (numpy.ndarray)."""
+        return self._array
+
+    @property
+    def nbytes(self):
+        """The number of bytes used by the values of the dataIds (int)."""
+        return self._array.nbytes
+
+    def column(self, key):
+        """Get the values of one key of all the dataIds.
+
+        Parameters
+        ----------
+        key : string
+            The key.
+
+        Returns
+        -------
+        numpy.ndarray
+            The values, in the order of the dataIds.
+        """
+        return self._array[key]
+
+    def __len__(self):
+        return len(self._array)
+
+    def __repr__(self):
+        return "DataIdTable(keys=%s, len=%d)" % (list(self.keys), len(self))
+
+    def _row(self, row):
+        return {key: _toPython(row[key]) for key in self.keys}
+
+    def __getitem__(self, index):
+        """Get a dataId, or a table of some of the dataIds.
+
+        Parameters
+        ----------
+        index : int, slice, or array of int or bool
+            The index of a dataId, or the indices (or mask) of the dataIds to keep.
+
+        Returns
+        -------
+        dict or DataIdTable
+            The dataId if index is an int, or else a table of the indexed dataIds.
+        """
+        if isinstance(index, (int, np.integer)):
+            return self._row(self._array[index])
+        return DataIdTable(self._array[index])
+
+    def __iter__(self):
+        for row in self._array:
+            yield self._row(row)
+
+    def select(self, **criteria):
+        """Get the dataIds that match criteria.
+
+        Parameters
+        ----------
+        **criteria
+            For each key, the value to match, or a list, tuple or set of the values to match.
+
+        Returns
+        -------
+        DataIdTable
+            The matching dataIds, in their order in this table.
+
+        Raises
+        ------
+        RuntimeError
+            If a key is not a key of this table.
+        """
+        mask = np.ones(len(self._array), dtype=bool)
+        for key, value in criteria.items():
+            if key not in self.keys:
+                raise RuntimeError("DataIdTable has no key %s" % key)
+            if isinstance(value, (list, tuple, set, frozenset)):
+                mask &= np.isin(self._array[key], list(value))
+            else:
+                mask &= self._array[key] == value
+        return DataIdTable(self._array[mask])
+
+    def sort(self, *keys):
+        """Get the dataIds sorted by the values of keys.
+
+        Parameters
+        ----------
+        *keys
+            The keys to sort by, most significant first. If there are none, all the keys are used, in order.
+
+        Returns
+        -------
+        DataIdTable
+            The sorted dataIds; dataIds with equal values keep their order.
+        """
+        keys = list(keys or self.keys)
+        return DataIdTable(self._array[self._argsort(keys)])
+
+    def _argsort(self, keys):
+        if not keys:
+            return np.arange(len(self._array))
+        return np.lexsort([self._sortColumn(key) for key in reversed(keys)])
+
+    def _sortColumn(self, key):
+        """Get an array that numpy sorts in the order of the values of a key.
+
+        An object column (which numpy cannot sort if it holds None) is replaced by the rank of each value,
+        with equal values (including NaN and None) given the same rank.
+
+        Raises
+        ------
+        RuntimeError
+            If the values of an object column cannot be compared with each other.
+        """
+        column = self._array[key]
+        if column.dtype != np.dtype(object):
+            return column
+        try:
+            order = sorted(range(len(column)), key=lambda i: _objectSortKey(column[i]))
+        except TypeError as e:
+            raise RuntimeError("Cannot sort the values of key %s: %s" % (key, e))
+        ranks = np.empty(len(column), dtype=np.int64)
+        rank = -1
+        previous = None
+        for i in order:
+            if rank < 0 or _objectSortKey(column[i]) != _objectSortKey(previous):
+                rank += 1
+            ranks[i] = rank
+            previous = column[i]
+        return ranks
+
+    def groupBy(self, *keys):
+        """Group the dataIds by the values of keys.
+
+        Parameters
+        ----------
+        *keys
+            The keys to group by.
+
+        Returns
+        -------
+        collections.OrderedDict
+            A DataIdTable of the dataIds of each group, in order of the sorted values, keyed by the value (if
+            there is one key) or the tuple of values.
+        """
+        keys = list(keys)
+        groups = collections.OrderedDict()
+        if len(self._array) == 0:
+            return groups
+        order, starts = self._groupStarts(keys)
+        sortedArray = self._array[order]
+        bounds = list(np.flatnonzero(starts)) + [len(sortedArray)]
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            values = tuple(_toPython(sortedArray[key][start]) for key in keys)
+            groups[values[0] if len(keys) == 1 else values] = DataIdTable(sortedArray[start:end])
+        return groups
+
+    def _groupStarts(self, keys):
+        """Sort the rows by keys and find where each run of equal values starts.
+
+        Returns
+        -------
+        order : numpy.ndarray
+            The indices of the rows in sorted order; rows with equal values keep their order.
+        starts : numpy.ndarray
+            A bool for each sorted row, True if its values differ from those of the row before it.
+        """
+        columns = [self._sortColumn(key) for key in keys]
+        order = np.lexsort(columns[::-1]) if keys else np.arange(len(self._array))
+        starts = np.zeros(len(order), dtype=bool)
+        if len(order) > 0:
+            starts[0] = True
+        for column in columns:
+            column = column[order]
+            differs = column[1:] != column[:-1]
+            if column.dtype.kind in 'fc':
+                # NaN != NaN, but NaNs are the same value here.
+                differs &= ~(np.isnan(column[1:]) & np.isnan(column[:-1]))
+            starts[1:] |= differs
+        return order, starts
+
+    def unique(self):
+        """Get the distinct dataIds, keeping the first of each in its place.
+
+        Returns
+        -------
+        DataIdTable
+            The dataIds, without the ones that are equal to a dataId before them.
+        """
+        order, starts = self._groupStarts(list(self.keys))
+        return DataIdTable(self._array[np.sort(order[starts])])
+
+    def withConstants(self, constants):
+        """Get the dataIds with more keys that have the same value in every dataId.
+
+        Parameters
+        ----------
+        constants : dict
+            The keys and values to add; keys that the table already has are not changed.
+
+        Returns
+        -------
+        DataIdTable
+            The table with the new keys.
+        """
+        columns = collections.OrderedDict((key, self._array[key]) for key in self.keys)
+        for key, value in constants.items():
+            if key not in columns:
+                columns[key] = [value] * len(self)
+        dtype = np.dtype([(key, self._array.dtype[key] if key in self.keys else _columnDtype(values))
+                          for key, values in columns.items()])
+        array = np.empty(len(self), dtype=dtype)
+        for key, values in columns.items():
+            _fillColumn(array, key, values)
+        return DataIdTable(array)
+
+    def _promote(self, other):
+        """Get the arrays of this table and another, with the fields of the other in the same order and
+        both with the same dtype.
+
+        Raises
+        ------
+        RuntimeError
+            If the tables have different keys, or the values of a key are of different kinds (e.g. int in
+            one and string in the other); values are not converted from one kind to another.
+        """
+        if set(self.keys) != set(other.keys):
+            raise RuntimeError("DataIdTables have different keys: %s and %s" % (self.keys, other.keys))
+        fields = []
+        for key in self.keys:
+            mine, theirs = self._array.dtype[key], other._array.dtype[key]
+            if len(other) == 0:
+                dtype = mine
+            elif len(self) == 0:
+                dtype = theirs
+            elif mine.kind != theirs.kind:
+                raise RuntimeError("DataIdTables have different types of values of key %s: %s and %s" %
+                                   (key, mine, theirs))
+            else:
+                dtype = np.promote_types(mine, theirs)
+            fields.append((key, dtype))
+        dtype = np.dtype(fields)
+        return self._array.astype(dtype), other._array[list(self.keys)].astype(dtype)
+
+    def _combine(self, other, keep):
+        """Get the distinct dataIds of this table and another, sorted, that are selected by where they are.
+
+        Parameters
+        ----------
+        other : DataIdTable
+            A table with the same keys.
+        keep : callable
+            Called with two arrays of bool, that say for each distinct dataId whether it is in this table and
+            whether it is in the other; returns the mask of the dataIds to keep.
+
+        Returns
+        -------
+        DataIdTable
+            The dataIds that are kept.
+        """
+        first, second = self._promote(other)
+        combined = DataIdTable(np.concatenate([first, second]))
+        order, starts = combined._groupStarts(list(self.keys))
+        groups = np.cumsum(starts) - 1
+        fromSelf = order < len(first)
+        inSelf = np.zeros(int(starts.sum()), dtype=bool)
+        inSelf[groups[fromSelf]] = True
+        inOther = np.zeros(len(inSelf), dtype=bool)
+        inOther[groups[~fromSelf]] = True
+        return DataIdTable(combined._array[order[starts][keep(inSelf, inOther)]])
+
+    def union(self, other):
+        """Get the dataIds that are in this table or another.
+
+        Parameters
+        ----------
+        other : DataIdTable
+            A table with the same keys, and the same kind of values of each key.
+
+        Returns
+        -------
+        DataIdTable
+            The dataIds, sorted and without duplicates.
+
+        Raises
+        ------
+        RuntimeError
+            If the keys, or the kinds of their values, differ.
+        """
+        return self._combine(other, lambda inSelf, inOther: inSelf | inOther)
+
+    def intersection(self, other):
+        """Get the dataIds that are in both this table and another.
+
+        Parameters
+        ----------
+        other : DataIdTable
+            A table with the same keys, and the same kind of values of each key.
+
+        Returns
+        -------
+        DataIdTable
+            The dataIds, sorted and without duplicates.
+
+        Raises
+        ------
+        RuntimeError
+            If the keys, or the kinds of their values, differ.
+        """
+        return self._combine(other, lambda inSelf, inOther: inSelf & inOther)
+
+    def difference(self, other):
+        """Get the dataIds that are in this table and not in another.
+
+        Parameters
+        ----------
+        other : DataIdTable
+            A table with the same keys, and the same kind of values of each key.
+
+        Returns
+        -------
+        DataIdTable
+            The dataIds, sorted and without duplicates.
+
+        Raises
+        ------
+        RuntimeError
+            If the keys, or the kinds of their values, differ.
+        """
+        return self._combine(other, lambda inSelf, inOther: inSelf & ~inOther)
@@ -0,0 +1,377 @@
+#
+# LSST Data Management System
+# Copyright 2018 AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsstcorp.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+
+"""This module provides the FileIndex class, a persistent index of the files in a posix repository.
+
+An index is built by scanning a repository, e.g. from the command line with:
+
+    python -m lsst.daf.persistence.fileIndex /path/to/repository
+"""
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+
+from .safeFileIo import safeMakeDir, setFileMode
+
+__all__ = ["FileIndex"]
+
+
+class FileIndex:
+    """A sqlite index, kept in a directory in the root of a repository, of the path, size and modification
+    time of every file in the repository, and of the modification time of every directory.
+
+    PosixStorage uses the index (when it is present and fresh) to check if files exist without going to the
+    filesystem: a file exists if and only if it is in the index.
+
+    The freshness of the whole index is checked once, when it is opened by PosixStorage: the index is fresh
+    if it was completely built by a scan and the modification time of each directory in the repository
+    (which changes when a file or subdirectory in it is added, removed or renamed) is the one recorded in
+    the index. A file that is rewritten in place does not change the modification time of its directory,
+    but the formatters of PosixStorage write to a temporary file that is renamed into place. Changes made to
+    the repository after the index is opened are not seen, so the index should only be used for repositories
+    that are not written to by other processes while they are read.
+
+    An index is only updated by PosixStorage with the files it writes if it was built to be updatable. Each
+    update is a write transaction on the index file, so updates serialize parallel writers; also, the index
+    is a sqlite database, which relies on posix file locks to let more than one process use it, and those
+    locks are unreliable on some shared filesystems (notably NFS). An index that is not updatable is only
+    read, and should be rebuilt after processing that writes to the repository.
+
+    Parameters
+    ----------
+    root : string
+        The path to the root directory of the repository.
+    """
+
+    dirName = "_fileIndex"
+    """The name of the directory in the repository root that holds the index. It is kept in its own directory
+    so that the sqlite journal files do not change the modification time of the root directory."""
+
+    fileName = "files.sqlite3"
+    """The name of the index file."""
+
+    def __init__(self, root):
+        self.root = root
+        self.path = os.path.join(root, self.dirName, self.fileName)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, timeout=60., check_same_thread=False)
+        self._updatable = None
+
+    def __repr__(self):
+        return "FileIndex(root=%r)" % self.root
+
+    @classmethod
+    def open(cls, root):
+        """Open the index of a repository, if it has one.
+
+        Parameters
+        ----------
+        root : string
+            The path to the root directory of the repository.
+
+        Returns
+        -------
+        FileIndex or None
+            The index, or None if the repository does not have an index.
+        """
+        if not os.path.exists(os.path.join(root, cls.dirName, cls.fileName)):
+            return None
+        return cls(root)
+
+    @classmethod
+    def build(cls, root, updatable=False):
+        """Scan a repository and (re)write its index.
+
+        The index is written to a temporary file that is renamed into place when the scan is done, so that
+        readers never see a partial index.
+
+        Parameters
+        ----------
+        root : string
+            The path to the root directory of the repository.
+        updatable : bool, optional
+            If True, PosixStorage adds the files it writes to the index.
+
+        Returns
+        -------
+        FileIndex
+            The new index.
+        """
+        indexDir = os.path.join(root, cls.dirName)
+        safeMakeDir(indexDir)
+        temp = tempfile.NamedTemporaryFile(dir=indexDir, prefix=cls.fileName, delete=False)
+        temp.close()
+        try:
+            files, dirs = cls._scan(root)
+            connection = sqlite3.connect(temp.name)
+            with connection:
+                cls._createTables(connection)
+                connection.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)", files)
+                connection.executemany("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?)", dirs)
+                connection.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                                       [('complete', 1), ('updatable', int(updatable))])
+            connection.close()
+            os.rename(temp.name, os.path.join(indexDir, cls.fileName))
+            setFileMode(os.path.join(indexDir, cls.fileName))
+        except Exception:
+            os.remove(temp.name)
+            raise
+        return cls(root)
+
+    @staticmethod
+    def _createTables(connection):
+        connection.execute("CREATE TABLE IF NOT EXISTS files "
+                           "(path TEXT PRIMARY KEY, dir TEXT, size INTEGER, mtime REAL)")
+        connection.execute("CREATE INDEX IF NOT EXISTS files_dir ON files (dir)")
+        connection.execute("CREATE TABLE IF NOT EXISTS dirs "
+                           "(path TEXT PRIMARY KEY, dir TEXT, mtime INTEGER)")
+        connection.execute("CREATE INDEX IF NOT EXISTS dirs_dir ON dirs (dir)")
+        connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)")
+
+    @classmethod
+    def _isExcluded(cls, relDir, name):
+        """The index does not list itself, or the Butler v1 link to a parent repository."""
+        return relDir == '' and name in (cls.dirName, '_parent')
+
+    @classmethod
+    def _scan(cls, root):
+        """Scan a repository.
+
+        Returns the (path, dir, size, mtime) of each file and the (path, dir, mtime in ns) of each directory,
+        where path is relative to root and dir is the path of the directory that holds the file or directory
+        (the root directory has the path ''). Symbolic links to directories are followed, unless they link to
+        a directory that holds them.
+        """
+        files = []
+        dirs = []
+        pending = [('', None, frozenset())]
+        while pending:
+            relDir, parent, ancestors = pending.pop()
+            dirPath = os.path.join(root, relDir)
+            try:
+                # stat the directory before listing it, so that a change made to it during the scan makes
+                # the index stale.
+                stat = os.stat(dirPath)
+                if (stat.st_dev, stat.st_ino) in ancestors:
+                    continue
+                ancestors = ancestors | {(stat.st_dev, stat.st_ino)}
+                with os.scandir(dirPath) as it:
+                    entries = sorted(it, key=lambda entry: entry.name)
+            except OSError:
+                continue
+            dirs.append((relDir, parent, stat.st_mtime_ns))
+            for entry in entries:
+                if cls._isExcluded(relDir, entry.name):
+                    continue
+                path = os.path.join(relDir, entry.name)
+                try:
+                    if entry.is_dir():
+                        pending.append((path, relDir, ancestors))
+                        continue
+                    entryStat = entry.stat()
+                except OSError:
+                    # e.g. a broken symlink, or a file that was removed during the scan.
+                    continue
+                files.append((path, relDir, entryStat.st_size, entryStat.st_mtime))
+        return files, dirs
+
+    def _getMeta(self, key):
+        with self._lock:
+            row = self._connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def isFresh(self):
+        """Check if the index can be used instead of the filesystem.
+
+        This stats each directory of the repository, so it should be called once, when the index is opened,
+        rather than for each lookup.
+
+        Returns
+        -------
+        bool
+            True if the index was completely built and the modification time of each directory in it is the
+            one recorded in the index.
+        """
+        try:
+            if not self._getMeta('complete'):
+                return False
+            with self._lock:
+                dirs = self._connection.execute("SELECT path, mtime FROM dirs").fetchall()
+            for path, mtime in dirs:
+                if os.stat(os.path.join(self.root, path)).st_mtime_ns != mtime:
+                    return False
+            return len(dirs) > 0
+        except (sqlite3.Error, OSError):
+            return False
+
+    def isUpdatable(self):
+        """Check if the files written to the repository should be added to the index.
+
+        Returns
+        -------
+        bool
+            True if the index was built to be updatable.
+        """
+        if self._updatable is None:
+            try:
+                self._updatable = bool(self._getMeta('updatable'))
+            except sqlite3.Error:
+                self._updatable = False
+        return self._updatable
+
+    def _relativePath(self, path):
+        path = os.path.normpath(path)
+        if os.path.isabs(path):
+            path = os.path.relpath(path, self.root)
+        return path
+
+    def covers(self, path):
+        """Check if a path is one that the index lists, if it exists.
+
+        Parameters
+        ----------
+        path : string
+            The path of the file, relative to the repository root or absolute.
+
+        Returns
+        -------
+        bool
+            False if the path is outside the repository or goes through a directory that the index does not
+            list (the index directory itself, or the Butler v1 link to a parent repository).
+        """
+        parts = self._relativePath(path).split(os.sep)
+        return parts[0] != os.pardir and not (len(parts) > 1 and self._isExcluded('', parts[0]))
+
+    def lookup(self, path):
+        """Look up a file in the index.
+
+        Parameters
+        ----------
+        path : string
+            The path of the file, relative to the repository root or absolute.
+
+        Returns
+        -------
+        tuple of (int, float) or None
+            The size and modification time of the file, or None if the file is not in the index.
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT size, mtime FROM files WHERE path = ?",
+                                           (self._relativePath(path),)).fetchone()
+        return None if row is None else tuple(row)
+
+    def contains(self, path):
+        """Check if a file is in the index.
+
+        Parameters
+        ----------
+        path : string
+            The path of the file, relative to the repository root or absolute.
+
+        Returns
+        -------
+        bool
+            True if the file is in the index.
+        """
+        return self.lookup(path) is not None
+
+    def add(self, paths):
+        """Add files that have been written to the index, with their current size and modification time.
+
+        The directories that hold the files are added too, and the modification times of the directories
+        that were changed are updated, as long as each file and subdirectory in them is in the index. If
+        anything else has been written to one of them (e.g. by another process that does not update the
+        index), its modification time is left as it was, and the index is stale the next time it is opened.
+
+        Parameters
+        ----------
+        paths : iterable of string
+            The paths of the files, relative to the repository root or absolute.
+        """
+        rows = []
+        dirs = set()
+        for path in paths:
+            relativePath = self._relativePath(path)
+            relDir = os.path.dirname(relativePath)
+            stat = os.stat(os.path.join(self.root, relativePath))
+            rows.append((relativePath, relDir, stat.st_size, stat.st_mtime))
+            while relDir not in dirs:
+                dirs.add(relDir)
+                if relDir == '':
+                    break
+                relDir = os.path.dirname(relDir)
+        with self._lock, self._connection:
+            self._createTables(self._connection)
+            self._connection.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)", rows)
+            # update the deepest directories first, so that a new subdirectory is in the index when its
+            # parent is checked.
+            for relDir in sorted(dirs, key=lambda relDir: relDir.count(os.sep) + bool(relDir), reverse=True):
+                self._updateDir(relDir)
+
+    def _updateDir(self, relDir):
+        """Add a directory to the index, or update its modification time, if each file and subdirectory in it
+        is in the index. Must be called with the lock held, in a transaction.
+        """
+        try:
+            mtime = os.stat(os.path.join(self.root, relDir)).st_mtime_ns
+            row = self._connection.execute("SELECT mtime FROM dirs WHERE path = ?", (relDir,)).fetchone()
+            if row is not None and row[0] == mtime:
+                return
+            names = set(os.listdir(os.path.join(self.root, relDir)))
+        except OSError:
+            return
+        indexed = set()
+        for table in ('files', 'dirs'):
+            for (path,) in self._connection.execute("SELECT path FROM %s WHERE dir = ?" % table, (relDir,)):
+                indexed.add(os.path.basename(path))
+        if set(name for name in names if not self._isExcluded(relDir, name)) != indexed:
+            return
+        parent = os.path.dirname(relDir) if relDir else None
+        self._connection.execute("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?)", (relDir, parent, mtime))
+
+    def close(self):
+        """Close the connection to the index file."""
+        with self._lock:
+            self._connection.close()
+
+
+def main():
+    """Build the file index of one or more repositories."""
+    parser = argparse.ArgumentParser(description="Build the file index used by PosixStorage to check if "
+                                     "files exist in a repository without going to the filesystem.")
+    parser.add_argument("roots", nargs="+", metavar="ROOT", help="path to the root of a repository")
+    parser.add_argument("--updatable", action="store_true",
+                        help="add the files written by the Butler to the index (not safe on NFS)")
+    args = parser.parse_args()
+    for root in args.roots:
+        index = FileIndex.build(root, updatable=args.updatable)
+        with index._lock:
+            count = index._connection.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+        index.close()
+        print("Indexed %d files in %s" % (count, root))
+
+
+if __name__ == "__main__":
+    main()
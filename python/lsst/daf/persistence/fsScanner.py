@@ -125,11 +125,17 @@ class FsScanner:
         :return: Path info: {path: {key:value ...}, ...} e.g.:
             {'0239622/instcal0239622.fits.fz': {'visit_0': 239622, 'visit': 239622}}
         """
-        ret = {}
-        curdir = os.getcwd()
-        os.chdir(location)
-        pathList = glob.glob(self.globString)
-        for path in pathList:
+        return dict(self.iterPath(location))
+
+    def iterPath(self, location):
+        """
+        Scan a given path location incrementally, yielding info about each path that conforms to the path
+        template as it is found, instead of building the info of all the paths first.
+        :param location:
+        :return: generator of (path, {key:value ...}) pairs, with the paths relative to location.
+        """
+        for fullPath in glob.iglob(os.path.join(glob.escape(location), self.globString)):
+            path = os.path.relpath(fullPath, location)
             m = re.search(self.reString, path)
             if m:
                 dataId = m.groupdict()
@@ -138,8 +144,6 @@ class FsScanner:
                         dataId[f] = int(dataId[f])
                     elif self.isFloat(f):
                         dataId[f] = float(dataId[f])
-                ret[path] = dataId
+                yield path, dataId
             else:
                 print("Warning: unmatched path: %s" % (path,), file=sys.stderr)
-        os.chdir(curdir)
-        return ret
@@ -21,10 +21,15 @@
 # the GNU General Public License along with this program.  If not,
 # see <http://www.lsstcorp.org/LegalNotices/>.
 #
+import weakref
+
 from . import Policy
 
 """This module defines the Mapper base class."""
 
+_classFunctions = weakref.WeakKeyDictionary()
+"""The map_, bypass_, std_ and query_ functions (or other descriptors) of each Mapper class, by name."""
+
 
 class Mapper:
     """Mapper is a base class for all mappers.
@@ -58,6 +63,12 @@ class Mapper:
 
     queryMetadata(self, datasetType, key, format, dataId)
 
+    queryMetadataIter(self, datasetType, format, dataId)
+
+    queryMetadataCount(self, datasetType, format, dataId)
+
+    getRegistryLookup(self, datasetType, dataId)
+
     canStandardize(self, datasetType)
 
     standardize(self, datasetType, item, dataId)
@@ -118,11 +129,72 @@ class Mapper:
         :param dataId: see documentation about the use of dataId
         :return:
         """
-        func = getattr(self, 'query_' + datasetType)
+        func = self._getMethod('query_', datasetType)
+        if func is None:
+            raise AttributeError("%s has no attribute 'query_%s'" % (type(self).__name__, datasetType))
 
         val = func(format, self.validate(dataId))
         return val
 
+    def getRegistryLookup(self, datasetType, dataId):
+        """Get the registry lookup that queryMetadata does for a dataset type, so that queryMetadataIter and
+        queryMetadataCount can ask the registry (see Registry.lookupIter and Registry.lookupCount) instead of
+        gathering the values with queryMetadata.
+
+        Mappers whose query_ methods look values up in the registry returned by getRegistry should override
+        this. By default there is no lookup, and the values are not streamed or counted by the registry:
+        queryMetadataIter iterates over the list made by queryMetadata and queryMetadataCount returns None.
+
+        :param datasetType: see documentation about the use of datasetType
+        :param dataId: the validated partial data id
+        :return: None, or a tuple of the reference (table names), the data id and a dict of the other keyword
+                 arguments to pass to the registry's lookup methods
+        """
+        return None
+
+    def _registryLookup(self, datasetType, dataId):
+        registry = self.getRegistry()
+        if registry is None:
+            return None, None
+        return registry, self.getRegistryLookup(datasetType, self.validate(dataId))
+
+    def queryMetadataIter(self, datasetType, format, dataId):
+        """Get an iterator over the possible values for keys given a partial data id.
+
+        If the mapper has a registry lookup for the dataset type (see getRegistryLookup) the values are
+        fetched with the registry's lookupIter, so that ButlerSubsets created with stream=True do not hold all
+        the values at once. Otherwise it iterates over the result of queryMetadata.
+
+        :param datasetType: see documentation about the use of datasetType
+        :param format: the keys to get the values of
+        :param dataId: see documentation about the use of dataId
+        :return: an iterator over the values
+        """
+        registry, lookup = self._registryLookup(datasetType, dataId)
+        if lookup is not None:
+            reference, lookupDataId, kwargs = lookup
+            return registry.lookupIter(format, reference, lookupDataId, **kwargs)
+        return iter(self.queryMetadata(datasetType, format, dataId) or ())
+
+    def queryMetadataCount(self, datasetType, format, dataId):
+        """Count the possible values for keys given a partial data id.
+
+        If the mapper has a registry lookup for the dataset type (see getRegistryLookup) the values are
+        counted with the registry's lookupCount (e.g. with a COUNT query) instead of being fetched. Otherwise
+        the values can only be counted by fetching them, and None is returned so that the caller can fetch
+        them once and keep them instead of fetching them again to iterate over them.
+
+        :param datasetType: see documentation about the use of datasetType
+        :param format: the keys to get the values of
+        :param dataId: see documentation about the use of dataId
+        :return: the number of values, or None if they can not be counted without fetching them
+        """
+        registry, lookup = self._registryLookup(datasetType, dataId)
+        if lookup is None:
+            return None
+        reference, lookupDataId, kwargs = lookup
+        return registry.lookupCount(format, reference, lookupDataId, **kwargs)
+
     def getDatasetTypes(self):
         """Return a list of the mappable dataset types."""
 
@@ -159,21 +231,60 @@ class Mapper:
             class may raise a lsst.daf.persistence.NoResults exception. Butler
             catches this and will look in the next Repository if there is one.
         """
-        func = getattr(self, 'map_' + datasetType)
+        func = self._getMethod('map_', datasetType)
+        if func is None:
+            raise AttributeError("%s has no attribute 'map_%s'" % (type(self).__name__, datasetType))
         return func(self.validate(dataId), write)
 
+    def _getMethod(self, prefix, datasetType):
+        """Get the method that handles a dataset type, e.g. the 'map_' method.
+
+        The functions that are defined by the class of the mapper are looked
+        up once per class and bound to the mapper when they are asked for.
+        Methods that are set on the mapper instance, and methods that the
+        mapper does not have, are looked up every time, so methods added
+        after the first use of a dataset type are found.
+
+        Parameters
+        ----------
+        prefix : string
+            The prefix of the method name: 'map_', 'bypass_', 'std_' or
+            'query_'.
+        datasetType : string
+            The dataset type.
+
+        Returns
+        -------
+        callable or None
+            The method, or None if the mapper does not have it.
+        """
+        name = prefix + datasetType
+        cls = type(self)
+        if name not in self.__dict__:
+            functions = _classFunctions.get(cls)
+            if functions is not None and name in functions:
+                return functions[name].__get__(self, cls)
+            for klass in cls.__mro__:
+                if name in klass.__dict__:
+                    function = klass.__dict__[name]
+                    if hasattr(function, '__get__'):
+                        _classFunctions.setdefault(cls, {})[name] = function
+                        return function.__get__(self, cls)
+                    break
+        return getattr(self, name, None)
+
     def canStandardize(self, datasetType):
         """Return true if this mapper can standardize an object of the given
         dataset type."""
 
-        return hasattr(self, 'std_' + datasetType)
+        return self._getMethod('std_', datasetType) is not None
 
     def standardize(self, datasetType, item, dataId):
         """Standardize an object using the standardization method for its data
         set type, if it exists."""
 
-        if hasattr(self, 'std_' + datasetType):
-            func = getattr(self, 'std_' + datasetType)
+        func = self._getMethod('std_', datasetType)
+        if func is not None:
             return func(item, self.validate(dataId))
         return item
 
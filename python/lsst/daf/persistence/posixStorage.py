@@ -29,6 +29,7 @@ import re
 import urllib.parse
 import glob
 import shutil
+import sqlite3
 import yaml
 
 from . import (LogicalLocation, Policy,
@@ -36,7 +37,8 @@ from . import (LogicalLocation, Policy,
                NoRepositroyAtRoot, RepositoryCfg, doImport)
 from lsst.log import Log
 import lsst.pex.policy as pexPolicy
-from .safeFileIo import SafeFilename, safeMakeDir
+from .safeFileIo import SafeFilename, safeMakeDir, cloneFile
+from .fileIndex import FileIndex
 
 
 __all__ = ["PosixStorage"]
@@ -58,8 +60,21 @@ class PosixStorage(StorageInterface):
     NoRepositroyAtRoot
         If create is False and a repository does not exist at the root
         specified by uri then NoRepositroyAtRoot is raised.
+
+    Notes
+    -----
+    If the repository has a FileIndex that is fresh when it is first needed,
+    the existence of files is checked in the index instead of on the
+    filesystem: files that are in it exist, and files that are not do not.
+    If the index is updatable, the files written by this storage are added to
+    it; otherwise the index is no longer used once this storage writes a file.
     """
 
+    _existsStorageNames = ('FitsStorage', 'PafStorage',
+                           'PickleStorage', 'ConfigStorage', 'FitsCatalogStorage',
+                           'YamlStorage', 'ParquetStorage', 'MatplotlibStorage')
+    """The storage names of the ButlerLocations that exists can look for."""
+
     def __init__(self, uri, create):
         self.log = Log.getLogger("daf.persistence.butler")
         self.root = self._pathFromURI(uri)
@@ -67,6 +82,8 @@ class PosixStorage(StorageInterface):
             if not create:
                 raise NoRepositroyAtRoot("No repository at {}".format(uri))
             safeMakeDir(self.root)
+        self._fileIndex = None
+        self._fileIndexOpened = False
 
     def __repr__(self):
         return 'PosixStorage(root=%s)' % self.root
@@ -255,10 +272,153 @@ class PosixStorage(StorageInterface):
             writeFormatter = self.getWriteFormatter(butlerLocation.getPythonType())
         if writeFormatter:
             writeFormatter(butlerLocation, obj)
+            self._updateFileIndex(butlerLocation)
             return
 
         raise(RuntimeError("No formatter for location:{}".format(butlerLocation)))
 
+    def _getFileIndex(self):
+        """Get the file index of this storage, if it has one that is fresh.
+
+        The index is opened (and its freshness checked) the first time it is needed.
+
+        Returns
+        -------
+        FileIndex or None
+            The index, or None if there is no index that can be used.
+        """
+        if not self._fileIndexOpened:
+            self._fileIndexOpened = True
+            if self.root:
+                try:
+                    fileIndex = FileIndex.open(self.root)
+                    if fileIndex is not None and not fileIndex.isFresh():
+                        self.log.debug("Not using stale file index in %s", self.root)
+                        fileIndex.close()
+                        fileIndex = None
+                    self._fileIndex = fileIndex
+                except sqlite3.Error as e:
+                    self.log.warn("Could not open the file index in %s: %s", self.root, e)
+        return self._fileIndex
+
+    def _disableFileIndex(self, error):
+        """Stop using the file index after an error."""
+        self.log.warn("Disabling the file index in %s after error: %s", self.root, error)
+        self._fileIndex = None
+
+    def _searchFileIndex(self, path):
+        """Check if a file exists by looking in the file index.
+
+        Parameters
+        ----------
+        path : string
+            A filename (and optionally prefix path) to look for within root. An
+            HDU indicator is ignored.
+
+        Returns
+        -------
+        bool or None
+            True if the file is in the index, False if it is not, or None if
+            the index can not answer (there is no fresh index, path contains
+            glob wildcards, or path is not one that the index lists), in
+            which case the file must be looked for on the filesystem.
+        """
+        fileIndex = self._getFileIndex()
+        if fileIndex is None:
+            return None
+        # Strip off any cfitsio bracketed extension if present
+        firstBracket = path.find("[")
+        if firstBracket != -1:
+            path = path[:firstBracket]
+        path = os.path.join(self.root, path)
+        if glob.has_magic(path) or not fileIndex.covers(path):
+            return None
+        try:
+            return fileIndex.contains(path)
+        except sqlite3.Error as e:
+            self._disableFileIndex(e)
+            return None
+
+    def _updateFileIndex(self, butlerLocation):
+        """Add the files that were written for a location to the file index, if there is one and it is
+        updatable, or stop using the index if it is not."""
+        fileIndex = self._getFileIndex()
+        if fileIndex is None:
+            return
+        if not fileIndex.isUpdatable():
+            self.log.debug("Not using the file index in %s, which is not updatable, after a write", self.root)
+            self._fileIndex = None
+            return
+        paths = []
+        for locationString in butlerLocation.getLocations():
+            path = LogicalLocation(locationString, butlerLocation.getAdditionalData()).locString()
+            firstBracket = path.find("[")
+            if firstBracket != -1:
+                path = path[:firstBracket]
+            paths.append(os.path.join(self.root, path))
+        try:
+            fileIndex.add(paths)
+        except (sqlite3.Error, OSError) as e:
+            self._disableFileIndex(e)
+
+    def copyWrite(self, butlerLocation, fromLocation, hardlink=False):
+        """Write a dataset by cloning the file that was just written for the same object at another location
+        (see safeFileIo.cloneFile), instead of running the write formatter again.
+
+        This is done only if both locations are in posix storage and have the same storage name and additional
+        data (which holds the write options, such as the FITS compression settings), and the formatter is one
+        of the formatters of this module that write exactly one file. The file is cloned to a temporary that
+        is renamed into place, as the formatters do.
+
+        Parameters
+        ----------
+        butlerLocation : ButlerLocation
+            The location & formatting for the object to be written.
+        fromLocation : ButlerLocation
+            A location the object was written to, with the same formatting.
+        hardlink : bool, optional
+            If True the file may be hard linked.
+
+        Returns
+        -------
+        bool
+            True if the dataset was written, False if it must be written with the write formatter.
+        """
+        fromStorage = fromLocation.getStorage()
+        storageName = butlerLocation.getStorageName()
+        if (not isinstance(fromStorage, PosixStorage) or fromLocation.getStorageName() != storageName or
+                self.getWriteFormatter(storageName) not in _singleFileWriteFormatters or
+                fromStorage.getWriteFormatter(storageName) is not self.getWriteFormatter(storageName) or
+                fromLocation.getAdditionalData().toString() != butlerLocation.getAdditionalData().toString()):
+            return False
+        root = butlerLocation.getStorage().root if butlerLocation.getStorage() else self.root
+        src = os.path.join(fromStorage.root, fromLocation.getLocations()[0])
+        dst = os.path.join(root, butlerLocation.getLocations()[0])
+        if os.path.abspath(src) == os.path.abspath(dst):
+            return True
+        self.log.debug("Put location=%s by copying %s", butlerLocation, src)
+        with SafeFilename(dst) as tempName:
+            how = cloneFile(src, tempName, hardlink)
+        self.log.debug("Copied %s to %s with %s", src, dst, how)
+        self._updateFileIndex(butlerLocation)
+        return True
+
+    def prepareWrite(self, butlerLocations):
+        """Create, once each, the directories that will hold the files of a batch of writes.
+
+        Parameters
+        ----------
+        butlerLocations : list of ButlerLocation
+            The locations that are about to be written.
+        """
+        directories = set()
+        for butlerLocation in butlerLocations:
+            root = butlerLocation.getStorage().root if butlerLocation.getStorage() else self.root
+            for locationString in butlerLocation.getLocations():
+                directories.add(os.path.dirname(os.path.join(root, locationString)))
+        for directory in sorted(directories):
+            safeMakeDir(directory)
+
     def read(self, butlerLocation):
         """Read from a butlerLocation.
 
@@ -284,15 +444,15 @@ class PosixStorage(StorageInterface):
         """Implementation of PosixStorage.exists for ButlerLocation objects.
         """
         storageName = location.getStorageName()
-        if storageName not in ('FitsStorage', 'PafStorage',
-                               'PickleStorage', 'ConfigStorage', 'FitsCatalogStorage',
-                               'YamlStorage', 'ParquetStorage', 'MatplotlibStorage'):
+        if storageName not in self._existsStorageNames:
             self.log.warn("butlerLocationExists for non-supported storage %s" % location)
             return False
         for locationString in location.getLocations():
             logLoc = LogicalLocation(locationString, location.getAdditionalData()).locString()
-            obj = self.instanceSearch(path=logLoc)
-            if obj:
+            found = self._searchFileIndex(logLoc)
+            if found is None:
+                found = bool(self.instanceSearch(path=logLoc))
+            if found:
                 return True
         return False
 
@@ -313,9 +473,97 @@ class PosixStorage(StorageInterface):
         if isinstance(location, ButlerLocation):
             return self.butlerLocationExists(location)
 
+        found = self._searchFileIndex(location)
+        if found is not None:
+            return found
         obj = self.instanceSearch(path=location)
         return bool(obj)
 
+    def getSize(self, butlerLocation):
+        """Get the number of bytes that reading a location will load from storage.
+
+        Parameters
+        ----------
+        butlerLocation : ButlerLocation
+            The location of the object(s).
+
+        Returns
+        -------
+        int or None
+            The total size of the files of the location in bytes, or None if
+            any of them can not be found.
+        """
+        size = 0
+        for locationString in butlerLocation.getLocations():
+            path = LogicalLocation(locationString, butlerLocation.getAdditionalData()).locString()
+            # Strip off any cfitsio bracketed extension if present
+            firstBracket = path.find("[")
+            if firstBracket != -1:
+                path = path[:firstBracket]
+            try:
+                size += os.stat(os.path.join(self.root, path)).st_size
+            except OSError:
+                return None
+        return size
+
+    def existsMany(self, locations):
+        """Check if each of many locations exists.
+
+        The files are grouped by the directory that would hold them, and each
+        directory is listed once, instead of searching for each file
+        separately; files that are in a fresh file index are not looked for.
+        Paths that contain glob wildcards are searched for one at a time, as
+        by exists.
+
+        Parameters
+        ----------
+        locations : list of ButlerLocation or string
+            A list of strings or ButlerLocations that describe the locations
+            of objects in this storage.
+
+        Returns
+        -------
+        list of bool
+            True for each location that exists, else False.
+        """
+        results = [False] * len(locations)
+        # map directory -> list of (index into locations, file name)
+        byDirectory = {}
+        for i, location in enumerate(locations):
+            if isinstance(location, ButlerLocation):
+                if location.getStorageName() not in self._existsStorageNames:
+                    self.log.warn("butlerLocationExists for non-supported storage %s" % location)
+                    continue
+                paths = [LogicalLocation(locationString, location.getAdditionalData()).locString()
+                         for locationString in location.getLocations()]
+            else:
+                paths = [location]
+            for path in paths:
+                found = self._searchFileIndex(path)
+                if found is not None:
+                    results[i] = results[i] or found
+                    continue
+                # Strip off any cfitsio bracketed extension if present
+                firstBracket = path.find("[")
+                if firstBracket != -1:
+                    path = path[:firstBracket]
+                if glob.has_magic(path):
+                    if self.instanceSearch(path=path):
+                        results[i] = True
+                    continue
+                directory, name = os.path.split(os.path.join(self.root, path))
+                byDirectory.setdefault(directory, []).append((i, name))
+        for directory, entries in byDirectory.items():
+            try:
+                with os.scandir(directory) as it:
+                    names = set(entry.name for entry in it)
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            for i, name in entries:
+                if name in names:
+                    results[i] = True
+        return results
+
     def locationWithRoot(self, location):
         """Get the full path to the location.
 
@@ -928,5 +1176,10 @@ PosixStorage.registerFormatters("MatplotlibStorage", readMatplotlibStorage, writ
 PosixStorage.registerFormatters("PafStorage", readFormatter=readPafStorage)
 PosixStorage.registerFormatters("YamlStorage", readYamlStorage, writeYamlStorage)
 
+# The write formatters that write their object to exactly one file, at the first location of the
+# ButlerLocation; their files can be cloned by PosixStorage.copyWrite.
+_singleFileWriteFormatters = (writeFitsStorage, writeParquetStorage, writeConfigStorage, writePickleStorage,
+                              writeFitsCatalogStorage, writeMatplotlibStorage, writeYamlStorage)
+
 Storage.registerStorageClass(scheme='', cls=PosixStorage)
 Storage.registerStorageClass(scheme='file', cls=PosixStorage)
@@ -24,8 +24,15 @@
 
 # -*- python -*-
 
-"""This module defines the ReadProxy class."""
+"""This module defines the ReadProxy class, the EvictableReadProxy class with the ProxyMemoryBudget that
+limits the memory used by their objects, and the CompositeReadProxy class."""
 
+import collections
+import contextlib
+import functools
+import threading
+
+from .butlerCache import CacheStats, ObjectCache
 from .persistence import ReadProxyBase
 
 
@@ -41,7 +48,7 @@ class ReadProxy(ReadProxyBase):
         set_callback(self, func)
 
     def __getattr__(self, attr):
-        getattr(self.__subject__, attr)
+        return getattr(self.__subject__, attr)
 
     def __setattr__(self, attr, val):
         setattr(self.__subject__, attr, val)
@@ -141,3 +148,357 @@ def _subject(self, get_cache=get_cache, set_cache=set_cache):
 
 ReadProxy.__subject__ = property(_subject, set_cache)
 del _subject
+
+
+class _ProxyEntry:
+    """The object of an EvictableReadProxy and its accounting in a ProxyMemoryBudget."""
+
+    __slots__ = ("obj", "size", "pins")
+
+    def __init__(self):
+        self.obj = _evicted
+        self.size = 0
+        self.pins = 0
+
+
+_evicted = object()
+"""A marker for the object of an EvictableReadProxy that has not been read or has been evicted."""
+
+
+class ProxyMemoryBudget:
+    """Limits the memory used by the objects of EvictableReadProxys.
+
+    When loading the object of a proxy makes the objects of all the proxies that share the budget use more
+    than maxBytes, the objects of the least recently used proxies are dropped (evicted) until they fit. A
+    proxy whose object has been evicted reads it again, with its callback, when it is next used. The
+    objects of pinned proxies are never evicted; if they alone use more than maxBytes the budget is
+    exceeded.
+
+    .. warning:: Changes made to an object are lost when it is evicted; pin proxies whose objects are
+    changed.
+
+    There is a process-wide default budget (see getDefault), which is shared by all the proxies that are not
+    given one. The budget is safe to use from more than one thread.
+
+    Parameters
+    ----------
+    maxBytes : int
+        The maximum number of bytes of objects to hold.
+    estimateSize : callable, optional
+        Called with an object, returns the estimated number of bytes it uses. The default is
+        ObjectCache.estimateSize.
+    """
+
+    defaultMaxBytes = 2**30
+    """The maxBytes of the default budget when it is created (int)."""
+
+    _default = None
+    _defaultLock = threading.Lock()
+
+    def __init__(self, maxBytes, estimateSize=None):
+        self.maxBytes = maxBytes
+        self.estimateSize = estimateSize or ObjectCache.estimateSize
+        self.hits = 0
+        self.misses = 0
+        self.nBytes = 0
+        # _ProxyEntry -> None, in order of last use.
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "ProxyMemoryBudget(maxBytes=%s, nBytes=%s, hits=%s, misses=%s)" % (
+            self.maxBytes, self.nBytes, self.hits, self.misses)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @classmethod
+    def getDefault(cls):
+        """Get the process-wide default budget, creating it (with defaultMaxBytes) if needed.
+
+        Returns
+        -------
+        ProxyMemoryBudget
+            The default budget.
+        """
+        with cls._defaultLock:
+            if cls._default is None:
+                cls._default = cls(cls.defaultMaxBytes)
+            return cls._default
+
+    @classmethod
+    def setDefault(cls, budget):
+        """Set the process-wide default budget, which is used by the proxies made after this call that are
+        not given a budget.
+
+        Parameters
+        ----------
+        budget : ProxyMemoryBudget
+            The new default budget.
+        """
+        with cls._defaultLock:
+            cls._default = budget
+
+    def _load(self, entry, callback):
+        """Get the object of a proxy, reading it with its callback if it is not held."""
+        with self._lock:
+            obj = entry.obj
+            if obj is not _evicted:
+                self._entries.move_to_end(entry)
+                self.hits += 1
+                return obj
+            self.misses += 1
+        return self._store(entry, callback())
+
+    def _store(self, entry, obj):
+        """Hold the object of a proxy, evicting the objects of other proxies if needed."""
+        size = self.estimateSize(obj)
+        with self._lock:
+            if entry.obj is not _evicted:
+                self.nBytes -= entry.size
+            entry.obj = obj
+            entry.size = size
+            self._entries[entry] = None
+            self._entries.move_to_end(entry)
+            self.nBytes += size
+            if self.nBytes > self.maxBytes:
+                for victim in list(self._entries):
+                    if self.nBytes <= self.maxBytes:
+                        break
+                    if victim is not entry and victim.pins == 0:
+                        self._evict(victim)
+        return obj
+
+    def _evict(self, entry):
+        """Drop the object of a proxy. The caller must hold the lock."""
+        del self._entries[entry]
+        self.nBytes -= entry.size
+        entry.obj = _evicted
+        entry.size = 0
+
+    def _release(self, entry):
+        """Drop the object of a proxy that is being deleted."""
+        with self._lock:
+            if entry in self._entries:
+                self._evict(entry)
+
+    def pin(self, proxy):
+        """Pin a proxy, so that its object is not evicted until it is unpinned as many times as it was pinned.
+
+        The object is read if it is not held.
+
+        Parameters
+        ----------
+        proxy : EvictableReadProxy
+            The proxy.
+
+        Returns
+        -------
+        object
+            The object of the proxy.
+        """
+        entry = get_entry(proxy)
+        with self._lock:
+            entry.pins += 1
+        try:
+            return proxy.__subject__
+        except Exception:
+            self.unpin(proxy)
+            raise
+
+    def unpin(self, proxy):
+        """Undo one pin of a proxy.
+
+        Parameters
+        ----------
+        proxy : EvictableReadProxy
+            The proxy.
+        """
+        entry = get_entry(proxy)
+        with self._lock:
+            if entry.pins > 0:
+                entry.pins -= 1
+
+    @contextlib.contextmanager
+    def pinned(self, proxy):
+        """A context manager that pins a proxy while its block runs.
+
+        Parameters
+        ----------
+        proxy : EvictableReadProxy
+            The proxy.
+
+        Returns
+        -------
+        context manager
+            Gives the object of the proxy.
+        """
+        obj = self.pin(proxy)
+        try:
+            yield obj
+        finally:
+            self.unpin(proxy)
+
+    def holds(self, proxy):
+        """Check if the object of a proxy is held (that is, it has been read and not evicted).
+
+        Parameters
+        ----------
+        proxy : EvictableReadProxy
+            The proxy.
+
+        Returns
+        -------
+        bool
+            True if the object is held.
+        """
+        return get_entry(proxy).obj is not _evicted
+
+    def evict(self, proxy):
+        """Drop the object of a proxy now, unless it is pinned.
+
+        Parameters
+        ----------
+        proxy : EvictableReadProxy
+            The proxy.
+
+        Returns
+        -------
+        bool
+            True if the object was dropped.
+        """
+        entry = get_entry(proxy)
+        with self._lock:
+            if entry.pins > 0 or entry not in self._entries:
+                return False
+            self._evict(entry)
+            return True
+
+    def clear(self):
+        """Drop the objects of all the proxies that are not pinned.
+
+        The hit and miss counters are not reset.
+        """
+        with self._lock:
+            for entry in list(self._entries):
+                if entry.pins == 0:
+                    self._evict(entry)
+
+    def stats(self):
+        """Get the usage counters of the budget.
+
+        Returns
+        -------
+        CacheStats
+            The number of uses of proxies whose objects were held (hits) and were read (misses); size and
+            maxSize are in bytes.
+        """
+        return CacheStats(self.hits, self.misses, self.nBytes, self.maxBytes)
+
+
+class EvictableReadProxy(ReadProxy):
+    """A ReadProxy whose object may be dropped, under the limit of a ProxyMemoryBudget, and read again with
+    its callback when it is next used.
+
+    Parameters
+    ----------
+    func : callable
+        Called with no arguments to read the object; it may be called more than once.
+    budget : ProxyMemoryBudget, optional
+        The budget of the proxy. If None, the process-wide default budget is used.
+    """
+
+    __slots__ = ('__entry__', '__budget__')
+
+    def __init__(self, func, budget=None):
+        set_callback(self, func)
+        set_entry(self, _ProxyEntry())
+        set_budget(self, budget if budget is not None else ProxyMemoryBudget.getDefault())
+
+    def __del__(self):
+        try:
+            get_budget(self)._release(get_entry(self))
+        except AttributeError:
+            pass
+
+
+get_entry = EvictableReadProxy.__entry__.__get__
+set_entry = EvictableReadProxy.__entry__.__set__
+get_budget = EvictableReadProxy.__budget__.__get__
+set_budget = EvictableReadProxy.__budget__.__set__
+
+
+def _evictableSubject(self):
+    return get_budget(self)._load(get_entry(self), get_callback(self))
+
+
+def _setEvictableSubject(self, obj):
+    get_budget(self)._store(get_entry(self), obj)
+
+
+EvictableReadProxy.__subject__ = property(_evictableSubject, _setEvictableSubject)
+del _evictableSubject, _setEvictableSubject
+
+
+def is_loaded(proxy):
+    """Check if the object of a ReadProxy has been read (and, for an EvictableReadProxy, not evicted).
+
+    Parameters
+    ----------
+    proxy : ReadProxy
+        The proxy.
+
+    Returns
+    -------
+    bool
+        True if using the proxy will not call its callback.
+    """
+    if isinstance(proxy, CompositeReadProxy):
+        return is_loaded(get_composite(proxy))
+    if isinstance(proxy, EvictableReadProxy):
+        return get_budget(proxy).holds(proxy)
+    try:
+        get_cache(proxy)
+    except AttributeError:
+        return False
+    return True
+
+
+class CompositeReadProxy(ReadProxy):
+    """A ReadProxy of a composite dataset whose components are each read only when they are used.
+
+    Using the proxy assembles the composite, with the proxy that is given as its composite, except that
+    calling the getter of a component (before the composite has been assembled) returns the object of the
+    component's own proxy. The composite's assembler then reuses the components that have already been read.
+
+    Parameters
+    ----------
+    composite : ReadProxy
+        The proxy whose callback assembles the composite from the objects of the component proxies.
+    getters : dict of string to ReadProxy
+        The proxy of the component that is returned by each getter name.
+    """
+
+    __slots__ = ('__composite__', '__getters__')
+
+    def __init__(self, composite, getters):
+        set_callback(self, functools.partial(getattr, composite, '__subject__'))
+        set_composite(self, composite)
+        set_getters(self, getters)
+
+    def __getattr__(self, attr):
+        component = get_getters(self).get(attr)
+        if component is None or is_loaded(get_composite(self)):
+            return getattr(self.__subject__, attr)
+
+        def getter():
+            return component.__subject__
+        return getter
+
+
+get_composite = CompositeReadProxy.__composite__.__get__
+set_composite = CompositeReadProxy.__composite__.__set__
+get_getters = CompositeReadProxy.__getters__.__get__
+set_getters = CompositeReadProxy.__getters__.__set__
+
+CompositeReadProxy.__subject__ = property(lambda self: get_composite(self).__subject__)
@@ -37,6 +37,7 @@ from . import fsScanner, sequencify
 import os
 import astropy.io.fits
 import re
+import threading
 import yaml
 
 try:
@@ -67,6 +68,26 @@ class Registry:
     def __del__(self):
         pass
 
+    def lookupIter(self, lookupProperties, reference, dataId, **kwargs):
+        """Perform a lookup in the registry, returning the values as they are found instead of as a list.
+
+        Subclasses that can find the values incrementally override this; by default it iterates over the
+        result of lookup. The arguments are the same as those of lookup.
+
+        :return: an iterator over the values that match keys in lookupProperties.
+        """
+        return iter(self.lookup(lookupProperties, reference, dataId, **kwargs) or ())
+
+    def lookupCount(self, lookupProperties, reference, dataId, **kwargs):
+        """Count the values that a lookup in the registry would return.
+
+        Subclasses that can count the values without returning them override this. The arguments are the
+        same as those of lookup.
+
+        :return: the number of values that match keys in lookupProperties.
+        """
+        return sum(1 for _ in self.lookupIter(lookupProperties, reference, dataId, **kwargs))
+
     @staticmethod
     def create(location):
         """Create a registry object of an appropriate type.
@@ -213,19 +234,26 @@ class PosixRegistry(Registry):
         'storage': optional. Needed to look for metadata in files. Currently supported values: 'FitsStorage'.
         :return: a list of values that match keys in lookupProperties.
         """
+        return list(self.lookupIter(lookupProperties, reference, dataId, **kwargs))
+
+    def lookupIter(self, lookupProperties, reference, dataId, **kwargs):
+        """Perform a lookup in the registry, yielding each value as the file it was found in is scanned.
+
+        The arguments are the same as those of lookup.
+
+        :return: a generator of the values that match keys in lookupProperties.
+        """
         # required kwargs:
         if 'template' in kwargs:
             template = kwargs['template']
         else:
-            return []
+            return
         # optional kwargs:
         storage = kwargs['storage'] if 'storage' in kwargs else None
 
         lookupData = PosixRegistry.LookupData(lookupProperties, dataId)
         scanner = fsScanner.FsScanner(template)
-        allPaths = scanner.processPath(self.root)
-        retItems = []  # one item for each found file that matches
-        for path, foundProperties in allPaths.items():
+        for path, foundProperties in scanner.iterPath(self.root):
             # check for dataId keys that are not present in found properties
             # search for those keys in metadata of file at path
             # if present, check for matching values
@@ -234,9 +262,7 @@ class PosixRegistry(Registry):
             if 'incomplete' == lookupData.status():
                 PosixRegistry.lookupMetadata(os.path.join(self.root, path), template, lookupData, storage)
             if 'match' == lookupData.status():
-                ll = tuple(lookupData.foundItems[key] for key in lookupData.lookupProperties)
-                retItems.append(ll)
-        return retItems
+                yield tuple(lookupData.foundItems[key] for key in lookupData.lookupProperties)
 
     @staticmethod
     def lookupMetadata(filepath, template, lookupData, storage):
@@ -296,6 +322,10 @@ class SqlRegistry(Registry):
     * paramstyle = "format" --> placeHolder = "%s"
     Other `paramstyle` values are not currently supported.
 
+    The connection is shared by all the threads that use the registry (for
+    example when Butler queries the registries of several repositories
+    concurrently); its use is serialized with a lock.
+
     Constructor parameters
     ----------------------
     conn : DBAPI connection object
@@ -313,6 +343,7 @@ class SqlRegistry(Registry):
         """
         Registry.__init__(self)
         self.conn = conn
+        self._lock = threading.Lock()
 
     def __del__(self):
         if hasattr(self, "conn") and self.conn:
@@ -340,7 +371,54 @@ class SqlRegistry(Registry):
         """
         if not self.conn:
             return None
+        cmd, valueList = self._lookupCommand(lookupProperties, reference, dataId)
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute(cmd, valueList)
+            return [row for row in cursor.fetchall()]
+
+    def lookupIter(self, lookupProperties, reference, dataId, chunkSize=1000, **kwargs):
+        """Perform a lookup in the registry, fetching the rows from the database in chunks and yielding them
+        as they arrive.
+
+        The arguments are the same as those of lookup, plus:
+        :param chunkSize: the number of rows to fetch from the database at a time.
+        :return: a generator of the values that match keys in lookupProperties.
+        """
+        if not self.conn:
+            return
+        cmd, valueList = self._lookupCommand(lookupProperties, reference, dataId)
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute(cmd, valueList)
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(chunkSize)
+            if not rows:
+                break
+            yield from rows
+
+    def lookupCount(self, lookupProperties, reference, dataId, **kwargs):
+        """Count the values that a lookup in the registry would return, with a COUNT query.
+
+        The arguments are the same as those of lookup.
+
+        :return: the number of values that match keys in lookupProperties, or None if there is no
+        connection.
+        """
+        if not self.conn:
+            return None
+        cmd, valueList = self._lookupCommand(lookupProperties, reference, dataId)
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM (%s) AS lookup" % (cmd,), valueList)
+            return cursor.fetchone()[0]
 
+    def _lookupCommand(self, lookupProperties, reference, dataId):
+        """Build the SQL command of a lookup.
+
+        :return: the command and the list of values to substitute into it.
+        """
         # input variable sanitization:
         reference = sequencify(reference)
         lookupProperties = sequencify(lookupProperties)
@@ -361,9 +439,7 @@ class SqlRegistry(Registry):
                     whereList.append("%s = %s" % (k, self.placeHolder))
                     valueList.append(v)
             cmd += " WHERE " + " AND ".join(whereList)
-        cursor = self.conn.cursor()
-        cursor.execute(cmd, valueList)
-        return [row for row in cursor.fetchall()]
+        return cmd, valueList
 
     def executeQuery(self, returnFields, joinClause, whereFields, range, values):
         """Extract metadata from the registry.
@@ -394,9 +470,10 @@ class SqlRegistry(Registry):
             whereList.append("(%s BETWEEN %s AND %s)" % range)
         if len(whereList) > 0:
             cmd += " WHERE " + " AND ".join(whereList)
-        cursor = self.conn.cursor()
-        cursor.execute(cmd, values)
-        return [row for row in cursor.fetchall()]
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute(cmd, values)
+            return [row for row in cursor.fetchall()]
 
 
 class SqliteRegistry(SqlRegistry):
@@ -412,7 +489,8 @@ class SqliteRegistry(SqlRegistry):
             Path to SQLite3 file
         """
         if os.path.exists(location):
-            conn = sqlite3.connect(location)
+            # The connection may be used from other threads; SqlRegistry serializes its use.
+            conn = sqlite3.connect(location, check_same_thread=False)
             conn.text_factory = str
             self.root = location
         else:
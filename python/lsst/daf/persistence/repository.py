@@ -133,12 +133,18 @@ class Repository:
         repoData : RepoData
             Object that contains the parameters with which to init the Repository.
         """
+        self._root = repoData.cfg.root
         self._storage = Storage.makeFromURI(repoData.cfg.root)
         if repoData.cfg.dirty and not repoData.isV1Repository and repoData.cfgOrigin != 'nested':
             self._storage.putRepositoryCfg(repoData.cfg, repoData.cfgRoot)
         self._mapperArgs = repoData.cfg.mapperArgs  # keep for reference in matchesArgs
         self._initMapper(repoData)
 
+    @property
+    def root(self):
+        """The URI or path of the root of the repository."""
+        return self._root
+
     def _initMapper(self, repoData):
         '''Initialize and keep the mapper in a member var.
 
@@ -183,6 +189,31 @@ class Repository:
         else:
             return self._storage.write(butlerLocation, obj)
 
+    def copyWrite(self, butlerLocation, fromLocation, hardlink=False):
+        """Write a dataset to Storage by copying the files that were written for the object at another
+        location, if the Storage can.
+
+        :param butlerLocation: Contains the details needed to find the desired dataset.
+        :param fromLocation: A location the object was written to, with the same formatting.
+        :param hardlink: If True the Storage may hard link the files.
+        :return: True if the dataset was written, False if it must be written with write.
+        """
+        storage = butlerLocation.getStorage() or self._storage
+        return storage.copyWrite(butlerLocation, fromLocation, hardlink)
+
+    def prepareWrite(self, butlerLocations):
+        """Prepare Storage for writing a batch of datasets.
+
+        :param butlerLocations: The locations that are about to be written.
+        :return: None
+        """
+        storages = {}
+        for butlerLocation in butlerLocations:
+            storage = butlerLocation.getStorage() or self._storage
+            storages.setdefault(id(storage), (storage, []))[1].append(butlerLocation)
+        for storage, locations in storages.values():
+            storage.prepareWrite(locations)
+
     def read(self, butlerLocation):
         """Read a dataset from Storage.
 
@@ -195,6 +226,27 @@ class Repository:
         else:
             return self._storage.read(butlerLocation)
 
+    async def aread(self, butlerLocation, executor=None):
+        """Read a dataset from Storage without blocking the event loop.
+
+        :param butlerLocation: Contains the details needed to find the desired dataset.
+        :param executor: The executor to run a blocking read in, or None for the event loop's default.
+        :return: An instance of the dataset requested by butlerLocation.
+        """
+        storage = butlerLocation.getStorage() or self._storage
+        return await storage.aread(butlerLocation, executor)
+
+    async def awrite(self, butlerLocation, obj, executor=None):
+        """Write a dataset to Storage without blocking the event loop.
+
+        :param butlerLocation: Contains the details needed to find the desired dataset.
+        :param obj: The dataset to be written.
+        :param executor: The executor to run a blocking write in, or None for the event loop's default.
+        :return: None
+        """
+        storage = butlerLocation.getStorage() or self._storage
+        await storage.awrite(butlerLocation, obj, executor)
+
     #################
     # Mapper Access #
 
@@ -257,6 +309,33 @@ class Repository:
         ret = self._mapper.queryMetadata(*args, **kwargs)
         return ret
 
+    def queryMetadataIter(self, *args, **kwargs):
+        """Gets an iterator over the possible values for keys given a partial data id.
+
+        See mapper.queryMetadataIter for more information about args and kwargs.
+
+        :param args: arguments to be passed on to mapper.queryMetadataIter
+        :param kwargs: keyword arguments to be passed on to mapper.queryMetadataIter
+        :return: an iterator over the values, or None if there is no mapper.
+        """
+        if self._mapper is None:
+            return None
+        return self._mapper.queryMetadataIter(*args, **kwargs)
+
+    def queryMetadataCount(self, *args, **kwargs):
+        """Counts the possible values for keys given a partial data id.
+
+        See mapper.queryMetadataCount for more information about args and kwargs.
+
+        :param args: arguments to be passed on to mapper.queryMetadataCount
+        :param kwargs: keyword arguments to be passed on to mapper.queryMetadataCount
+        :return: the number of values (0 if there is no mapper), or None if the mapper can not count them
+                 without fetching them.
+        """
+        if self._mapper is None:
+            return 0
+        return self._mapper.queryMetadataCount(*args, **kwargs)
+
     def backup(self, *args, **kwargs):
         """Perform mapper.backup.
 
@@ -303,3 +382,62 @@ class Repository:
             return butlerLocationStorage.exists(location)
         else:
             return self._storage.exists(location)
+
+    def getSize(self, location):
+        """Get the number of bytes that reading a location will load from storage.
+
+        Parameters
+        ----------
+        location : ButlerLocation
+            Desrcibes a location in storage.
+
+        Returns
+        -------
+        int or None
+            The size in bytes, or None if it is not known.
+        """
+        storage = location.getStorage() or self._storage
+        return storage.getSize(location)
+
+    async def aexists(self, location, executor=None):
+        """Check if location exists in storage without blocking the event loop.
+
+        Parameters
+        ----------
+        location : ButlerLocation
+            Desrcibes a location in storage to look for.
+        executor : concurrent.futures.Executor, optional
+            The executor to run the check in. If None the event loop's default executor is used.
+
+        Returns
+        -------
+        bool
+            True if location exists, False if not.
+        """
+        storage = location.getStorage() or self._storage
+        return await storage.aexists(location, executor)
+
+    def existsMany(self, locations):
+        """Check if each of many locations exists in storage.
+
+        Parameters
+        ----------
+        locations : list of ButlerLocation
+            Describe the locations in storage to look for.
+
+        Returns
+        -------
+        list of bool
+            True for each location that exists, False for each that does not.
+        """
+        storages = {}
+        for i, location in enumerate(locations):
+            storage = location.getStorage() or self._storage
+            storages.setdefault(id(storage), (storage, [], []))
+            storages[id(storage)][1].append(i)
+            storages[id(storage)][2].append(location)
+        results = [False] * len(locations)
+        for storage, indices, storageLocations in storages.values():
+            for i, exists in zip(indices, storage.existsMany(storageLocations)):
+                results[i] = exists
+        return results
@@ -0,0 +1,202 @@
+#
+# LSST Data Management System
+# Copyright 2018 AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+
+"""This module provides the RepositoryCfgCache class, an on-disk cache of the repository graphs of Butlers."""
+
+import hashlib
+import os
+import pickle
+import stat as statModule
+import tempfile
+import urllib.parse
+
+from lsst.log import Log
+from .safeFileIo import safeMakeDir
+
+__all__ = ["RepositoryCfgCache"]
+
+
+class RepositoryCfgCache:
+    """An on-disk cache of the repository graphs that Butlers resolve from their inputs and outputs.
+
+    When a Butler is created it reads the repositoryCfg.yaml file of each of its repositories and of their
+    parents (taking a lock on each file and parsing its yaml), orders the parents, verifies the parents of
+    its outputs and sets the tags of the repositories. When many short processes start at once with the same
+    inputs and outputs, the cache lets each of them skip all of this: the resolved graph (the RepoData of
+    each repository, with its cfg, parents and tags) is kept in one entry, which is used only if each of the
+    repositoryCfg.yaml files that were read to make it has the same modification time, size and inode as
+    when it was read (or still does not exist). Graphs that include Butler v1 repositories or repositories
+    that are not in posix storage are not cached.
+
+    The cache is used by Butler when the environment variable named by `envVar` is set to the path of a
+    directory (which is created if needed) to keep the cache in.
+
+    The entries are pickles, so whoever can write an entry can run code in the processes that read it.
+    Entries that are not owned by the user of the process, or that can be written by other users, are
+    therefore ignored.
+
+    Parameters
+    ----------
+    directory : string
+        The path to the directory that holds the cache.
+    """
+
+    envVar = "DAF_PERSISTENCE_REPO_CFG_CACHE"
+    """The name of the environment variable that enables the cache and holds the path to its directory."""
+
+    fileName = "repositoryCfg.yaml"
+    """The name of the cfg file in a repository root."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.log = Log.getLogger("daf.persistence.butler")
+
+    def __repr__(self):
+        return "RepositoryCfgCache(directory=%r)" % self.directory
+
+    @classmethod
+    def fromEnvironment(cls):
+        """Get the cache that is enabled by the environment, if any.
+
+        Returns
+        -------
+        RepositoryCfgCache or None
+            The cache, or None if the environment variable is not set.
+        """
+        directory = os.environ.get(cls.envVar)
+        if not directory:
+            return None
+        return cls(directory)
+
+    def makeKey(self, inputs, outputs):
+        """Make the key of the graph of a Butler.
+
+        Parameters
+        ----------
+        inputs : list of RepositoryArgs
+            The processed inputs of the Butler.
+        outputs : list of RepositoryArgs
+            The processed outputs of the Butler.
+
+        Returns
+        -------
+        bytes or None
+            The key, or None if the arguments can not be pickled (e.g. because a mapper instance was passed).
+        """
+        try:
+            # relative roots are relative to the working directory.
+            return pickle.dumps((os.getcwd(), inputs, outputs), protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return None
+
+    def _entryPath(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key).hexdigest() + ".pickle")
+
+    @classmethod
+    def _cfgPath(cls, uri):
+        return os.path.abspath(os.path.join(urllib.parse.urlparse(uri).path, cls.fileName))
+
+    @classmethod
+    def stat(cls, uri):
+        """Get the stat key of the repositoryCfg.yaml file of a repository, to be passed to put after the file
+        is read.
+
+        Parameters
+        ----------
+        uri : string
+            The URI or path of the root of the repository.
+
+        Returns
+        -------
+        tuple of (string, tuple or None)
+            The path of the file, and its modification time, size and inode, or None if it does not exist.
+        """
+        path = cls._cfgPath(uri)
+        return path, cls._statKey(path)
+
+    @staticmethod
+    def _statKey(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def get(self, key):
+        """Get the cached graph of a Butler, if none of the repositoryCfg.yaml files it was made from have
+        changed since it was cached.
+
+        Parameters
+        ----------
+        key : bytes
+            The key made by makeKey.
+
+        Returns
+        -------
+        list of RepoData or None
+            A new copy of the cached RepoDatas, or None if there is no valid cached graph.
+        """
+        try:
+            with open(self._entryPath(key), 'rb') as f:
+                fileStat = os.fstat(f.fileno())
+                if (fileStat.st_uid != os.getuid() or
+                        fileStat.st_mode & (statModule.S_IWGRP | statModule.S_IWOTH)):
+                    self.log.warn("Ignoring repository graph cache entry %s that can be written by another "
+                                  "user", f.name)
+                    return None
+                entry = pickle.load(f)
+            if entry['key'] != key:
+                return None
+            for path, statKey in entry['cfgStats'].items():
+                if self._statKey(path) != statKey:
+                    return None
+            return entry['repoDatas']
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            self.log.debug("Ignoring unreadable repository graph cache entry: %s", e)
+            return None
+
+    def put(self, key, cfgStats, repoDatas):
+        """Cache the graph of a Butler.
+
+        Errors are logged and otherwise ignored; the cache is only an optimization.
+
+        Parameters
+        ----------
+        key : bytes
+            The key made by makeKey.
+        cfgStats : dict
+            The stat key (see `stat`) of each repositoryCfg.yaml file that was read to make the graph, by
+            path, taken before the file was read; if a file changed while it was being read the entry will not
+            be valid.
+        repoDatas : list of RepoData
+            The RepoDatas of the Butler.
+        """
+        try:
+            safeMakeDir(self.directory)
+            entry = {'key': key, 'cfgStats': cfgStats, 'repoDatas': repoDatas}
+            with tempfile.NamedTemporaryFile('wb', dir=self.directory, prefix='.tmp', delete=False) as temp:
+                pickle.dump(entry, temp, protocol=pickle.HIGHEST_PROTOCOL)
+            os.rename(temp.name, self._entryPath(key))
+        except Exception as e:
+            self.log.debug("Could not cache repository graph: %s", e)
@@ -28,6 +28,7 @@ import errno
 import fcntl
 import filecmp
 import os
+import shutil
 import tempfile
 from lsst.log import Log
 
@@ -144,6 +145,72 @@ def SafeFilename(name):
         setFileMode(name)
 
 
+# The Linux ioctl that makes a file share the data blocks of another (a reflink) on filesystems that support
+# it (e.g. btrfs, XFS).
+_FICLONE = 0x40049409
+
+
+def _reflink(src, dst):
+    with open(src, 'rb') as srcFile, open(dst, 'wb') as dstFile:
+        fcntl.ioctl(dstFile.fileno(), _FICLONE, srcFile.fileno())
+
+
+def _copyFileRange(src, dst):
+    with open(src, 'rb') as srcFile, open(dst, 'wb') as dstFile:
+        remaining = os.fstat(srcFile.fileno()).st_size
+        while remaining > 0:
+            copied = os.copy_file_range(srcFile.fileno(), dstFile.fileno(), remaining)
+            if copied == 0:
+                break
+            remaining -= copied
+
+
+def cloneFile(src, dst, hardlink=False):
+    """Make dst a copy of the file src, in the cheapest way the filesystem allows.
+
+    The file is cloned with a reflink if the filesystem supports it, else (if hardlink is True) hard linked,
+    else copied by the kernel with os.copy_file_range, else copied with shutil. dst is replaced if it exists;
+    it should be a temporary file that is renamed into place (e.g. by SafeFilename), so that readers never
+    see a partial file.
+
+    Parameters
+    ----------
+    src : string
+        The path of the file to copy.
+    dst : string
+        The path of the copy.
+    hardlink : bool, optional
+        If True, a hard link may be made. The two files then share their data and permissions, so this
+        should only be used when neither will be changed in place.
+
+    Returns
+    -------
+    string
+        How the file was copied: 'reflink', 'hardlink', 'copy_file_range' or 'copy'.
+    """
+    try:
+        _reflink(src, dst)
+        return 'reflink'
+    except OSError:
+        pass
+    if hardlink:
+        try:
+            if os.path.lexists(dst):
+                os.remove(dst)
+            os.link(src, dst)
+            return 'hardlink'
+        except OSError:
+            pass
+    if hasattr(os, 'copy_file_range'):
+        try:
+            _copyFileRange(src, dst)
+            return 'copy_file_range'
+        except OSError:
+            pass
+    shutil.copyfile(src, dst)
+    return 'copy'
+
+
 @contextmanager
 def SafeLockedFileForRead(name):
     """Context manager for reading a file that may be locked with an exclusive lock via
@@ -21,6 +21,7 @@
 # the GNU General Public License along with this program.  If not,
 # see <http://www.lsstcorp.org/LegalNotices/>.
 #
+import asyncio
 from abc import ABCMeta, abstractmethod
 
 
@@ -82,6 +83,36 @@ class StorageInterface:
             cls._writeFormattersDict = {}
             return cls._writeFormattersDict
 
+    @classmethod
+    def _asyncReadFormatters(cls):
+        """Getter for the container of async read formatters of a StorageInterface subclass.
+
+        Returns
+        -------
+        dict
+            The async read formatters container belonging to the class type.
+        """
+        try:
+            return cls._asyncReadFormattersDict
+        except AttributeError:
+            cls._asyncReadFormattersDict = {}
+            return cls._asyncReadFormattersDict
+
+    @classmethod
+    def _asyncWriteFormatters(cls):
+        """Getter for the container of async write formatters of a StorageInterface subclass.
+
+        Returns
+        -------
+        dict
+            The async write formatters container belonging to the class type.
+        """
+        try:
+            return cls._asyncWriteFormattersDict
+        except AttributeError:
+            cls._asyncWriteFormattersDict = {}
+            return cls._asyncWriteFormattersDict
+
     @classmethod
     def getReadFormatter(cls, objType):
         """Search in the registered formatters for the objType read formatter.
@@ -114,6 +145,40 @@ class StorageInterface:
         """
         return cls._writeFormatters().get(objType, None)
 
+    @classmethod
+    def getAsyncReadFormatter(cls, objType):
+        """Search in the registered async formatters for the objType read formatter.
+
+        Parameters
+        ----------
+        objType : class type
+            The type of class to find a formatter for.
+
+        Returns
+        -------
+        coroutine function
+            The formatter used to read the object from the storageInterface without blocking the event loop,
+            or None if no async read formatter is registered for objType.
+        """
+        return cls._asyncReadFormatters().get(objType, None)
+
+    @classmethod
+    def getAsyncWriteFormatter(cls, objType):
+        """Search in the registered async formatters for the objType write formatter.
+
+        Parameters
+        ----------
+        objType : class type
+            The type of class to find a formatter for.
+
+        Returns
+        -------
+        coroutine function
+            The formatter used to write the object to the storageInterface without blocking the event loop,
+            or None if no async write formatter is registered for objType.
+        """
+        return cls._asyncWriteFormatters().get(objType, None)
+
     @classmethod
     def registerFormatters(cls, formatable, readFormatter=None, writeFormatter=None):
         """Register read and/or write formatters for a storageInterface subclass
@@ -150,6 +215,46 @@ class StorageInterface:
             formatters = cls._writeFormatters()
             register(formatable, writeFormatter, formatters, cls)
 
+    @classmethod
+    def registerAsyncFormatters(cls, formatable, readFormatter=None, writeFormatter=None):
+        """Register async read and/or write formatters for a storageInterface subclass.
+
+        Async formatters are coroutine functions with the same arguments and results as the (blocking)
+        formatters registered with registerFormatters. They are used by aread and awrite; objects that do not
+        have an async formatter are read and written by the blocking formatters in an executor.
+
+        Parameters
+        ----------
+        cls : StorageInterface subclass
+            The type of StorageInterface the formatter is being registered for.
+        formatable : class object
+            The class object whose instances can be formatted by the formatter.
+        readFormatter : an async read formatter coroutine function
+            The formatter that can be used by the StorageInterface instance to read the object from the
+            storage.
+        writeFormatter : an async write formatter coroutine function
+            The formatter that can be used by the StorageInterface instance to write the object to the
+            storage.
+
+        Raises
+        ------
+        RuntimeError
+            For each object type and StorageInterface subclass the async read and write formatters should only
+            be registered once. If a second registration occurs for either a RuntimeError is raised.
+        """
+        def register(formatable, formatter, formatters, storageInterface):
+            if formatable in formatters:
+                raise RuntimeError(("Registration of second async formatter {} for formattable {} in " +
+                                    " storageInterface {}").format(formatter, formatable, storageInterface))
+            formatters[formatable] = formatter
+
+        if readFormatter:
+            formatters = cls._asyncReadFormatters()
+            register(formatable, readFormatter, formatters, cls)
+        if writeFormatter:
+            formatters = cls._asyncWriteFormatters()
+            register(formatable, writeFormatter, formatters, cls)
+
     @abstractmethod
     def write(self, butlerLocation, obj):
         """Writes an object to a location and persistence format specified by ButlerLocation
@@ -162,6 +267,41 @@ class StorageInterface:
             The object to be written.
         """
 
+    def prepareWrite(self, butlerLocations):
+        """Prepare the storage for a batch of writes, before the write formatters are called.
+
+        This lets a storage do once the work that every write would otherwise repeat, such as creating the
+        directories that will hold the files. The default implementation does nothing.
+
+        Parameters
+        ----------
+        butlerLocations : list of ButlerLocation
+            The locations that are about to be written.
+        """
+        pass
+
+    def copyWrite(self, butlerLocation, fromLocation, hardlink=False):
+        """Write a dataset by copying the files that were just written for the same object at another
+        location, instead of running the write formatter again.
+
+        The default implementation copies nothing and returns False.
+
+        Parameters
+        ----------
+        butlerLocation : ButlerLocation
+            The location & formatting for the object to be written.
+        fromLocation : ButlerLocation
+            A location the object was written to, with the same formatting.
+        hardlink : bool, optional
+            If True the storage may hard link the files, if they will not be changed in place.
+
+        Returns
+        -------
+        bool
+            True if the dataset was written, False if it must be written with the write formatter.
+        """
+        return False
+
     @abstractmethod
     def read(self, butlerLocation):
         """Read from a butlerLocation.
@@ -177,6 +317,72 @@ class StorageInterface:
         each location in butlerLocation.getLocations()
         """
 
+    async def aread(self, butlerLocation, executor=None):
+        """Read from a butlerLocation without blocking the event loop.
+
+        If an async read formatter is registered for the location's storage name or python type it is
+        awaited, otherwise read is run in executor.
+
+        Parameters
+        ----------
+        butlerLocation : ButlerLocation
+            The location & formatting for the object(s) to be read.
+        executor : concurrent.futures.Executor, optional
+            The executor to run a blocking read in. If None the event loop's default executor is used.
+
+        Returns
+        -------
+        A list of objects as described by the butler location. One item for
+        each location in butlerLocation.getLocations()
+        """
+        readFormatter = self.getAsyncReadFormatter(butlerLocation.getStorageName())
+        if not readFormatter:
+            readFormatter = self.getAsyncReadFormatter(butlerLocation.getPythonType())
+        if readFormatter:
+            return await readFormatter(butlerLocation)
+        return await asyncio.get_running_loop().run_in_executor(executor, self.read, butlerLocation)
+
+    async def awrite(self, butlerLocation, obj, executor=None):
+        """Write an object to a butlerLocation without blocking the event loop.
+
+        If an async write formatter is registered for the location's storage name or python type it is
+        awaited, otherwise write is run in executor.
+
+        Parameters
+        ----------
+        butlerLocation : ButlerLocation
+            The location & formatting for the object to be written.
+        obj : object instance
+            The object to be written.
+        executor : concurrent.futures.Executor, optional
+            The executor to run a blocking write in. If None the event loop's default executor is used.
+        """
+        writeFormatter = self.getAsyncWriteFormatter(butlerLocation.getStorageName())
+        if not writeFormatter:
+            writeFormatter = self.getAsyncWriteFormatter(butlerLocation.getPythonType())
+        if writeFormatter:
+            await writeFormatter(butlerLocation, obj)
+            return
+        await asyncio.get_running_loop().run_in_executor(executor, self.write, butlerLocation, obj)
+
+    async def aexists(self, location, executor=None):
+        """Check if location exists without blocking the event loop, by running exists in executor.
+
+        Parameters
+        ----------
+        location : ButlerLocation or string
+            A a string or a ButlerLocation that describes the location of an
+            object in this storage.
+        executor : concurrent.futures.Executor, optional
+            The executor to run exists in. If None the event loop's default executor is used.
+
+        Returns
+        -------
+        bool
+            True if exists, else False.
+        """
+        return await asyncio.get_running_loop().run_in_executor(executor, self.exists, location)
+
     @abstractmethod
     def getLocalFile(self, path):
         """Get a handle to a local copy of the file, downloading it to a
@@ -211,6 +417,44 @@ class StorageInterface:
             True if exists, else False.
         """
 
+    def getSize(self, butlerLocation):
+        """Get the number of bytes that reading a location will load from storage.
+
+        This is used to keep read-ahead within a memory budget. The default
+        implementation returns None, meaning the size is not known.
+
+        Parameters
+        ----------
+        butlerLocation : ButlerLocation
+            The location of the object(s).
+
+        Returns
+        -------
+        int or None
+            The total size of the files of the location in bytes, or None if
+            it is not known.
+        """
+        return None
+
+    def existsMany(self, locations):
+        """Check if each of many locations exists.
+
+        Subclasses may override this to answer the whole batch with fewer
+        requests to the storage than one per location; the default
+        implementation calls exists for each location.
+
+        Parameters
+        ----------
+        locations : list of ButlerLocation or string
+            The locations to look for.
+
+        Returns
+        -------
+        list of bool
+            True for each location that exists, else False.
+        """
+        return [self.exists(location) for location in locations]
+
     @abstractmethod
     def instanceSearch(self, path):
         """Search for the given path in this storage instance.
@@ -101,8 +101,24 @@ def setify(x):
     return x
 
 
+_importCache = {}
+
+
 def doImport(pythonType):
-    """Import a python object given an importable string"""
+    """Import a python object given an importable string
+
+    The objects that are imported are remembered, so importing the same string again is a dict lookup.
+    """
+    try:
+        return _importCache[pythonType]
+    except (KeyError, TypeError):
+        pass
+    importedType = _doImport(pythonType)
+    _importCache[pythonType] = importedType
+    return importedType
+
+
+def _doImport(pythonType):
     try:
         if not isinstance(pythonType, str):
             raise TypeError("Unhandled type of pythonType, val:%s" % pythonType)
@@ -119,6 +135,6 @@ def doImport(pythonType):
     # maybe python type is a member function, in the form: path.to.object.Class.funcname
     pythonTypeTokenList = pythonType.split('.')
     importClassString = '.'.join(pythonTypeTokenList[0:-1])
-    importedClass = doImport(importClassString)
+    importedClass = _doImport(importClassString)
     pythonType = getattr(importedClass, pythonTypeTokenList[-1])
     return pythonType
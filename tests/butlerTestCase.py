@@ -0,0 +1,90 @@
+#
+# LSST Data Management System
+# Copyright 2018 AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+
+"""Helpers shared by the tests of the Butler methods that read and write many datasets."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import lsst.daf.persistence as dp
+# can't use name TestObject, becuase it messes Pytest up. Alias it to tstObj
+from lsst.daf.persistence.test import TestObject as tstObj
+from lsst.daf.persistence.test import MapperForTestWriting
+
+# Define the root of the tests relative to this file
+ROOT = os.path.abspath(os.path.dirname(__file__))
+
+
+class SubsetMapperForTestWriting(MapperForTestWriting):
+    """A MapperForTestWriting that can make subsets of the 'foo' datasets that have been written."""
+
+    def getKeys(self, datasetType, level):
+        return {'bar': int}
+
+    def queryMetadata(self, datasetType, format, dataId):
+        return sorted(int(f[len('filename_bar'):-len('.txt')]) for f in os.listdir(self.root)
+                      if f.startswith('filename_bar') and f.endswith('.txt'))
+
+
+def assembleComposite(dataId, componentInfo, cls):
+    return {name: info.obj for name, info in componentInfo.items()}
+
+
+class CompositeMapperForTestWriting(SubsetMapperForTestWriting):
+    """A SubsetMapperForTestWriting with a composite dataset type whose components are 'foo' datasets."""
+
+    def map_composite(self, dataId, write):
+        composite = dp.ButlerComposite(assembler=assembleComposite, disassembler=None, python=dict,
+                                       dataId=dataId, mapper=self)
+        composite.add('single', 'foo', setter=None, getter=None, subset=False, inputOnly=True)
+        composite.add('all', 'foo', setter=None, getter=None, subset=True, inputOnly=True)
+        return composite
+
+
+class ButlerTestCase(unittest.TestCase):
+    """A test case that makes a temporary directory and, unless mapper is None, a Butler with a readable and
+    writable output repository in it, to which numObjs 'foo' datasets are put (as self.objs, with the data
+    ids {'bar': 0}, {'bar': 1}, ...).
+    """
+
+    mapper = MapperForTestWriting
+    """The mapper of the output repository, or None for no Butler."""
+
+    numObjs = 0
+    """The number of 'foo' datasets that are put."""
+
+    def setUp(self):
+        self.testDir = tempfile.mkdtemp(dir=ROOT, prefix=type(self).__name__ + "-")
+        self.butler = None
+        self.objs = [tstObj(i) for i in range(self.numObjs)]
+        if self.mapper is not None:
+            self.butler = dp.Butler(outputs=dp.RepositoryArgs(mode='rw', root=self.testDir,
+                                                              mapper=self.mapper))
+            for i, obj in enumerate(self.objs):
+                self.butler.put(obj, 'foo', {'bar': i})
+
+    def tearDown(self):
+        del self.butler
+        if os.path.exists(self.testDir):
+            shutil.rmtree(self.testDir)
@@ -22,6 +22,7 @@
 # see <http://www.lsstcorp.org/LegalNotices/>.
 #
 
+import concurrent.futures
 import unittest
 import lsst.daf.persistence as dp
 import lsst.daf.persistence.test as dpTest
@@ -107,6 +108,53 @@ class ButlerTest(unittest.TestCase):
         butler = dp.Butler(root=self.testDir, mapper=dpTest.EmptyTestMapper())
         self.assertIsInstance(butler, dp.Butler)
 
+    def testInputRepositoriesAreLazy(self):
+        """Test that the Repositories of inputs are not created until they are
+        used, and that outputs are created (and their cfgs written) at init."""
+        repoA = os.path.join(self.testDir, 'a')
+        repoB = os.path.join(self.testDir, 'b')
+        butler = dp.Butler(outputs={'root': repoA, 'mapper': dpTest.MapperForTestWriting})
+        butler.put(dpTest.TestObject('abc'), 'foo', {'bar': 1})
+        butler = dp.Butler(outputs={'root': repoB, 'mapper': dpTest.EmptyTestMapper})
+        self.assertTrue(os.path.exists(os.path.join(repoB, 'repositoryCfg.yaml')))
+
+        butler = dp.Butler(inputs=[repoA, repoB])
+        repoDataA, repoDataB = butler._repos.inputs()
+        self.assertIsNone(repoDataA._repo)
+        self.assertIsNone(repoDataB._repo)
+        self.assertEqual(butler.get('foo', {'bar': 1}), dpTest.TestObject('abc'))
+        self.assertIsNotNone(repoDataA._repo)
+        self.assertIsNone(repoDataB._repo)
+
+    def testOutputRepositoriesAreLazy(self):
+        """Test that an output Repository, and the parent it gets a registry
+        from, are not created until the output is used."""
+        repoA = os.path.join(self.testDir, 'a')
+        repoB = os.path.join(self.testDir, 'b')
+        butler = dp.Butler(outputs={'root': repoA, 'mapper': dpTest.MapperForTestWriting})
+        butler.put(dpTest.TestObject('abc'), 'foo', {'bar': 1})
+        butler = dp.Butler(inputs=repoA, outputs=repoB)
+        self.assertTrue(os.path.exists(os.path.join(repoB, 'repositoryCfg.yaml')))
+        repoDataB = butler._repos.outputs()[0]
+        repoDataA = butler._repos.inputs()[0]
+        self.assertIsNone(repoDataA._repo)
+        self.assertIsNone(repoDataB._repo)
+        butler.put(dpTest.TestObject('def'), 'foo', {'bar': 2})
+        self.assertIsNotNone(repoDataB._repo)
+        self.assertEqual(butler.get('foo', {'bar': 1}), dpTest.TestObject('abc'))
+
+    def testLazyRepositoryIsCreatedOnce(self):
+        """Test that threads that use a deferred Repository at once share the
+        one Repository that is created."""
+        repoA = os.path.join(self.testDir, 'a')
+        butler = dp.Butler(outputs={'root': repoA, 'mapper': dpTest.MapperForTestWriting})
+        butler.put(dpTest.TestObject('abc'), 'foo', {'bar': 1})
+        butler = dp.Butler(inputs=repoA)
+        repoData = butler._repos.inputs()[0]
+        with concurrent.futures.ThreadPoolExecutor(8) as executor:
+            repos = list(executor.map(lambda i: repoData.repo, range(32)))
+        self.assertTrue(all(repo is repos[0] for repo in repos))
+
 
 class MemoryTester(lsst.utils.tests.MemoryTestCase):
     pass
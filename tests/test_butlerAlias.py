@@ -123,6 +123,14 @@ class ButlerTestCase(unittest.TestCase):
         with self.assertRaises(RuntimeError):
             self.butler.getKeys('@bar')
 
+    def testAliasDefinedAfterUse(self):
+        self.assertEqual(self.butler._resolveDatasetTypeAlias(self.datasetType), 'raw')
+        with self.assertRaises(RuntimeError):
+            self.butler._resolveDatasetTypeAlias('@bar.wcs')
+        self.butler.defineAlias('@bar', 'raw')
+        self.assertEqual(self.butler._resolveDatasetTypeAlias('@bar.wcs'), 'raw.wcs')
+        self.assertEqual(self.butler._resolveDatasetTypeAlias(self.datasetType), 'raw')
+
     def testOverlappingAlias(self):
         self.butler = dafPersist.Butler(inputs=[], outputs=[])
 
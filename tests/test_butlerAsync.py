@@ -0,0 +1,136 @@
+#
+# LSST Data Management System
+# Copyright 2018 AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import lsst.daf.persistence as dp
+# can't use name TestObject, becuase it messes Pytest up. Alias it to tstObj
+from lsst.daf.persistence.test import TestObject as tstObj
+from lsst.daf.persistence.test import MapperForTestWriting
+import lsst.utils.tests
+
+# Define the root of the tests relative to this file
+ROOT = os.path.abspath(os.path.dirname(__file__))
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+class AsyncButlerTestCase(unittest.TestCase):
+    """Test the coroutine versions of get, put and datasetExists."""
+
+    def setUp(self):
+        self.testDir = tempfile.mkdtemp(dir=ROOT, prefix="AsyncButlerTestCase-")
+        self.butler = dp.Butler(outputs=dp.RepositoryArgs(mode='rw', root=self.testDir,
+                                                          mapper=MapperForTestWriting))
+        self.butler.setMaxWorkers(4)
+
+    def tearDown(self):
+        del self.butler
+        if os.path.exists(self.testDir):
+            shutil.rmtree(self.testDir)
+
+    def testPutAndGet(self):
+        objs = [tstObj(i) for i in range(10)]
+        run(asyncio.gather(*[self.butler.aput(obj, 'foo', bar=i) for i, obj in enumerate(objs)]))
+        self.assertTrue(run(self.butler.adatasetExists('foo', bar=3)))
+        self.assertFalse(run(self.butler.adatasetExists('foo', bar=30)))
+        results = run(asyncio.gather(*[self.butler.aget('foo', bar=i) for i in range(10)]))
+        self.assertEqual(results, objs)
+        with self.assertRaises(dp.NoResults):
+            run(self.butler.aget('foo', bar=30))
+
+    def testStorageIsNotCheckedOnTheLoop(self):
+        run(self.butler.aput(tstObj(1), 'foo', bar=1))
+        storage = self.butler._repos.inputs()[0].repo._storage
+        threads = []
+        exists = storage.exists
+
+        def recordingExists(location):
+            threads.append(threading.current_thread())
+            return exists(location)
+        storage.exists = recordingExists
+        self.assertEqual(run(self.butler.aget('foo', bar=1)), tstObj(1))
+        with self.assertRaises(dp.NoResults):
+            run(self.butler.aget('foo', bar=2))
+        # the existence of the datasets was checked in the executor, not in the event loop's thread.
+        self.assertEqual(len(threads), 2)
+        self.assertNotIn(threading.current_thread(), threads)
+
+
+class AsyncFormatterTestCase(unittest.TestCase):
+    """Test that registered async formatters are used by StorageInterface.aread and awrite."""
+
+    class Location:
+        def __init__(self, storageName):
+            self.storageName = storageName
+
+        def getStorageName(self):
+            return self.storageName
+
+        def getPythonType(self):
+            return None
+
+    def testAsyncFormatters(self):
+        written = []
+
+        class AsyncTestStorage(dp.StorageInterface):
+            def read(self, butlerLocation):
+                return ['blocking']
+
+            def write(self, butlerLocation, obj):
+                written.append(('blocking', obj))
+
+        async def readFormatter(butlerLocation):
+            return ['async']
+
+        async def writeFormatter(butlerLocation, obj):
+            written.append(('async', obj))
+
+        AsyncTestStorage.registerAsyncFormatters('AsyncStorage', readFormatter, writeFormatter)
+        with self.assertRaises(RuntimeError):
+            AsyncTestStorage.registerAsyncFormatters('AsyncStorage', readFormatter)
+        storage = AsyncTestStorage('', False)
+        self.assertEqual(run(storage.aread(self.Location('AsyncStorage'))), ['async'])
+        self.assertEqual(run(storage.aread(self.Location('OtherStorage'))), ['blocking'])
+        run(storage.awrite(self.Location('AsyncStorage'), 1))
+        run(storage.awrite(self.Location('OtherStorage'), 2))
+        self.assertEqual(written, [('async', 1), ('blocking', 2)])
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+if __name__ == '__main__':
+    lsst.utils.tests.init()
+    unittest.main()
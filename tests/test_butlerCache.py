@@ -0,0 +1,441 @@
+#
+# LSST Data Management System
+# Copyright 2018 AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import lsst.daf.persistence as dp
+# can't use name TestObject, becuase it messes Pytest up. Alias it to tstObj
+from lsst.daf.persistence.test import TestObject as tstObj
+from lsst.daf.persistence.test import MapperForTestWriting
+import lsst.utils.tests
+
+# Define the root of the tests relative to this file
+ROOT = os.path.abspath(os.path.dirname(__file__))
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+class BypassMapperForTestWriting(MapperForTestWriting):
+    """A MapperForTestWriting whose 'foo' bypass function fails the first time it is called."""
+
+    def __init__(self, *args, **kwargs):
+        MapperForTestWriting.__init__(self, *args, **kwargs)
+        self.bypassFailures = 1
+
+    def bypass_foo(self, datasetType, pythonType, location, dataId):
+        if self.bypassFailures > 0:
+            self.bypassFailures -= 1
+            raise IOError("bypass failed")
+        return 'bypassed'
+
+
+class LocationCacheTestCase(unittest.TestCase):
+    """Test the LocationCache class."""
+
+    def testGetAndPut(self):
+        cache = dp.LocationCache(maxSize=2)
+        key = cache.makeKey('foo', dp.DataId({'bar': 1}), False)
+        self.assertIsNone(cache.get(key))
+        cache.put(key, 'location')
+        self.assertEqual(cache.get(key), 'location')
+        self.assertEqual(cache.stats(), dp.CacheStats(hits=1, misses=1, size=1, maxSize=2))
+        self.assertEqual(cache.stats().hitRate, 0.5)
+
+    def testKeys(self):
+        cache = dp.LocationCache(maxSize=2)
+        self.assertEqual(cache.makeKey('foo', dp.DataId({'a': 1, 'b': 2}), False),
+                         cache.makeKey('foo', dp.DataId({'b': 2, 'a': 1}), False))
+        self.assertNotEqual(cache.makeKey('foo', dp.DataId({'a': 1}), False),
+                            cache.makeKey('foo', dp.DataId({'a': 1}), True))
+        self.assertNotEqual(cache.makeKey('foo', dp.DataId({'a': 1}), False),
+                            cache.makeKey('foo', dp.DataId({'a': 1}, tag='t'), False))
+        # a dataId with an unhashable value can not be cached.
+        self.assertIsNone(cache.makeKey('foo', dp.DataId({'a': [1, 2]}), False))
+
+    def testEviction(self):
+        cache = dp.LocationCache(maxSize=2)
+        keys = [cache.makeKey('foo', dp.DataId({'bar': i}), False) for i in range(3)]
+        cache.put(keys[0], 0)
+        cache.put(keys[1], 1)
+        cache.get(keys[0])
+        cache.put(keys[2], 2)
+        # keys[1] was the least recently used.
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertEqual(cache.get(keys[0]), 0)
+        self.assertEqual(cache.get(keys[2]), 2)
+
+    def testInvalidate(self):
+        cache = dp.LocationCache(maxSize=10)
+        readKey = cache.makeKey('foo', dp.DataId({'bar': 1}), False)
+        componentKey = cache.makeKey('foo.a', dp.DataId({'bar': 1}), False)
+        writeKey = cache.makeKey('foo', dp.DataId({'bar': 1}), True)
+        otherKey = cache.makeKey('foobar', dp.DataId({'bar': 1}), False)
+        for key in (readKey, componentKey, writeKey, otherKey):
+            cache.put(key, key)
+        cache.invalidate('foo')
+        self.assertIsNone(cache.get(readKey))
+        self.assertIsNone(cache.get(componentKey))
+        self.assertEqual(cache.get(writeKey), writeKey)
+        self.assertEqual(cache.get(otherKey), otherKey)
+
+
+class MetadataCacheTestCase(unittest.TestCase):
+    """Test the MetadataCache class."""
+
+    def testInvalidate(self):
+        cache = dp.MetadataCache(maxSize=10)
+        keysKey = cache.makeKey('foo', 'getKeys', None)
+        queryKey = cache.makeKey('foo', 'queryMetadata', ('bar',), (('bar', 1),))
+        collectionKey = cache.makeKey(None, 'getKeys', None)
+        otherKey = cache.makeKey('baz', 'getKeys', None)
+        self.assertIsNone(cache.makeKey('foo', 'queryMetadata', ['bar']))
+        for key in (keysKey, queryKey, collectionKey, otherKey):
+            cache.put(key, 1)
+        cache.invalidate('foo')
+        self.assertIsNone(cache.get(keysKey))
+        self.assertIsNone(cache.get(queryKey))
+        self.assertIsNone(cache.get(collectionKey))
+        self.assertEqual(cache.get(otherKey), 1)
+
+
+class ObjectCacheTestCase(unittest.TestCase):
+    """Test the ObjectCache class."""
+
+    def testLru(self):
+        cache = dp.ObjectCache(maxBytes=10)
+        cache.put(('foo', 1), 'a', size=4)
+        cache.put(('foo', 2), 'b', size=4)
+        self.assertEqual(cache.get(('foo', 1)), 'a')
+        cache.put(('foo', 3), 'c', size=4)
+        self.assertIsNone(cache.get(('foo', 2)))
+        self.assertEqual(cache.get(('foo', 1)), 'a')
+        self.assertEqual(cache.get(('foo', 3)), 'c')
+        self.assertEqual(cache.stats(), dp.CacheStats(hits=3, misses=1, size=8, maxSize=10))
+
+    def testLfu(self):
+        cache = dp.ObjectCache(maxBytes=10, eviction='lfu')
+        cache.put(('foo', 1), 'a', size=4)
+        cache.put(('foo', 2), 'b', size=4)
+        cache.get(('foo', 1))
+        cache.get(('foo', 1))
+        cache.get(('foo', 2))
+        # ('foo', 2) is the most recently used but the least frequently used.
+        cache.put(('foo', 3), 'c', size=4)
+        self.assertIsNone(cache.get(('foo', 2)))
+        self.assertEqual(cache.get(('foo', 1)), 'a')
+
+    def testTooLarge(self):
+        cache = dp.ObjectCache(maxBytes=10)
+        cache.put(('foo', 1), 'a', size=11)
+        self.assertEqual(len(cache), 0)
+
+    def testBadEviction(self):
+        with self.assertRaises(RuntimeError):
+            dp.ObjectCache(maxBytes=10, eviction='random')
+
+    def testSizeEstimator(self):
+        class Sized:
+            pass
+
+        class SubSized(Sized):
+            pass
+
+        dp.ObjectCache.registerSizeEstimator(Sized, lambda obj: 42)
+        self.assertEqual(dp.ObjectCache.estimateSize(SubSized()), 42)
+
+    def testUnsized(self):
+        class Unsized:
+            pass
+
+        self.assertIsNone(dp.ObjectCache.estimateSize(Unsized(), strict=True))
+        self.assertIsNotNone(dp.ObjectCache.estimateSize('abc', strict=True))
+        # objects whose size can not be estimated are not cached.
+        cache = dp.ObjectCache(maxBytes=10000, datasetTypes=['foo'])
+        cache.put(('foo', 1), Unsized())
+        self.assertEqual(len(cache), 0)
+
+    def testAfwLikeObjects(self):
+        import numpy as np
+
+        class Plane:
+            def __init__(self, dtype):
+                self.array = np.zeros((4, 5), dtype=dtype)
+
+            def getArray(self):
+                return self.array
+
+        class MaskedImage:
+            def getImage(self):
+                return Plane(np.float32)
+
+            def getMask(self):
+                return Plane(np.int32)
+
+            def getVariance(self):
+                return Plane(np.float32)
+
+        class Exposure:
+            def getMaskedImage(self):
+                return MaskedImage()
+
+        class Schema:
+            def getRecordSize(self):
+                return 24
+
+        class Catalog:
+            def getSchema(self):
+                return Schema()
+
+            def __len__(self):
+                return 3
+
+        self.assertEqual(dp.ObjectCache.estimateSize(Exposure(), strict=True), 3*4*5*4)
+        self.assertEqual(dp.ObjectCache.estimateSize(Catalog(), strict=True), 72)
+
+    def testNoDatasetTypes(self):
+        cache = dp.ObjectCache(maxBytes=100)
+        self.assertFalse(cache.caches('foo'))
+
+    def testInvalidate(self):
+        cache = dp.ObjectCache(maxBytes=100, datasetTypes=['foo', 'foo.a'])
+        self.assertTrue(cache.caches('foo'))
+        self.assertFalse(cache.caches('bar'))
+        cache.put(('foo', 1), 'a', size=1)
+        cache.put(('foo.a', 1), 'b', size=1)
+        cache.put(('bar', 1), 'c', size=1)
+        cache.invalidate('foo')
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.stats().size, 1)
+
+
+class ButlerLocationCacheTestCase(unittest.TestCase):
+    """Test the location cache in a Butler with an input and a readable output repository."""
+
+    def setUp(self):
+        self.testDir = tempfile.mkdtemp(dir=ROOT, prefix="ButlerLocationCacheTestCase-")
+        butler = dp.Butler(outputs=dp.RepositoryArgs(mode='w',
+                                                     root=os.path.join(self.testDir, 'repoA'),
+                                                     mapper=MapperForTestWriting))
+        self.objA = tstObj('abc')
+        butler.put(self.objA, 'foo', {'bar': 1})
+        del butler
+
+    def tearDown(self):
+        if os.path.exists(self.testDir):
+            shutil.rmtree(self.testDir)
+
+    def testCacheDisabledByDefault(self):
+        butler = dp.Butler(inputs=os.path.join(self.testDir, 'repoA'))
+        self.assertEqual(butler.get('foo', {'bar': 1}), self.objA)
+        self.assertEqual(butler.getCacheStats(), {})
+
+    def testGetAndPut(self):
+        butler = dp.Butler(inputs=os.path.join(self.testDir, 'repoA'),
+                           outputs=dp.RepositoryArgs(mode='rw',
+                                                     root=os.path.join(self.testDir, 'repoB'),
+                                                     mapper=MapperForTestWriting))
+        butler.enableLocationCache(maxSize=10)
+        self.assertEqual(butler.get('foo', {'bar': 1}), self.objA)
+        self.assertTrue(butler.datasetExists('foo', {'bar': 1}))
+        self.assertEqual(butler.getUri('foo', {'bar': 1}),
+                         os.path.join(self.testDir, 'repoA', 'filename_bar1.txt'))
+        stats = butler.getCacheStats()['location']
+        self.assertEqual(stats.hits, 2)
+        self.assertEqual(stats.misses, 1)
+
+        # a put to the readable output must mask the cached location in the input.
+        objB = tstObj('def')
+        butler.put(objB, 'foo', {'bar': 1})
+        self.assertEqual(butler.get('foo', {'bar': 1}), objB)
+        self.assertEqual(butler.getUri('foo', {'bar': 1}),
+                         os.path.join(self.testDir, 'repoB', 'filename_bar1.txt'))
+
+    def testFailedBypass(self):
+        butler = dp.Butler(outputs=dp.RepositoryArgs(mode='rw', root=os.path.join(self.testDir, 'repoB'),
+                                                     mapper=BypassMapperForTestWriting))
+        butler.put(self.objA, 'foo', {'bar': 1})
+        butler.enableLocationCache(maxSize=10)
+        # the bypass function fails, so the object is read from its file; the location is not cached.
+        self.assertEqual(butler.get('foo', {'bar': 1}), self.objA)
+        self.assertEqual(butler.getCacheStats()['location'].size, 0)
+        self.assertEqual(butler.get('foo', {'bar': 1}), 'bypassed')
+
+
+class ButlerNegativeLookupCacheTestCase(unittest.TestCase):
+    """Test the negative lookup caches of the repositories in a Butler."""
+
+    def setUp(self):
+        self.testDir = tempfile.mkdtemp(dir=ROOT, prefix="ButlerNegativeLookupCacheTestCase-")
+        butler = dp.Butler(outputs=dp.RepositoryArgs(mode='w',
+                                                     root=os.path.join(self.testDir, 'repoA'),
+                                                     mapper=MapperForTestWriting))
+        self.objA = tstObj('abc')
+        butler.put(self.objA, 'foo', {'bar': 1})
+        del butler
+
+    def tearDown(self):
+        if os.path.exists(self.testDir):
+            shutil.rmtree(self.testDir)
+
+    def testGetAndPut(self):
+        butler = dp.Butler(inputs=os.path.join(self.testDir, 'repoA'),
+                           outputs=dp.RepositoryArgs(mode='rw',
+                                                     root=os.path.join(self.testDir, 'repoB'),
+                                                     mapper=MapperForTestWriting))
+        butler.enableNegativeLookupCache(maxSize=10)
+        self.assertEqual(butler.get('foo', {'bar': 1}), self.objA)
+        self.assertEqual(butler.get('foo', {'bar': 1}), self.objA)
+        stats = butler.getCacheStats()['negativeLookup']
+        # the first get misses in both repositories, the second is answered for repoB.
+        self.assertEqual(stats.hits, 1)
+        self.assertEqual(stats.size, 1)
+        with self.assertRaises(dp.NoResults):
+            butler.get('foo', {'bar': 2})
+        self.assertFalse(butler.datasetExists('foo', {'bar': 2}))
+        self.assertEqual(butler.getCacheStats()['negativeLookup'].size, 3)
+
+        # a put to repoB drops its entries, so the new object is found.
+        objB = tstObj('def')
+        butler.put(objB, 'foo', {'bar': 1})
+        self.assertEqual(butler.get('foo', {'bar': 1}), objB)
+
+
+class QueryCountingMapper(MapperForTestWriting):
+    """A MapperForTestWriting that counts its getKeys and queryMetadata calls."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.queries = 0
+
+    def getKeys(self, datasetType, level):
+        self.queries += 1
+        return {'bar': int}
+
+    def queryMetadata(self, datasetType, format, dataId):
+        self.queries += 1
+        return sorted(int(f[len('filename_bar'):-len('.txt')]) for f in os.listdir(self.root)
+                      if f.startswith('filename_bar') and f.endswith('.txt'))
+
+
+class ButlerMetadataCacheTestCase(unittest.TestCase):
+    """Test the metadata caches of the repositories in a Butler."""
+
+    def setUp(self):
+        self.testDir = tempfile.mkdtemp(dir=ROOT, prefix="ButlerMetadataCacheTestCase-")
+        self.butler = dp.Butler(outputs=dp.RepositoryArgs(mode='rw', root=self.testDir,
+                                                          mapper=QueryCountingMapper))
+        self.butler.put(tstObj('abc'), 'foo', {'bar': 1})
+        self.mapper = self.butler._repos.outputs()[0].repo._mapper
+
+    def tearDown(self):
+        del self.butler
+        if os.path.exists(self.testDir):
+            shutil.rmtree(self.testDir)
+
+    def testGetAndPut(self):
+        butler = self.butler
+        butler.enableMetadataCache(maxSize=10)
+        self.assertEqual(butler.queryMetadata('foo', 'bar'), [1])
+        self.assertEqual(butler.queryMetadata('foo', 'bar'), [1])
+        self.assertEqual(butler.getKeys('foo'), {'bar': int})
+        self.assertEqual(len(butler.subset('foo')), 1)
+        self.assertEqual(self.mapper.queries, 2)
+        self.assertEqual(butler.getCacheStats()['metadata'].hits, 3)
+
+        # a put to the output repository drops its entries.
+        butler.put(tstObj('def'), 'foo', {'bar': 2})
+        self.assertEqual(butler.queryMetadata('foo', 'bar'), [1, 2])
+        self.assertEqual(self.mapper.queries, 3)
+
+        # results are invalidated explicitly for changes made by others.
+        butler.queryMetadata('foo', 'bar')
+        butler.invalidateMetadataCache()
+        butler.queryMetadata('foo', 'bar')
+        self.assertEqual(self.mapper.queries, 4)
+
+    def testCachedResultsAreCopies(self):
+        self.butler.enableMetadataCache(maxSize=10)
+        self.butler.getKeys('foo')['baz'] = str
+        self.assertEqual(self.butler.getKeys('foo'), {'bar': int})
+
+
+class ButlerObjectCacheTestCase(unittest.TestCase):
+    """Test the object cache in a Butler."""
+
+    def setUp(self):
+        self.testDir = tempfile.mkdtemp(dir=ROOT, prefix="ButlerObjectCacheTestCase-")
+
+    def tearDown(self):
+        if os.path.exists(self.testDir):
+            shutil.rmtree(self.testDir)
+
+    def testGetAndPut(self):
+        butler = dp.Butler(outputs=dp.RepositoryArgs(mode='rw', root=self.testDir,
+                                                     mapper=MapperForTestWriting))
+        dp.ObjectCache.registerSizeEstimator(tstObj, lambda obj: 100)
+        butler.enableObjectCache({'maxBytes': 10000, 'eviction': 'LRU', 'datasetTypes': ['foo']})
+        obj = tstObj('abc')
+        butler.put(obj, 'foo', {'bar': 1})
+        first = butler.get('foo', {'bar': 1})
+        second = butler.get('foo', {'bar': 1})
+        self.assertEqual(first, obj)
+        self.assertIs(first, second)
+        stats = butler.getCacheStats()['object']
+        self.assertEqual((stats.hits, stats.misses), (1, 1))
+
+        # a put drops the cached object.
+        butler.put(tstObj('def'), 'foo', {'bar': 1})
+        self.assertEqual(butler.get('foo', {'bar': 1}), tstObj('def'))
+
+        butler.enableObjectCache(None)
+        self.assertNotIn('object', butler.getCacheStats())
+
+    def testReadOptionsInKey(self):
+        storage = dp.PosixStorage(self.testDir, create=True)
+
+        def makeLocation(**additionalData):
+            location = dp.ButlerLocation(pythonType=tstObj, cppType=None, storageName='PickleStorage',
+                                         locationList='a.pickle', dataId={'bar': 1}, mapper=None,
+                                         storage=storage, datasetType='foo')
+            for key, value in additionalData.items():
+                location.additionalData.set(key, value)
+            return location
+
+        # a read of part of a file is not cached as the read of the whole file.
+        self.assertEqual(dp.Butler._makeObjectCacheKey(makeLocation()),
+                         dp.Butler._makeObjectCacheKey(makeLocation()))
+        self.assertNotEqual(dp.Butler._makeObjectCacheKey(makeLocation()),
+                            dp.Butler._makeObjectCacheKey(makeLocation(llcX=10)))
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+if __name__ == '__main__':
+    lsst.utils.tests.init()
+    unittest.main()
@@ -0,0 +1,93 @@
+#
+# LSST Data Management System
+# Copyright 2018 AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+
+import unittest
+
+import lsst.daf.persistence as dp
+import lsst.utils.tests
+import butlerTestCase
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+class CompositeReadTestCase(butlerTestCase.ButlerTestCase):
+    """Test reading the components of composites concurrently and lazily."""
+
+    mapper = butlerTestCase.CompositeMapperForTestWriting
+    numObjs = 5
+
+    def testParallelComposites(self):
+        serial = self.butler.get('composite', {'bar': 1})
+        self.assertEqual(serial['single'], self.objs[1])
+        self.butler.enableParallelComposites(maxWorkers=4)
+        parallel = self.butler.get('composite', {'bar': 1})
+        self.assertEqual(parallel, serial)
+
+    def testLazyComposites(self):
+        self.butler.enableLazyComposites()
+        self.butler.enableStats()
+        composite = self.butler.get('composite', {'bar': 1})
+        self.assertIsInstance(composite, dp.ReadProxy)
+        self.assertEqual(self.butler.getStats().get('read').count, 0)
+        # the assembler was given the objects of the components, not proxies.
+        self.assertNotIsInstance(composite['single'], dp.ReadProxy)
+        self.assertEqual(composite['single'], self.objs[1])
+        self.assertEqual(list(composite['all']), self.objs[1:2])
+        self.assertEqual(self.butler.getStats().get('read').count, 2)
+        # the object is read when it is first used, and only then.
+        composite['single']
+        self.assertEqual(self.butler.getStats().get('read').count, 2)
+
+    def testLazyComponents(self):
+        self.butler.enableLazyComposites()
+        self.butler.enableStats()
+        composite = self.butler.get('composite', {'bar': 1})
+        self.assertIsInstance(composite, dp.CompositeReadProxy)
+        # calling the getter of a component reads that component only.
+        self.assertEqual(composite.get_single(), self.objs[1])
+        self.assertEqual(composite.getSingle(), self.objs[1])
+        self.assertEqual(self.butler.getStats().get('read').count, 1)
+        # assembling the composite reads the other components, and not the one that was read.
+        self.assertEqual(composite['single'], self.objs[1])
+        self.assertEqual(list(composite['all']), self.objs[1:2])
+        self.assertEqual(self.butler.getStats().get('read').count, 2)
+
+    def testLazyComponentsInParallel(self):
+        self.butler.enableLazyComposites()
+        self.butler.enableParallelComposites(maxWorkers=4)
+        self.butler.enableStats()
+        composite = self.butler.get('composite', {'bar': 1})
+        self.assertEqual(composite.get_all(), self.objs[1:2])
+        self.assertEqual(self.butler.getStats().get('read').count, 1)
+        self.assertEqual(composite['single'], self.objs[1])
+        self.assertEqual(self.butler.getStats().get('read').count, 2)
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+if __name__ == '__main__':
+    lsst.utils.tests.init()
+    unittest.main()
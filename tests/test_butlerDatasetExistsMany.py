@@ -0,0 +1,74 @@
+#
+# LSST Data Management System
+# Copyright 2018 AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+
+import os
+import unittest
+
+import lsst.daf.persistence as dp
+# can't use name TestObject, becuase it messes Pytest up. Alias it to tstObj
+from lsst.daf.persistence.test import TestObject as tstObj
+from lsst.daf.persistence.test import MapperForTestWriting
+import lsst.utils.tests
+import butlerTestCase
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+class DatasetExistsManyTestCase(butlerTestCase.ButlerTestCase):
+    """Test checking the existence of many datasets at once with Butler.datasetExistsMany."""
+
+    mapper = None
+
+    def testDatasetExistsMany(self):
+        repoA = os.path.join(self.testDir, 'repoA')
+        repoB = os.path.join(self.testDir, 'repoB')
+        butler = dp.Butler(outputs=dp.RepositoryArgs(mode='w', root=repoA, mapper=MapperForTestWriting))
+        for i in (0, 2):
+            butler.put(tstObj(i), 'foo', {'bar': i})
+        del butler
+        butler = dp.Butler(inputs=repoA,
+                           outputs=dp.RepositoryArgs(mode='rw', root=repoB, mapper=MapperForTestWriting))
+        butler.put(tstObj(3), 'foo', {'bar': 3})
+        dataIds = [{'bar': i} for i in range(5)]
+        exists = butler.datasetExistsMany('foo', dataIds)
+        self.assertEqual(exists.dtype, bool)
+        self.assertEqual(list(exists), [True, False, True, True, False])
+        self.assertEqual(list(exists), [butler.datasetExists('foo', dataId) for dataId in dataIds])
+
+    def testPosixStorageExistsMany(self):
+        storage = dp.PosixStorage(self.testDir, create=False)
+        for name in ('a.fits', 'b.fits'):
+            with open(os.path.join(self.testDir, name), 'w') as f:
+                f.write('x')
+        self.assertEqual(storage.existsMany(['a.fits', 'c.fits', 'b.fits[1]', 'x/a.fits', '*.fits']),
+                         [True, False, True, False, True])
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+if __name__ == '__main__':
+    lsst.utils.tests.init()
+    unittest.main()
@@ -0,0 +1,91 @@
+#
+# LSST Data Management System
+# Copyright 2018 AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+
+import os
+import unittest
+
+import lsst.daf.persistence as dp
+# can't use name TestObject, becuase it messes Pytest up. Alias it to tstObj
+from lsst.daf.persistence.test import TestObject as tstObj
+from lsst.daf.persistence.test import MapperForTestWriting
+import lsst.utils.tests
+import butlerTestCase
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+class FanOutWritesTestCase(butlerTestCase.ButlerTestCase):
+    """Test serializing a dataset once for all the output repositories with Butler.enableFanOutWrites."""
+
+    mapper = None
+
+    def setUp(self):
+        super().setUp()
+        self.roots = [os.path.join(self.testDir, name) for name in ('repoA', 'repoB', 'repoC')]
+        self.butler = dp.Butler(outputs=[dp.RepositoryArgs(mode='w', root=root, mapper=MapperForTestWriting)
+                                         for root in self.roots])
+
+    def checkOutputs(self, bar, obj):
+        paths = [os.path.join(root, 'filename_bar%d.txt' % bar) for root in self.roots]
+        with open(paths[0], 'rb') as f:
+            data = f.read()
+        for root, path in zip(self.roots, paths):
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), data)
+            self.assertEqual(dp.Butler(inputs=root).get('foo', bar=bar), obj)
+
+    def testFanOutWrites(self):
+        self.butler.enableFanOutWrites()
+        self.butler.enableStats()
+        self.butler.put(tstObj('abc'), 'foo', bar=1)
+        self.checkOutputs(1, tstObj('abc'))
+        stats = self.butler.getStats()
+        self.assertEqual(stats.get('write').count, 1)
+        self.assertEqual(stats.get('copyWrite').count, 2)
+        # a dataset that is put again replaces the copies.
+        self.butler.put(tstObj('def'), 'foo', bar=1)
+        self.checkOutputs(1, tstObj('def'))
+
+    def testHardlink(self):
+        self.butler.enableFanOutWrites(hardlink=True)
+        self.butler.put(tstObj('abc'), 'foo', bar=1)
+        self.checkOutputs(1, tstObj('abc'))
+
+    def testWriteBehind(self):
+        self.butler.enableFanOutWrites()
+        with self.butler as butler:
+            butler.enableWriteBehind(maxWorkers=2)
+            for i in range(5):
+                butler.put(tstObj(i), 'foo', bar=i)
+        for i in range(5):
+            self.checkOutputs(i, tstObj(i))
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+if __name__ == '__main__':
+    lsst.utils.tests.init()
+    unittest.main()
@@ -0,0 +1,83 @@
+#
+# LSST Data Management System
+# Copyright 2018 AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+
+import unittest
+
+import lsst.daf.persistence as dp
+import lsst.utils.tests
+import butlerTestCase
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+class GetManyTestCase(butlerTestCase.ButlerTestCase):
+    """Test reading many datasets at once with Butler.getMany."""
+
+    mapper = butlerTestCase.SubsetMapperForTestWriting
+    numObjs = 20
+
+    def testGetMany(self):
+        dataIds = [{'bar': i} for i in reversed(range(20))]
+        objs = self.butler.getMany('foo', dataIds, maxWorkers=4)
+        self.assertEqual(objs, list(reversed(self.objs)))
+
+    def testErrors(self):
+        dataIds = [{'bar': 1}, {'bar': 100}, {'bar': 2}]
+        with self.assertRaises(dp.NoResults):
+            self.butler.getMany('foo', dataIds)
+        objs = self.butler.getMany('foo', dataIds, returnExceptions=True)
+        self.assertEqual(objs[0], self.objs[1])
+        self.assertIsInstance(objs[1], dp.NoResults)
+        self.assertEqual(objs[2], self.objs[2])
+
+    def testEmpty(self):
+        self.assertEqual(self.butler.getMany('foo', []), [])
+
+    def testGetAll(self):
+        subset = self.butler.subset('foo')
+        self.assertEqual(len(subset), 20)
+        self.assertEqual(sorted(subset.getAll(maxWorkers=4)), self.objs)
+
+    def testIterGet(self):
+        subset = self.butler.subset('foo')
+        for prefetch, maxBytes in ((0, None), (3, None), (3, 1)):
+            pairs = list(subset.iterGet(prefetch=prefetch, maxBytes=maxBytes))
+            self.assertEqual(len(pairs), 20)
+            for dataRef, obj in pairs:
+                self.assertEqual(obj, self.objs[dataRef.dataId['bar']])
+
+    def testIterGetError(self):
+        objs = self.butler._iterGet('foo', [{'bar': 1}, {'bar': 100}], prefetch=2, maxBytes=None)
+        self.assertEqual(next(objs), self.objs[1])
+        with self.assertRaises(dp.NoResults):
+            next(objs)
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+if __name__ == '__main__':
+    lsst.utils.tests.init()
+    unittest.main()
@@ -72,6 +72,23 @@ class ButlerPickleTestCase(unittest.TestCase):
         bbox = [[1, 2], [8, 9]]
         self.checkIO(butler, bbox, 1)
 
+    def testFastPickle(self):
+        self.butler.enableFastPickle()
+        self.butler.enableLocationCache(maxSize=10)
+        butler = pickle.loads(pickle.dumps(self.butler))
+        # the repository graph is carried by the pickle; the repository is created when it is used.
+        self.assertEqual(len(butler._repos.all()), 1)
+        self.assertIsNone(butler._repos.outputs()[0]._repo)
+        self.assertEqual(butler._repos.outputs()[0].cfg, self.butler._repos.outputs()[0].cfg)
+        bbox = [[1, 2], [8, 9]]
+        self.checkIO(butler, bbox, 1)
+        self.assertIsNotNone(butler._repos.outputs()[0]._repo)
+        self.assertIn('location', butler.getCacheStats())
+        # the unpickled butler is fast-pickled too.
+        butler = pickle.loads(pickle.dumps(butler))
+        self.assertIsNone(butler._repos.outputs()[0]._repo)
+        self.assertEqual(butler.get(self.localTypeName, ccd=1, immediate=True), bbox)
+
 
 class TestMemory(lsst.utils.tests.MemoryTestCase):
     pass
@@ -0,0 +1,82 @@
+#
+# LSST Data Management System
+# Copyright 2018 AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+
+import unittest
+
+import lsst.daf.persistence as dp
+import lsst.utils.tests
+import butlerTestCase
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+class PrefetchTestCase(butlerTestCase.ButlerTestCase):
+    """Test prefetching the datasets of the proxies returned by get(immediate=False)."""
+
+    numObjs = 5
+
+    def testPrefetch(self):
+        self.butler.enablePrefetch(maxWorkers=2)
+        self.butler.enableStats()
+        proxies = [self.butler.get('foo', {'bar': i}, immediate=False) for i in range(5)]
+        self.butler._prefetchExecutor.shutdown(wait=True)
+        # the reads were done when the proxies were made.
+        self.assertEqual(self.butler.getStats().get('read').count, 5)
+        self.assertEqual(proxies, self.objs)
+
+    def testResolveProxies(self):
+        proxies = [self.butler.get('foo', {'bar': i}, immediate=False) for i in range(5)]
+        proxies.append('notAProxy')
+        self.assertEqual(self.butler.resolveProxies(proxies, maxWorkers=3), self.objs + ['notAProxy'])
+        # resolved proxies are not read again.
+        self.butler.enableStats()
+        self.assertEqual(self.butler.resolveProxies(proxies[:2]), self.objs[:2])
+        self.assertEqual(self.butler.getStats().get('read').count, 0)
+
+    def testEvictableProxies(self):
+        budget = dp.ProxyMemoryBudget(maxBytes=1, estimateSize=lambda obj: 1)
+        default = dp.ProxyMemoryBudget.getDefault()
+        dp.ProxyMemoryBudget.setDefault(budget)
+        try:
+            self.butler.enableEvictableProxies()
+            self.butler.enablePrefetch(maxWorkers=2)
+            proxies = [self.butler.get('foo', {'bar': i}, immediate=False) for i in range(2)]
+            self.assertIsInstance(proxies[0], dp.EvictableReadProxy)
+            self.assertEqual(self.butler.resolveProxies(proxies), self.objs[:2])
+            # only the last object fits in the budget; the first one is read again when it is used.
+            self.assertFalse(budget.holds(proxies[0]))
+            self.assertTrue(budget.holds(proxies[1]))
+            self.assertEqual(proxies[0], self.objs[0])
+            self.assertEqual(budget.stats().misses, 3)
+        finally:
+            dp.ProxyMemoryBudget.setDefault(default)
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+if __name__ == '__main__':
+    lsst.utils.tests.init()
+    unittest.main()
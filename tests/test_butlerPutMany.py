@@ -0,0 +1,60 @@
+#
+# LSST Data Management System
+# Copyright 2018 AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+
+import os
+import unittest
+
+# can't use name TestObject, becuase it messes Pytest up. Alias it to tstObj
+from lsst.daf.persistence.test import TestObject as tstObj
+import lsst.utils.tests
+import butlerTestCase
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+class PutManyTestCase(butlerTestCase.ButlerTestCase):
+    """Test writing many datasets at once with Butler.putMany."""
+
+    def testPutMany(self):
+        objs = [tstObj(i) for i in range(20)]
+        dataIds = [{'bar': i} for i in range(20)]
+        self.butler.putMany(objs, 'foo', dataIds, maxWorkers=4)
+        for obj, dataId in zip(objs, dataIds):
+            self.assertTrue(os.path.exists(os.path.join(self.testDir, 'filename_bar%d.txt' % dataId['bar'])))
+            self.assertEqual(self.butler.get('foo', dataId), obj)
+        # no temporary files are left behind.
+        self.assertEqual(len([f for f in os.listdir(self.testDir) if f.startswith('filename')]), 20)
+
+    def testMismatchedLengths(self):
+        with self.assertRaises(RuntimeError):
+            self.butler.putMany([tstObj(1)], 'foo', [{'bar': 1}, {'bar': 2}])
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+if __name__ == '__main__':
+    lsst.utils.tests.init()
+    unittest.main()
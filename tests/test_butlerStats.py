@@ -0,0 +1,109 @@
+#
+# LSST Data Management System
+# Copyright 2018 AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import lsst.daf.persistence as dp
+# can't use name TestObject, becuase it messes Pytest up. Alias it to tstObj
+from lsst.daf.persistence.test import TestObject as tstObj
+from lsst.daf.persistence.test import MapperForTestWriting
+import lsst.utils.tests
+
+# Define the root of the tests relative to this file
+ROOT = os.path.abspath(os.path.dirname(__file__))
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+class ButlerStatsTestCase(unittest.TestCase):
+    """Test the ButlerStats class."""
+
+    def testRecordAndGet(self):
+        stats = dp.ButlerStats()
+        stats.record('read', 2., datasetType='foo', repository='a')
+        stats.record('read', 1., datasetType='bar', repository='a')
+        stats.record('map', 0.5, datasetType='foo', repository='b')
+        with stats.timer('write', 'foo', 'a'):
+            pass
+        self.assertEqual(stats.get('read'), dp.PhaseStats(count=2, totalTime=3., maxTime=2.))
+        self.assertEqual(stats.get('read').meanTime, 1.5)
+        self.assertEqual(stats.get(datasetType='foo').count, 3)
+        self.assertEqual(stats.get(repository='b').totalTime, 0.5)
+        self.assertEqual(list(stats.byPhase().keys()), ['map', 'read', 'write'])
+        self.assertEqual(stats.byDatasetType('read')['bar'].count, 1)
+        self.assertEqual(stats.byRepository()['a'].count, 3)
+        self.assertIn('foo', str(stats))
+        stats.reset()
+        self.assertEqual(stats.get(), dp.PhaseStats(0, 0., 0.))
+
+    def testTimerRecordsOnError(self):
+        stats = dp.ButlerStats()
+        with self.assertRaises(RuntimeError):
+            with stats.timer('read', 'foo'):
+                raise RuntimeError("failed read")
+        self.assertEqual(stats.get('read', 'foo').count, 1)
+
+
+class ButlerWithStatsTestCase(unittest.TestCase):
+    """Test the stats collected by a Butler."""
+
+    def setUp(self):
+        self.testDir = tempfile.mkdtemp(dir=ROOT, prefix="ButlerWithStatsTestCase-")
+
+    def tearDown(self):
+        if os.path.exists(self.testDir):
+            shutil.rmtree(self.testDir)
+
+    def testPutAndGet(self):
+        butler = dp.Butler(outputs=dp.RepositoryArgs(mode='rw', root=self.testDir,
+                                                     mapper=MapperForTestWriting))
+        self.assertIsNone(butler.getStats())
+        butler.put(tstObj('abc'), 'foo', {'bar': 1})
+        butler.enableStats()
+        self.assertEqual(butler.getStats().get().count, 0)
+
+        butler.put(tstObj('abc'), 'foo', {'bar': 1})
+        self.assertEqual(butler.get('foo', {'bar': 1}), tstObj('abc'))
+        stats = butler.getStats()
+        for phase in ('resolveAlias', 'locate', 'map', 'exists', 'read', 'write'):
+            self.assertGreater(stats.get(phase, 'foo').count, 0, phase)
+        self.assertEqual(stats.get('write', 'foo', self.testDir).count, 1)
+        self.assertEqual(stats.get('read', 'foo', self.testDir).count, 1)
+
+        butler.resetStats()
+        self.assertEqual(butler.getStats().get().count, 0)
+        butler.enableStats(False)
+        self.assertIsNone(butler.getStats())
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+if __name__ == '__main__':
+    lsst.utils.tests.init()
+    unittest.main()
@@ -25,8 +25,10 @@ import unittest
 
 import os
 import pickle
+import sqlite3
 import tempfile
 import lsst.daf.persistence as dafPersist
+import lsst.daf.persistence.test as dpTest
 import lsst.utils.tests
 from cameraMapper import CameraMapper
 
@@ -152,6 +154,48 @@ class ButlerSubsetTestCase(unittest.TestCase):
         for fileName in inputList:
             os.unlink(os.path.join(self.tmpRoot, fileName))
 
+    def testStreaming(self):
+        butler = dafPersist.Butler(
+            outputs={'mode': 'rw', 'root': self.tmpRoot, 'mapper': ImgMapper})
+        ButlerSubsetTestCase.registerAliases(butler)
+        subset = butler.subset(self.calexpTypeName, skyTile=6)
+        streamed = butler.subset(self.calexpTypeName, skyTile=6, stream=True)
+        # the data ids are not gathered when a streamed subset is created.
+        self.assertEqual(streamed.cache, [])
+        # ImgMapper has no registry lookup, so the data ids can not be counted without fetching them; they are
+        # fetched once by len() and kept.
+        self.assertIsNone(butler.queryMetadataCount(self.calexpTypeName, ('visit', 'raft', 'sensor'),
+                                                    skyTile=6))
+        self.assertEqual(len(streamed), 4)
+        self.assertEqual(len(streamed.cache), 4)
+        dataIds = sorted(tuple(sorted(dataRef.dataId.items())) for dataRef in subset)
+        self.assertEqual(sorted(tuple(sorted(dataRef.dataId.items())) for dataRef in streamed), dataIds)
+        # a streamed subset can be iterated over more than once.
+        self.assertEqual(len(list(streamed)), 4)
+        self.assertEqual(len(butler.subset(self.calexpTypeName, skyTile=2349023905239, stream=True)), 0)
+
+    def testColumnar(self):
+        butler = dafPersist.Butler(
+            outputs={'mode': 'rw', 'root': self.tmpRoot, 'mapper': ImgMapper})
+        ButlerSubsetTestCase.registerAliases(butler)
+        subset = butler.subset(self.calexpTypeName, skyTile=6)
+        columnar = butler.subset(self.calexpTypeName, skyTile=6, columnar=True)
+        self.assertIsInstance(columnar.cache, dafPersist.DataIdTable)
+        self.assertEqual(len(columnar), 4)
+        dataIds = sorted(tuple(sorted(dataRef.dataId.items())) for dataRef in subset)
+        self.assertEqual(sorted(tuple(sorted(dataRef.dataId.items())) for dataRef in columnar), dataIds)
+        self.assertEqual(columnar[0].dataId['skyTile'], 6)
+
+        byVisit = columnar.groupBy('visit')
+        self.assertEqual(sorted(byVisit.keys()), [123456, 654321])
+        self.assertEqual(len(byVisit[654321]), 2)
+        self.assertEqual(len(columnar.select(raft='1,3').union(columnar.select(visit=123456))), 4)
+        self.assertEqual(len(columnar.difference(byVisit[123456])), 2)
+        # the set operations work on subsets held as lists too.
+        self.assertEqual(len(subset.intersection(columnar.select(sensor='1,1'))), 1)
+        with self.assertRaises(RuntimeError):
+            butler.subset(self.calexpTypeName, skyTile=6, stream=True, columnar=True)
+
     def testNonexistentValue(self):
         butler = dafPersist.Butler(
             outputs={'mode': 'rw', 'root': self.tmpRoot, 'mapper': ImgMapper})
@@ -248,6 +292,98 @@ class ButlerSubsetTestCase(unittest.TestCase):
         self.assertFalse(ref.datasetExists(self.rawTypeName))
 
 
+class ListingMapper(dpTest.MapperForTestWriting):
+    """A MapperForTestWriting that lists the 'foo' datasets in its repository."""
+
+    def getKeys(self, datasetType, level):
+        return {'bar': int}
+
+    def queryMetadata(self, datasetType, format, dataId):
+        return [(int(f[len('filename_bar'):-len('.txt')]),) for f in sorted(os.listdir(self.root))
+                if f.startswith('filename_bar') and f.endswith('.txt')]
+
+
+class ParallelQueriesTestCase(unittest.TestCase):
+    """Test listing the data ids of a subset from all the input repositories."""
+
+    def setUp(self):
+        self.tmpRoot = tempfile.mkdtemp()
+        self.repos = []
+        for i, bars in enumerate(([1, 2], [2, 3], [4])):
+            root = os.path.join(self.tmpRoot, 'repo%d' % i)
+            butler = dafPersist.Butler(outputs={'root': root, 'mapper': ListingMapper})
+            for bar in bars:
+                butler.put(dpTest.TestObject(bar), 'foo', {'bar': bar})
+            self.repos.append(root)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpRoot, ignore_errors=True)
+
+    def testParallelQueries(self):
+        butler = dafPersist.Butler(inputs=self.repos)
+        # by default only the first repository that has data ids is listed.
+        self.assertEqual([dataRef.dataId['bar'] for dataRef in butler.subset('foo')], [1, 2])
+        self.assertEqual(butler.querySubsetMetadata('foo', 'bar'), [1, 2])
+        butler.enableParallelQueries(maxWorkers=3)
+        self.assertEqual(butler.querySubsetMetadata('foo', ['bar']), [1, 2, 3, 4])
+        self.assertEqual([dataRef.dataId['bar'] for dataRef in butler.subset('foo')], [1, 2, 3, 4])
+        columnar = butler.subset('foo', columnar=True)
+        self.assertEqual(list(columnar.cache.column('bar')), [1, 2, 3, 4])
+        self.assertEqual(list(butler.querySubsetMetadataTable('foo', 'bar').column('bar')), [1, 2, 3, 4])
+        self.assertEqual(list(butler.queryMetadataTable('foo', 'bar')), [{'bar': bar} for bar in range(1, 5)])
+
+
+class RegistryMapper(dpTest.MapperForTestWriting):
+    """A MapperForTestWriting whose 'foo' data ids are in a sqlite registry."""
+
+    def __init__(self, root, **kwargs):
+        dpTest.MapperForTestWriting.__init__(self, root, **kwargs)
+        self.registry = dafPersist.Registry.create(os.path.join(root, 'registry.sqlite3'))
+
+    def getRegistry(self):
+        return self.registry
+
+    def getKeys(self, datasetType, level):
+        return {'bar': int, 'filter': str}
+
+    def getRegistryLookup(self, datasetType, dataId):
+        return ('foo', dataId, {})
+
+    def queryMetadata(self, datasetType, format, dataId):
+        raise RuntimeError("the registry lookup should be used instead of queryMetadata")
+
+
+class RegistryStreamingTestCase(unittest.TestCase):
+    """Test that streamed subsets are listed and counted by the registry."""
+
+    def setUp(self):
+        self.tmpRoot = tempfile.mkdtemp()
+        conn = sqlite3.connect(os.path.join(self.tmpRoot, 'registry.sqlite3'))
+        conn.execute("CREATE TABLE foo (bar INT, filter TEXT)")
+        conn.executemany("INSERT INTO foo VALUES (?, ?)",
+                         [(bar, 'g' if bar % 2 else 'r') for bar in range(10)])
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpRoot, ignore_errors=True)
+
+    def testStreaming(self):
+        butler = dafPersist.Butler(outputs={'mode': 'rw', 'root': self.tmpRoot, 'mapper': RegistryMapper})
+        registry = butler._repos.outputs()[0].repo.getRegistry()
+        calls = []
+        for name in ('lookupIter', 'lookupCount'):
+            def wrapper(*args, _method=getattr(registry, name), _name=name, **kwargs):
+                calls.append(_name)
+                return _method(*args, **kwargs)
+            setattr(registry, name, wrapper)
+        streamed = butler.subset('foo', stream=True, filter='g')
+        self.assertEqual(len(streamed), 5)
+        self.assertEqual(sorted(dataRef.dataId['bar'] for dataRef in streamed), [1, 3, 5, 7, 9])
+        self.assertEqual(butler.queryMetadataCount('foo', 'bar'), 10)
+        self.assertEqual(calls, ['lookupCount', 'lookupIter', 'lookupCount'])
+
+
 class MemoryTester(lsst.utils.tests.MemoryTestCase):
     pass
 
@@ -0,0 +1,180 @@
+#
+# LSST Data Management System
+# Copyright 2018 AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+
+import asyncio
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+
+import lsst.daf.persistence as dp
+# can't use name TestObject, becuase it messes Pytest up. Alias it to tstObj
+from lsst.daf.persistence.test import TestObject as tstObj
+from lsst.daf.persistence.test import MapperForTestWriting
+import lsst.utils.tests
+
+# Define the root of the tests relative to this file
+ROOT = os.path.abspath(os.path.dirname(__file__))
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+def traceInWorker(tracePath):
+    """Record a span in a pool worker without flushing it; the worker's exit must write it."""
+    global workerTracer
+    workerTracer = dp.ButlerTracer(tracePath)
+    with workerTracer.timer('work'):
+        pass
+    return os.getpid()
+
+
+def traceInForkedChild(tracer):
+    with tracer.timer('child'):
+        pass
+
+
+class ButlerTraceTestCase(unittest.TestCase):
+    """Test the Chrome trace-event spans recorded by a Butler."""
+
+    def setUp(self):
+        self.testDir = tempfile.mkdtemp(dir=ROOT, prefix="ButlerTraceTestCase-")
+        self.tracePath = os.path.join(self.testDir, 'trace-{pid}.json')
+
+    def tearDown(self):
+        if os.path.exists(self.testDir):
+            shutil.rmtree(self.testDir)
+
+    def readTrace(self):
+        with open(self.tracePath.format(pid=os.getpid())) as f:
+            return json.load(f)['traceEvents']
+
+    def testTrace(self):
+        butler = dp.Butler(outputs=dp.RepositoryArgs(mode='rw', root=os.path.join(self.testDir, 'repo'),
+                                                     mapper=MapperForTestWriting))
+        self.assertIsNone(butler.getTracer())
+        butler.enableTracing(self.tracePath)
+        butler.enableStats()
+        butler.put(tstObj('abc'), 'foo', {'bar': 1})
+        self.assertEqual(butler.get('foo', {'bar': 1}), tstObj('abc'))
+        butler.getTracer().flush()
+
+        spans = [event for event in self.readTrace() if event['ph'] == 'X']
+        names = set(event['name'] for event in spans)
+        for name in ('put', 'get', 'locate', 'map', 'exists', 'read', 'write'):
+            self.assertIn(name, names)
+        for event in spans:
+            self.assertGreaterEqual(event['dur'], 0)
+            self.assertEqual(event['pid'], os.getpid())
+        get, = [event for event in spans if event['name'] == 'get']
+        read, = [event for event in spans if event['name'] == 'read']
+        # the read is nested in the get.
+        self.assertLessEqual(get['ts'], read['ts'])
+        self.assertGreaterEqual(get['ts'] + get['dur'], read['ts'] + read['dur'])
+        self.assertEqual(read['args'],
+                         {'datasetType': 'foo', 'repository': os.path.join(self.testDir, 'repo')})
+        # the stats are collected at the same time.
+        self.assertEqual(butler.getStats().get('get').count, 1)
+
+        # disabling tracing writes the remaining spans.
+        butler.datasetExists('foo', {'bar': 1})
+        butler.enableTracing(None)
+        self.assertIsNone(butler.getTracer())
+        self.assertIn('datasetExists', set(event['name'] for event in self.readTrace()))
+
+    def testAsyncTasks(self):
+        butler = dp.Butler(outputs=dp.RepositoryArgs(mode='rw', root=os.path.join(self.testDir, 'repo'),
+                                                     mapper=MapperForTestWriting))
+        butler.put(tstObj('abc'), 'foo', {'bar': 1})
+        butler.enableTracing(self.tracePath)
+
+        async def getAll():
+            return await asyncio.gather(*[butler.aget('foo', {'bar': 1}) for i in range(4)])
+        self.assertEqual(asyncio.run(getAll()), [tstObj('abc')] * 4)
+        butler.getTracer().flush()
+
+        # the spans of the tasks that ran at once are on different tracks, and are nested on each track.
+        spans = [event for event in self.readTrace()
+                 if event['ph'] == 'X' and event['name'] in ('aget', 'map')]
+        agets = [event for event in spans if event['name'] == 'aget']
+        self.assertEqual(len(agets), 4)
+        self.assertEqual(len(set(event['tid'] for event in agets)), 4)
+        for event in spans:
+            aget, = [other for other in agets if other['tid'] == event['tid']]
+            self.assertLessEqual(aget['ts'], event['ts'])
+            self.assertGreaterEqual(aget['ts'] + aget['dur'], event['ts'] + event['dur'])
+
+    def testFlushSize(self):
+        with dp.ButlerTracer(self.tracePath, flushSize=2) as tracer:
+            tracer.record('a', 0.1)
+            self.assertFalse(os.path.exists(tracer.path))
+            tracer.record('b', 0.1)
+            # the buffer was full, so the spans were written and the file is a complete document.
+            self.assertEqual([event['name'] for event in self.readTrace() if event['ph'] == 'X'], ['a', 'b'])
+            self.assertEqual([event for event in tracer.getEvents() if event['ph'] == 'X'], [])
+            tracer.record('c', 0.1)
+        # the with block closed the tracer, which appended the last span.
+        events = self.readTrace()
+        self.assertEqual([event['name'] for event in events if event['ph'] == 'X'], ['a', 'b', 'c'])
+        self.assertEqual(len([event for event in events if event['ph'] == 'M']), 1)
+        tracer.record('d', 0.1)
+        self.assertEqual(len(self.readTrace()), len(events))
+
+    def testPoolWorker(self):
+        pool = multiprocessing.Pool(1)
+        try:
+            pid = pool.apply(traceInWorker, (self.tracePath,))
+        finally:
+            pool.close()
+            pool.join()
+        self.assertNotEqual(pid, os.getpid())
+        with open(self.tracePath.format(pid=pid)) as f:
+            events = json.load(f)['traceEvents']
+        spans = [event for event in events if event['ph'] == 'X']
+        self.assertEqual([event['name'] for event in spans], ['work'])
+        self.assertEqual(spans[0]['pid'], pid)
+
+    def testForkedChild(self):
+        tracer = dp.ButlerTracer(self.tracePath)
+        tracer.record('parent', 0.1)
+        child = multiprocessing.get_context('fork').Process(target=traceInForkedChild, args=(tracer,))
+        child.start()
+        child.join()
+        self.assertEqual(child.exitcode, 0)
+        # the child wrote its own file, without the parent's spans.
+        with open(self.tracePath.format(pid=child.pid)) as f:
+            self.assertEqual([event['name'] for event in json.load(f)['traceEvents'] if event['ph'] == 'X'],
+                             ['child'])
+        tracer.close()
+        self.assertEqual([event['name'] for event in self.readTrace() if event['ph'] == 'X'], ['parent'])
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+if __name__ == '__main__':
+    lsst.utils.tests.init()
+    unittest.main()
@@ -0,0 +1,94 @@
+#
+# LSST Data Management System
+# Copyright 2018 AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+
+import os
+import threading
+import unittest
+
+import lsst.daf.persistence as dp
+# can't use name TestObject, becuase it messes Pytest up. Alias it to tstObj
+from lsst.daf.persistence.test import TestObject as tstObj
+import lsst.utils.tests
+import butlerTestCase
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+class WriteBehindTestCase(butlerTestCase.ButlerTestCase):
+    """Test queueing the writes of Butler.put with Butler.enableWriteBehind."""
+
+    def testWriteBehind(self):
+        objs = [tstObj(i) for i in range(20)]
+        with self.butler as butler:
+            butler.enableWriteBehind(maxWorkers=4, maxBytes=dp.ObjectCache.estimateSize(objs[0]) * 3)
+            for i, obj in enumerate(objs):
+                butler.put(obj, 'foo', bar=i)
+                self.assertLessEqual(butler._writeBehind.pendingBytes, butler._writeBehind.maxBytes)
+        for i, obj in enumerate(objs):
+            self.assertTrue(os.path.exists(os.path.join(self.testDir, 'filename_bar%d.txt' % i)))
+        # a read of a dataset type waits for its queued writes.
+        self.butler.put(tstObj('new'), 'foo', bar=0)
+        self.assertEqual(self.butler.get('foo', bar=0), tstObj('new'))
+        self.assertTrue(self.butler.datasetExists('foo', bar=19))
+
+    def testMaxPending(self):
+        objs = [tstObj(i) for i in range(20)]
+        with self.butler as butler:
+            # the byte budget does not limit the queue; the number of pending writes does.
+            butler.enableWriteBehind(maxWorkers=4, maxBytes=2**40, maxPending=3)
+            for i, obj in enumerate(objs):
+                butler.put(obj, 'foo', bar=i)
+                self.assertLessEqual(butler._writeBehind.pendingCount, 3)
+        self.assertEqual(self.butler._writeBehind.pendingCount, 0)
+        for i, obj in enumerate(objs):
+            self.assertEqual(self.butler.get('foo', bar=i), obj)
+
+    def testDeferredErrors(self):
+        self.butler.enableWriteBehind(maxWorkers=2)
+        # the put of an object that can not be pickled returns, and its error is raised by flush.
+        self.butler.put(tstObj(threading.Lock()), 'foo', bar=1)
+        self.butler.put(tstObj(2), 'foo', bar=2)
+        with self.assertRaises(TypeError):
+            self.butler.flush()
+        self.assertEqual(self.butler.get('foo', bar=2), tstObj(2))
+        self.butler.flush()
+        with self.assertRaises(TypeError):
+            with self.butler:
+                self.butler.put(tstObj(threading.Lock()), 'foo', bar=3)
+
+    def testDisable(self):
+        self.butler.enableWriteBehind(maxWorkers=2)
+        self.butler.enableWriteBehind(maxWorkers=0)
+        self.assertIsNone(self.butler._writeBehind)
+        self.butler.put(tstObj(1), 'foo', bar=1)
+        self.assertTrue(os.path.exists(os.path.join(self.testDir, 'filename_bar1.txt')))
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+if __name__ == '__main__':
+    lsst.utils.tests.init()
+    unittest.main()
@@ -0,0 +1,132 @@
+#
+# LSST Data Management System
+# Copyright 2018 AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+
+import unittest
+
+import lsst.daf.persistence as dp
+import lsst.utils.tests
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+class DataIdTableTestCase(unittest.TestCase):
+    """Test the DataIdTable class."""
+
+    def setUp(self):
+        self.dataIds = [{'visit': visit, 'ccd': ccd, 'filter': 'g' if visit % 2 else 'r'}
+                        for visit in range(4) for ccd in range(3)]
+        self.table = dp.DataIdTable.fromDicts(self.dataIds)
+
+    def testFromDicts(self):
+        self.assertEqual(len(self.table), 12)
+        self.assertEqual(self.table.keys, ('visit', 'ccd', 'filter'))
+        self.assertEqual(list(self.table), self.dataIds)
+        self.assertEqual(self.table[4], self.dataIds[4])
+        self.assertIsInstance(self.table[4]['visit'], int)
+        self.assertEqual(list(self.table[2:4]), self.dataIds[2:4])
+        self.assertLess(self.table.nbytes, 12 * 30)
+        with self.assertRaises(RuntimeError):
+            dp.DataIdTable.fromDicts([{'visit': 1}, {'ccd': 2}])
+
+    def testFromTuples(self):
+        table = dp.DataIdTable.fromTuples(['visit', 'ccd'], iter([(1, 2), (3, 4)]), {'filter': 'g'})
+        self.assertEqual(list(table), [{'visit': 1, 'ccd': 2, 'filter': 'g'},
+                                       {'visit': 3, 'ccd': 4, 'filter': 'g'}])
+        table = dp.DataIdTable.fromTuples(['visit'], [5, 6])
+        self.assertEqual(list(table.column('visit')), [5, 6])
+
+    def testSelect(self):
+        self.assertEqual(list(self.table.select(filter='g', ccd=[0, 2])),
+                         [dataId for dataId in self.dataIds
+                          if dataId['filter'] == 'g' and dataId['ccd'] in (0, 2)])
+        with self.assertRaises(RuntimeError):
+            self.table.select(amp=1)
+
+    def testSortAndGroupBy(self):
+        self.assertEqual(list(self.table.sort('ccd', 'visit')),
+                         sorted(self.dataIds, key=lambda dataId: (dataId['ccd'], dataId['visit'])))
+        groups = self.table.groupBy('filter')
+        self.assertEqual(list(groups.keys()), ['g', 'r'])
+        self.assertEqual(len(groups['g']), 6)
+        groups = self.table.groupBy('filter', 'ccd')
+        self.assertEqual(len(groups), 6)
+        self.assertEqual(list(groups[('r', 1)]), [{'visit': 0, 'ccd': 1, 'filter': 'r'},
+                                                  {'visit': 2, 'ccd': 1, 'filter': 'r'}])
+
+    def testUniqueAndConstants(self):
+        table = dp.DataIdTable.fromTuples(['visit'], [3, 1, 3, 2, 1])
+        self.assertEqual(list(table.unique().column('visit')), [3, 1, 2])
+        table = table.withConstants({'filter': 'g', 'visit': 0})
+        self.assertEqual(table.keys, ('visit', 'filter'))
+        self.assertEqual(table[0], {'visit': 3, 'filter': 'g'})
+
+    def testSetOperations(self):
+        first = self.table.select(visit=[0, 1])
+        second = self.table.select(visit=[1, 2])
+        self.assertEqual(len(first.union(second)), 9)
+        self.assertEqual(set(dataId['visit'] for dataId in first.intersection(second)), {1})
+        self.assertEqual(set(dataId['visit'] for dataId in first.difference(second)), {0})
+        with self.assertRaises(RuntimeError):
+            first.union(dp.DataIdTable.fromDicts([{'visit': 1}]))
+
+    def testKindMismatch(self):
+        ints = dp.DataIdTable.fromTuples(['visit'], [1, 2])
+        strs = dp.DataIdTable.fromTuples(['visit'], ['1', '3'])
+        for operation in ('union', 'intersection', 'difference'):
+            with self.assertRaises(RuntimeError):
+                getattr(ints, operation)(strs)
+        # an empty table takes the types of the other.
+        empty = dp.DataIdTable.fromDicts([], keys=['visit'])
+        self.assertEqual(list(empty.union(strs).column('visit')), ['1', '3'])
+        self.assertEqual(list(ints.difference(empty).column('visit')), [1, 2])
+
+    def testNoneValues(self):
+        table = dp.DataIdTable.fromTuples(['visit', 'ccd'], [(2, None), (1, 3), (2, None), (1, None)])
+        self.assertEqual(table.array.dtype['ccd'].kind, 'O')
+        self.assertEqual(list(table.unique()), [{'visit': 2, 'ccd': None}, {'visit': 1, 'ccd': 3},
+                                                {'visit': 1, 'ccd': None}])
+        self.assertEqual([dataId['ccd'] for dataId in table.sort('ccd', 'visit')], [3, None, None, None])
+        self.assertEqual(list(table.groupBy('ccd').keys()), [3, None])
+        other = dp.DataIdTable.fromTuples(['visit', 'ccd'], [(1, None), (4, 5)])
+        self.assertEqual(list(table.intersection(other)), [{'visit': 1, 'ccd': None}])
+        self.assertEqual(len(table.union(other)), 4)
+        mixed = dp.DataIdTable.fromTuples(['ccd'], [1, 'a', None])
+        with self.assertRaises(RuntimeError):
+            mixed.sort()
+
+    def testNanValues(self):
+        nan = float('nan')
+        table = dp.DataIdTable.fromTuples(['ra'], [nan, 1.5, nan, 1.5])
+        self.assertEqual(len(table.unique()), 2)
+        self.assertEqual(len(table.groupBy('ra')), 2)
+        self.assertEqual(len(table.union(dp.DataIdTable.fromTuples(['ra'], [nan]))), 2)
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+if __name__ == '__main__':
+    lsst.utils.tests.init()
+    unittest.main()
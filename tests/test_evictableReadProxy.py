@@ -0,0 +1,111 @@
+#
+# LSST Data Management System
+# Copyright 2018 AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+
+import unittest
+
+import lsst.daf.persistence as dp
+import lsst.utils.tests
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+class EvictableReadProxyTestCase(unittest.TestCase):
+    """Test EvictableReadProxy and ProxyMemoryBudget."""
+
+    def setUp(self):
+        self.budget = dp.ProxyMemoryBudget(maxBytes=25, estimateSize=lambda obj: 10)
+        self.reads = []
+
+    def makeProxy(self, value):
+        def callback():
+            self.reads.append(value)
+            return [value]
+        return dp.EvictableReadProxy(callback, self.budget)
+
+    def testEviction(self):
+        proxies = [self.makeProxy(i) for i in range(3)]
+        self.assertEqual(self.reads, [])
+        self.assertEqual(proxies[0][0], 0)
+        self.assertEqual(proxies[1][0], 1)
+        self.assertEqual(self.budget.nBytes, 20)
+        # using proxies[0] again makes proxies[1] the least recently used.
+        self.assertEqual(len(proxies[0]), 1)
+        self.assertEqual(proxies[2][0], 2)
+        self.assertEqual(self.budget.nBytes, 20)
+        self.assertTrue(self.budget.holds(proxies[0]))
+        self.assertFalse(self.budget.holds(proxies[1]))
+        # an evicted object is read again.
+        self.assertEqual(proxies[1][0], 1)
+        self.assertEqual(self.reads, [0, 1, 2, 1])
+        self.assertEqual(self.budget.stats().misses, 4)
+
+    def testPinning(self):
+        proxies = [self.makeProxy(i) for i in range(3)]
+        with self.budget.pinned(proxies[0]) as obj:
+            self.assertEqual(obj, [0])
+            proxies[1][0]
+            proxies[2][0]
+            self.assertTrue(self.budget.holds(proxies[0]))
+            self.assertFalse(self.budget.evict(proxies[0]))
+        self.assertTrue(self.budget.evict(proxies[0]))
+        self.assertFalse(self.budget.holds(proxies[0]))
+
+        # the budget is exceeded if the pinned objects do not fit.
+        for proxy in proxies:
+            self.budget.pin(proxy)
+        self.assertEqual(self.budget.nBytes, 30)
+        self.budget.clear()
+        self.assertEqual(self.budget.nBytes, 30)
+        for proxy in proxies:
+            self.budget.unpin(proxy)
+        self.budget.clear()
+        self.assertEqual(self.budget.nBytes, 0)
+
+    def testDeletedProxiesAreReleased(self):
+        proxy = self.makeProxy(0)
+        proxy[0]
+        self.assertEqual(len(self.budget), 1)
+        del proxy
+        self.assertEqual(len(self.budget), 0)
+        self.assertEqual(self.budget.nBytes, 0)
+
+    def testDefaultBudget(self):
+        default = dp.ProxyMemoryBudget.getDefault()
+        self.assertIs(dp.ProxyMemoryBudget.getDefault(), default)
+        try:
+            dp.ProxyMemoryBudget.setDefault(self.budget)
+            proxy = dp.EvictableReadProxy(lambda: 'abc')
+            self.assertEqual(proxy, 'abc')
+            self.assertTrue(self.budget.holds(proxy))
+        finally:
+            dp.ProxyMemoryBudget.setDefault(default)
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+if __name__ == '__main__':
+    lsst.utils.tests.init()
+    unittest.main()
@@ -0,0 +1,166 @@
+#
+# LSST Data Management System
+# Copyright 2018 AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import lsst.daf.persistence as dp
+# can't use name TestObject, becuase it messes Pytest up. Alias it to tstObj
+from lsst.daf.persistence.test import TestObject as tstObj
+from lsst.daf.persistence.test import MapperForTestWriting
+import lsst.utils.tests
+
+# Define the root of the tests relative to this file
+ROOT = os.path.abspath(os.path.dirname(__file__))
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+class FileIndexTestCase(unittest.TestCase):
+    """Test the FileIndex and its use by PosixStorage."""
+
+    def setUp(self):
+        self.testDir = tempfile.mkdtemp(dir=ROOT, prefix="FileIndexTestCase-")
+        os.makedirs(os.path.join(self.testDir, 'sub'))
+        with open(os.path.join(self.testDir, 'sub', 'a.fits'), 'w') as f:
+            f.write('abc')
+
+    def tearDown(self):
+        if os.path.exists(self.testDir):
+            shutil.rmtree(self.testDir)
+
+    def testBuild(self):
+        self.assertIsNone(dp.FileIndex.open(self.testDir))
+        fileIndex = dp.FileIndex.build(self.testDir)
+        self.assertTrue(fileIndex.isFresh())
+        self.assertTrue(fileIndex.contains('sub/a.fits'))
+        self.assertTrue(fileIndex.contains(os.path.join(self.testDir, 'sub', 'a.fits')))
+        self.assertEqual(fileIndex.lookup('sub/a.fits')[0], 3)
+        self.assertFalse(fileIndex.contains('sub/b.fits'))
+        # the index does not list itself.
+        self.assertFalse(fileIndex.contains(os.path.join(dp.FileIndex.dirName, dp.FileIndex.fileName)))
+
+        # a change to the root directory after the index was updated makes it stale.
+        future = time.time() + 100
+        os.utime(self.testDir, (future, future))
+        self.assertFalse(fileIndex.isFresh())
+        fileIndex.close()
+
+    def testPosixStorage(self):
+        dp.FileIndex.build(self.testDir).close()
+        storage = dp.PosixStorage(self.testDir, create=False)
+        self.assertTrue(storage._getFileIndex().isFresh())
+
+        # files that are in the index and files that are not are both answered without searching for them.
+        def instanceSearch(path):
+            raise AssertionError("%s was searched for" % path)
+        storage.instanceSearch = instanceSearch
+        self.assertTrue(storage.exists('sub/a.fits'))
+        self.assertTrue(storage.exists('sub/a.fits[1]'))
+        self.assertFalse(storage.exists('sub/c.fits'))
+        self.assertFalse(storage.exists('other/c.fits'))
+        self.assertEqual(storage.existsMany(['sub/a.fits', 'sub/c.fits']), [True, False])
+        # paths with wildcards are searched for.
+        del storage.instanceSearch
+        self.assertEqual(storage.existsMany(['sub/*.fits']), [True])
+
+    def testStale(self):
+        dp.FileIndex.build(self.testDir).close()
+        # a file that was written without updating the index makes it stale, and it is not used.
+        with open(os.path.join(self.testDir, 'sub', 'b.fits'), 'w') as f:
+            f.write('abc')
+        storage = dp.PosixStorage(self.testDir, create=False)
+        self.assertIsNone(storage._getFileIndex())
+        self.assertTrue(storage.exists('sub/b.fits'))
+        # so does one that was removed.
+        dp.FileIndex.build(self.testDir).close()
+        os.remove(os.path.join(self.testDir, 'sub', 'a.fits'))
+        storage = dp.PosixStorage(self.testDir, create=False)
+        self.assertIsNone(storage._getFileIndex())
+        self.assertFalse(storage.exists('sub/a.fits'))
+
+    def testAdd(self):
+        fileIndex = dp.FileIndex.build(self.testDir)
+        # a file written in a new directory is added with the directory, and the index stays fresh.
+        os.makedirs(os.path.join(self.testDir, 'new', 'dir'))
+        with open(os.path.join(self.testDir, 'new', 'dir', 'c.fits'), 'w') as f:
+            f.write('abc')
+        fileIndex.add(['new/dir/c.fits'])
+        self.assertTrue(fileIndex.contains('new/dir/c.fits'))
+        self.assertTrue(fileIndex.isFresh())
+        fileIndex.close()
+
+    def testAddAfterOtherChange(self):
+        fileIndex = dp.FileIndex.build(self.testDir)
+        # another process writes a file that is not added to the index...
+        with open(os.path.join(self.testDir, 'sub', 'other.fits'), 'w') as f:
+            f.write('abc')
+        # ...so an update of the index in the same directory leaves it stale.
+        with open(os.path.join(self.testDir, 'sub', 'c.fits'), 'w') as f:
+            f.write('abc')
+        fileIndex.add(['sub/c.fits'])
+        self.assertTrue(fileIndex.contains('sub/c.fits'))
+        self.assertFalse(fileIndex.isFresh())
+        # once the other file is in the index, an update makes it fresh again.
+        fileIndex.add(['sub/other.fits'])
+        self.assertTrue(fileIndex.isFresh())
+        fileIndex.close()
+
+    def testPut(self):
+        butler = dp.Butler(outputs=dp.RepositoryArgs(mode='rw', root=self.testDir,
+                                                     mapper=MapperForTestWriting))
+        dp.FileIndex.build(self.testDir, updatable=True).close()
+        butler.put(tstObj('abc'), 'foo', {'bar': 1})
+        fileIndex = dp.FileIndex.open(self.testDir)
+        self.assertTrue(fileIndex.isUpdatable())
+        self.assertTrue(fileIndex.isFresh())
+        self.assertTrue(fileIndex.contains('filename_bar1.txt'))
+        fileIndex.close()
+        self.assertTrue(butler.datasetExists('foo', {'bar': 1}))
+        self.assertEqual(butler.get('foo', {'bar': 1}), tstObj('abc'))
+        self.assertIsNotNone(dp.PosixStorage(self.testDir, create=False)._getFileIndex())
+
+    def testPutNotUpdatable(self):
+        butler = dp.Butler(outputs=dp.RepositoryArgs(mode='rw', root=self.testDir,
+                                                     mapper=MapperForTestWriting))
+        dp.FileIndex.build(self.testDir).close()
+        butler.put(tstObj('abc'), 'foo', {'bar': 1})
+        fileIndex = dp.FileIndex.open(self.testDir)
+        self.assertFalse(fileIndex.isUpdatable())
+        self.assertFalse(fileIndex.contains('filename_bar1.txt'))
+        fileIndex.close()
+        # the index is not used after the write, since it does not have the file that was written.
+        self.assertTrue(butler.datasetExists('foo', {'bar': 1}))
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+if __name__ == '__main__':
+    lsst.utils.tests.init()
+    unittest.main()
@@ -98,6 +98,16 @@ class MapperTestCase(unittest.TestCase):
         self.assertIsInstance(result, float)
         self.assertEqual(result, 3.14)
 
+    def testMethodAddedAfterUse(self):
+        self.assertEqual(self.mapper.canStandardize("badSourceHist"), False)
+        # a method added after the dataset type was first used is found.
+        self.mapper.std_badSourceHist = lambda item, dataId: int(item)
+        self.assertEqual(self.mapper.canStandardize("badSourceHist"), True)
+        self.assertEqual(self.mapper.standardize("badSourceHist", "3", None), 3)
+        # the methods of the class are bound to the mapper, which does not hold them.
+        self.assertEqual(self.mapper._getMethod("std_", "x").__self__, self.mapper)
+        self.assertNotIn("std_x", self.mapper.__dict__)
+
 
 class TestMemory(lsst.utils.tests.MemoryTestCase):
     pass
@@ -21,6 +21,9 @@
 #
 
 import collections
+import shutil
+import sqlite3
+import tempfile
 import unittest
 import os
 import lsst.utils.tests
@@ -73,6 +76,40 @@ class PosixRegistryTestCase(unittest.TestCase):
             expectedLookup.sort()
             self.assertEqual(lookups, expectedLookup)
 
+    def testLookupIter(self):
+        registry = dafPersist.PosixRegistry(os.path.join(ROOT, 'posixRegistry/repo02'))
+        template = 'foo-%(ccd)02d-%(filter)s.fits'
+        lookups = registry.lookupIter(('ccd', 'filter'), None, {}, template=template, storage='FitsStorage')
+        self.assertNotIsInstance(lookups, list)
+        self.assertEqual(sorted(lookups), [(1, 'g'), (1, 'h'), (2, 'g'), (2, 'h'), (3, 'i')])
+        self.assertEqual(registry.lookupCount(('ccd',), None, {'filter': 'g'}, template=template), 2)
+
+
+class SqliteRegistryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.testDir = tempfile.mkdtemp(dir=ROOT, prefix="SqliteRegistryTestCase-")
+        self.location = os.path.join(self.testDir, 'registry.sqlite3')
+        conn = sqlite3.connect(self.location)
+        conn.execute("CREATE TABLE raw (visit INT, ccd INT, filter TEXT)")
+        conn.executemany("INSERT INTO raw VALUES (?, ?, ?)",
+                         [(visit, ccd, 'g' if visit % 2 else 'r') for visit in range(5) for ccd in range(3)])
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        if os.path.exists(self.testDir):
+            shutil.rmtree(self.testDir)
+
+    def testLookupIter(self):
+        registry = dafPersist.Registry.create(self.location)
+        expected = sorted(registry.lookup(('visit', 'ccd'), 'raw', {'filter': 'g'}))
+        self.assertEqual(len(expected), 6)
+        self.assertEqual(sorted(registry.lookupIter(('visit', 'ccd'), 'raw', {'filter': 'g'}, chunkSize=4)),
+                         expected)
+        self.assertEqual(registry.lookupCount(('visit', 'ccd'), 'raw', {'filter': 'g'}), 6)
+        self.assertEqual(registry.lookupCount(('visit',), 'raw', {}), 5)
+
 
 class TestMemory(lsst.utils.tests.MemoryTestCase):
     pass
@@ -0,0 +1,137 @@
+#
+# LSST Data Management System
+# Copyright 2018 AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+
+import os
+import shutil
+import tempfile
+import unittest
+import unittest.mock
+
+import lsst.daf.persistence as dp
+# can't use name TestObject, becuase it messes Pytest up. Alias it to tstObj
+from lsst.daf.persistence.test import TestObject as tstObj
+from lsst.daf.persistence.test import MapperForTestWriting
+import lsst.utils.tests
+
+# Define the root of the tests relative to this file
+ROOT = os.path.abspath(os.path.dirname(__file__))
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+class RepositoryCfgCacheTestCase(unittest.TestCase):
+    """Test the on-disk cache of the repository graphs of Butlers."""
+
+    def setUp(self):
+        self.testDir = tempfile.mkdtemp(dir=ROOT, prefix="RepositoryCfgCacheTestCase-")
+        self.cacheDir = os.path.join(self.testDir, 'cfgCache')
+        self.oldEnv = os.environ.get(dp.RepositoryCfgCache.envVar)
+        os.environ[dp.RepositoryCfgCache.envVar] = self.cacheDir
+        self.repoA = os.path.join(self.testDir, 'repoA')
+        self.repoB = os.path.join(self.testDir, 'repoB')
+        butler = dp.Butler(outputs=dp.RepositoryArgs(mode='w', root=self.repoA, mapper=MapperForTestWriting))
+        self.objA = tstObj('abc')
+        butler.put(self.objA, 'foo', {'bar': 1})
+        del butler
+        butler = dp.Butler(inputs=self.repoA, outputs=self.repoB)
+        del butler
+
+    def tearDown(self):
+        if self.oldEnv is None:
+            del os.environ[dp.RepositoryCfgCache.envVar]
+        else:
+            os.environ[dp.RepositoryCfgCache.envVar] = self.oldEnv
+        if os.path.exists(self.testDir):
+            shutil.rmtree(self.testDir)
+
+    def noCfgReads(self):
+        """Make reading a repositoryCfg.yaml file fail."""
+        return unittest.mock.patch.object(dp.PosixStorage, 'getRepositoryCfg',
+                                          side_effect=AssertionError("a cfg was read"))
+
+    def testGetAndValidate(self):
+        butler = dp.Butler(inputs=self.repoB)
+        roots = [repoData.cfg.root for repoData in butler._repos.inputs()]
+        # the graph is resolved from the cache, without reading the cfgs.
+        with self.noCfgReads():
+            butler = dp.Butler(inputs=self.repoB)
+        self.assertEqual([repoData.cfg.root for repoData in butler._repos.inputs()], roots)
+        self.assertEqual(butler._repos.inputs()[1].parentRepoDatas, [])
+        self.assertIs(butler._repos.inputs()[0].parentRepoDatas[0], butler._repos.inputs()[1])
+
+        # changing the cfg file of a parent invalidates the entry.
+        path = os.path.join(self.repoA, 'repositoryCfg.yaml')
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        with self.noCfgReads():
+            with self.assertRaises(AssertionError):
+                dp.Butler(inputs=self.repoB)
+        dp.Butler(inputs=self.repoB)
+        with self.noCfgReads():
+            dp.Butler(inputs=self.repoB)
+
+    def testNewOutput(self):
+        repoC = os.path.join(self.testDir, 'repoC')
+        dp.Butler(inputs=self.repoB, outputs=repoC)
+        # the first graph was made when the cfg of the output did not exist, so it is not used once it does.
+        with self.noCfgReads():
+            with self.assertRaises(AssertionError):
+                dp.Butler(inputs=self.repoB, outputs=repoC)
+        dp.Butler(inputs=self.repoB, outputs=repoC)
+        with self.noCfgReads():
+            butler = dp.Butler(inputs=self.repoB, outputs=repoC)
+        butler.put(tstObj('def'), 'foo', {'bar': 2})
+        self.assertEqual(dp.Butler(inputs=repoC).get('foo', {'bar': 2}), tstObj('def'))
+
+    def testOwner(self):
+        dp.Butler(inputs=self.repoB)
+        # entries written by another user are not trusted.
+        with unittest.mock.patch('os.getuid', return_value=os.getuid() + 1):
+            with self.noCfgReads():
+                with self.assertRaises(AssertionError):
+                    dp.Butler(inputs=self.repoB)
+
+    def testButler(self):
+        # the first butler fills the cache; the second gets the graph from it.
+        for i in range(2):
+            butler = dp.Butler(inputs=self.repoB)
+            self.assertEqual(butler.get('foo', {'bar': 1}), self.objA)
+        self.assertEqual(len([name for name in os.listdir(self.cacheDir) if name.endswith('.pickle')]), 1)
+
+    def testDisabled(self):
+        del os.environ[dp.RepositoryCfgCache.envVar]
+        self.assertIsNone(dp.RepositoryCfgCache.fromEnvironment())
+        shutil.rmtree(self.cacheDir, ignore_errors=True)
+        dp.Butler(inputs=self.repoB)
+        self.assertFalse(os.path.exists(self.cacheDir))
+        os.environ[dp.RepositoryCfgCache.envVar] = self.cacheDir
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+if __name__ == '__main__':
+    lsst.utils.tests.init()
+    unittest.main()
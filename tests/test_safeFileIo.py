@@ -94,6 +94,39 @@ class WriteOnceCompareSameTest(unittest.TestCase):
         self.assertEqual(~umask & 0o666, filePerms)
 
 
+class CloneFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.testDir = tempfile.mkdtemp(dir=ROOT, prefix='CloneFileTest-')
+        self.src = os.path.join(self.testDir, 'src.txt')
+        with open(self.src, 'w') as f:
+            f.write('bar\n' * 1000)
+
+    def tearDown(self):
+        if os.path.exists(self.testDir):
+            shutil.rmtree(self.testDir)
+
+    def checkClone(self, hardlink):
+        dst = os.path.join(self.testDir, 'dst.txt')
+        with dp.safeFileIo.SafeFilename(dst) as tempName:
+            how = dp.safeFileIo.cloneFile(self.src, tempName, hardlink=hardlink)
+        with open(dst) as f:
+            self.assertEqual(f.read(), 'bar\n' * 1000)
+        self.assertEqual(len(os.listdir(self.testDir)), 2)
+        return how, dst
+
+    def testClone(self):
+        how, dst = self.checkClone(hardlink=False)
+        self.assertIn(how, ('reflink', 'copy_file_range', 'copy'))
+        self.assertNotEqual(os.stat(self.src).st_ino, os.stat(dst).st_ino)
+
+    def testHardlink(self):
+        how, dst = self.checkClone(hardlink=True)
+        self.assertIn(how, ('reflink', 'hardlink'))
+        if how == 'hardlink':
+            self.assertEqual(os.stat(self.src).st_ino, os.stat(dst).st_ino)
+
+
 def readFile(filename, readQueue):
     readQueue.put("waiting")
     readQueue.get()
@@ -45,6 +45,14 @@ class TestUtils(unittest.TestCase):
         self.assertEqual(('a', 'b', 'c'), dp.sequencify({'a': 1, 'b': 2, 'c': 3}))
         self.assertNotEqual(('b', 'c', 'a'), dp.sequencify({'a': 1, 'b': 2, 'c': 3}))
 
+    def testDoImport(self):
+        self.assertIs(dp.doImport('lsst.daf.persistence.Butler'), dp.Butler)
+        # the second import of a string is answered from memory.
+        self.assertIs(dp.doImport('lsst.daf.persistence.Butler'), dp.Butler)
+        self.assertIs(dp.doImport('lsst.daf.persistence.Butler.get'), dp.Butler.get)
+        with self.assertRaises(TypeError):
+            dp.doImport(1)
+
 
 class MemoryTester(lsst.utils.tests.MemoryTestCase):
     pass